@@ -0,0 +1,226 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Micro-benchmarks of the similarity measures on synthetic sentences.
+Every measure of NAME_TO_SIM and NAME_TO_BATCH_SIM and FBoW-Jaccard with a
+fixed universe is timed for a grid of sentence lengths, embedding
+dimensions and dtypes, reporting ns/pair and the peak traced memory while
+scoring one pair (one batch for batch measures). The caches of WMD and
+FBoW-Jaccard are cleared before every timed pass, so that their timings
+include computing the words they cache. Results can be saved as a baseline
+and compared against it, e.g.
+
+    python bench_similarity.py --save baseline.json
+    python bench_similarity.py --compare baseline.json
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+# Set PATHs
+PATH_TO_SENTEVAL = '../'
+
+sys.path.insert(0, PATH_TO_SENTEVAL)
+from similarity import NAME_TO_SIM, NAME_TO_BATCH_SIM, fbow_jaccard_factory, MembershipCache
+from similarity.wmd import WORD_DISTANCES
+
+# measures over words instead of word embeddings
+WORD_MEASURES = {'set_jaccard', 'bag_jaccard'}
+
+LENGTHS = [5, 15, 40]
+DIMS = [50, 300]
+DTYPES = ['float32', 'float64']
+
+
+def synthetic_pairs(length, dim, dtype, n_pairs, vocab_size=2000, seed=1111):
+    """
+    Sentence pairs drawn from a random vocabulary, so that words repeat
+    across sentences as in real data
+    :param length: mean number of words per sentence
+    :param dim: dimension of the word embeddings
+    :param dtype: floating point type of the word embeddings
+    :param n_pairs: number of pairs
+    :param vocab_size: number of distinct words
+    :param seed: seed of the vocabulary and sentences
+    :return: list of (ids1, ids2) and the embedding matrix
+    """
+    rng = np.random.RandomState(seed)
+    vocab = rng.normal(size=(vocab_size, dim)).astype(dtype)
+    lengths = np.maximum(1, rng.poisson(length, size=(n_pairs, 2)))
+    pairs = [(rng.randint(vocab_size, size=n1), rng.randint(vocab_size, size=n2))
+             for n1, n2 in lengths]
+    return pairs, vocab
+
+
+def benchmarks(dim, dtype):
+    """
+    :param dim: dimension of the word embeddings
+    :param dtype: floating point type of the word embeddings
+    :return: dict containing name: (kind, function, reset), kind is 'pair',
+             'words' or 'batch', reset clears the cache of the measure or is None
+    """
+    universe = np.random.RandomState(0).normal(size=(300, dim)).astype(dtype)
+    memberships = MembershipCache(universe, dtype=dtype)
+    measures = {}
+    for name, similarity in NAME_TO_SIM.items():
+        measures[name] = ('words' if name in WORD_MEASURES else 'pair', similarity, None)
+    measures['fbow_jaccard'] = ('pair', fbow_jaccard_factory(universe, cache=memberships),
+                                memberships.clear)
+    for name, batch_similarity in NAME_TO_BATCH_SIM.items():
+        measures['batch:' + name] = ('batch', batch_similarity, None)
+    for name in ('wmd', 'batch:wmd'):
+        measures[name] = measures[name][:2] + (WORD_DISTANCES.clear,)
+    return measures
+
+
+def calls(kind, function, pairs, vocab):
+    """
+    :return: list of argument-free calls scoring all the pairs, one per pair
+             or a single one for batch measures
+    """
+    if kind == 'words':
+        words = [(['w%d' % i for i in ids1], ['w%d' % i for i in ids2]) for ids1, ids2 in pairs]
+        return [lambda x=x, y=y: function(x, y) for x, y in words]
+    vectors = [(vocab[ids1], vocab[ids2]) for ids1, ids2 in pairs]
+    if kind == 'batch':
+        batch1 = [x for x, _ in vectors]
+        batch2 = [y for _, y in vectors]
+        return [lambda: function(batch1, batch2)]
+    return [lambda x=x, y=y: function(x, y) for x, y in vectors]
+
+
+def measure(pair_calls, n_pairs, repeat, reset=None):
+    """
+    :param pair_calls: calls scoring all the pairs
+    :param n_pairs: number of pairs scored by the calls
+    :param repeat: number of timed passes, the fastest is kept
+    :param reset: function clearing the cache of the measure before every
+                  pass, so that passes do not only hit the cache
+    :return: dict with ns_per_pair and peak_bytes, the largest peak of
+             traced memory during a call (not a count of allocations)
+    """
+    reset = reset or (lambda: None)
+    for call in pair_calls:
+        # warm up lazy imports and BLAS
+        call()
+    best = np.inf
+    for _ in range(repeat):
+        reset()
+        start = time.perf_counter_ns()
+        for call in pair_calls:
+            call()
+        best = min(best, time.perf_counter_ns() - start)
+
+    reset()
+    peak = 0
+    tracemalloc.start()
+    try:
+        for call in pair_calls:
+            tracemalloc.clear_traces()
+            baseline = tracemalloc.get_traced_memory()[0]
+            call()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return {'ns_per_pair': best / n_pairs, 'peak_bytes': peak}
+
+
+def run(n_pairs, repeat, names=None):
+    """
+    :param n_pairs: number of pairs per benchmark
+    :param repeat: number of timed passes per benchmark
+    :param names: names of the measures to run, all if None
+    :return: dict containing 'name|length|dim|dtype': measurement
+    """
+    results = {}
+    for length in LENGTHS:
+        for dim in DIMS:
+            for dtype in DTYPES:
+                pairs, vocab = synthetic_pairs(length, dim, dtype, n_pairs)
+                for name, (kind, function, reset) in sorted(benchmarks(dim, dtype).items()):
+                    if names and name not in names:
+                        continue
+                    if kind == 'words' and (dim, dtype) != (DIMS[0], DTYPES[0]):
+                        # words do not depend on the embeddings
+                        continue
+                    key = '|'.join([name, str(length)] +
+                                   (['-', '-'] if kind == 'words' else [str(dim), dtype]))
+                    with np.errstate(all='ignore'):
+                        results[key] = measure(calls(kind, function, pairs, vocab),
+                                               n_pairs, repeat, reset)
+                    report(key, results[key])
+    return results
+
+
+def report(key, result, base=None):
+    line = '{0:40} {1:12.0f} ns/pair {2:10.1f} KiB peak traced'.format(
+        key, result['ns_per_pair'], result['peak_bytes'] / 1024)
+    if base is not None:
+        line += '  {0:+7.1%} time {1:+7.1%} memory'.format(
+            result['ns_per_pair'] / base['ns_per_pair'] - 1,
+            (result['peak_bytes'] + 1) / (base['peak_bytes'] + 1) - 1)
+    print(line)
+    sys.stdout.flush()
+
+
+def compare(results, baseline, tolerance):
+    """
+    :param results: results of run
+    :param baseline: results of an earlier run
+    :param tolerance: accepted relative slowdown or memory growth
+    :return: keys of the benchmarks that regressed
+    """
+    print('\nCompared to the baseline:')
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline:
+            continue
+        result, base = results[key], baseline[key]
+        report(key, result, base)
+        if result['ns_per_pair'] > (1 + tolerance) * base['ns_per_pair'] or \
+                result['peak_bytes'] > (1 + tolerance) * base['peak_bytes'] + 1024:
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the similarity measures')
+    parser.add_argument('names', nargs='*', help='measures to run, all by default')
+    parser.add_argument('--pairs', type=int, default=200, help='pairs per benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='timed passes per benchmark')
+    parser.add_argument('--save', help='save the results as a baseline to this path')
+    parser.add_argument('--compare', help='compare the results to the baseline at this path')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown or memory growth reported as a regression')
+    args = parser.parse_args()
+
+    results = run(args.pairs, args.repeat, set(args.names))
+    if args.save:
+        with io.open(args.save, 'w', encoding='utf8') as f:
+            f.write(json.dumps(results, indent=1, sort_keys=True))
+    if args.compare:
+        with io.open(args.compare, encoding='utf8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\n{0} regressions: {1}'.format(len(regressions), ', '.join(regressions)))
+            sys.exit(1)
@@ -18,14 +18,18 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
+import os
 import sys
 import logging
 # Set PATHs
 PATH_TO_SENTEVAL = '../'
 PATH_TO_DATA = '../data'
+PATH_TO_RESULTS = '../results'
+PATH_TO_SCORES = '../results/scores'
 
 sys.path.insert(0, PATH_TO_SENTEVAL)
 import senteval
+import utils
 from similarity import get_similarity_by_name
 
 # Set up logger
@@ -49,17 +53,25 @@ similarities = [
 if __name__ == "__main__":
     transfer_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']
     results = []
+    store = utils.ResultsStore(os.path.join(PATH_TO_RESULTS, 'classical.jsonl'))
     for sim_name in similarities:
+        params_experiment = {
+            'similarity_name': sim_name
+        }
+        if store.has(params_experiment, transfer_tasks):
+            logging.info('Skipping {0}, already in {1}'.format(params_experiment, store.path))
+            results.append(store.get(params_experiment, transfer_tasks))
+            continue
+
         logging.info('Similarity: {0}'.format(sim_name))
         logging.info('BEGIN\n\n\n')
 
         params_senteval = {
             'task_path': PATH_TO_DATA
         }
-        params_experiment = {
-            'similarity_name': sim_name
-        }
         params_senteval.update(params_experiment)
+        params_senteval['score_cache'] = PATH_TO_SCORES
+        params_senteval['score_key'] = params_experiment
         params_senteval['similarity'] = get_similarity_by_name(sim_name)
 
         se = senteval.engine.SE(params_senteval, batcher, prepare)
@@ -68,4 +80,5 @@ if __name__ == "__main__":
             'param': params_experiment,
             'eval': result
         }
+        store.add(result_dict)
         results.append(result_dict)
@@ -0,0 +1,45 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import, division, unicode_literals
+
+import sys
+import logging
+
+# Set PATHs
+PATH_TO_SENTEVAL = '../'
+
+sys.path.insert(0, PATH_TO_SENTEVAL)
+import utils
+
+# Set up logger
+logging.basicConfig(format='%(asctime)s : %(message)s', level=logging.DEBUG)
+
+
+if __name__ == "__main__":
+    # One-time conversion of the text word vectors into memory-mapped binary
+    # stores, picked up automatically by utils.get_wordvec
+    word_vectors = sys.argv[1:] or [
+        'glove',
+        'fasttext',
+        'word2vec',
+        'psl',
+        'ppxxl',
+        'pnmt'
+    ]
+
+    for word_vec_name in word_vectors:
+        utils.convert_wordvec_to_binary(
+            utils.get_word_vec_path_by_name(word_vec_name))
@@ -18,20 +18,24 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
+import os
 import sys
-import numpy as np
 import logging
 import itertools
+import functools
 
 # Set PATHs
 PATH_TO_SENTEVAL = '../'
 PATH_TO_DATA = '../data'
+PATH_TO_RESULTS = '../results'
+PATH_TO_SCORES = '../results/scores'
 
 
 sys.path.insert(0, PATH_TO_SENTEVAL)
 import senteval
 import utils
-from similarity import get_similarity_by_name
+import grid
+from similarity import get_multi_similarity_by_names
 from evaluation.constants import *
 
 # Set up logger
@@ -39,34 +43,86 @@ logging.basicConfig(format='%(asctime)s : %(message)s', level=logging.DEBUG)
 
 
 def prepare(params, samples):
-    word_vec_path = utils.get_word_vec_path_by_name(params.word_vec_name)
     word_count_path = params.word_count_path
     norm = params.norm
     params.wvec_dim = 300
 
     _, params.word2id = utils.create_dictionary(samples)
-    params.word_vec = utils.get_wordvec(word_vec_path,
-                                        params.word2id,
-                                        norm=norm,
-                                        path_to_counts=word_count_path)
+    # load the vocabulary of all evaluated tasks at once, later tasks and
+    # experiments with the same vectors are then served from the cache
+    _, vocab = utils.create_dictionary(params.all_samples or samples)
+    params.word_vec = utils.WORD_VEC_CACHE.get(params.word_vec_name,
+                                               vocab,
+                                               norm=norm,
+                                               path_to_counts=word_count_path,
+                                               dtype=params.dtype or 'float64')
     return
 
 
 def batcher(params, batch):
     batch = [sent if sent != [] else ['.'] for sent in batch]
-    embeddings = []
-
-    for sent in batch:
-        sentvec = []
-        for word in sent:
-            if word in params.word_vec:
-                sentvec.append(params.word_vec[word])
-        if not sentvec:
-            vec = np.zeros(params.wvec_dim)
-            sentvec.append(vec)
-        embeddings.append(sentvec)
-
-    return embeddings
+    return params.word_vec.batch(batch)
+
+
+def experiment_params(experiment):
+    """
+    :param experiment: (word vectors name, word counts, norm, dtype)
+    :return: parameters of the experiment shared by all similarities
+    """
+    word_vec_name = experiment[0]
+    word_counts = experiment[1]
+    norm = experiment[2]
+    dtype = experiment[3]
+    return {
+        'word_vec_name': word_vec_name,
+        'word_count_name': word_counts.name,
+        'word_count_path': word_counts.path,
+        'norm': norm,
+        'dtype': dtype
+    }
+
+
+def run_experiment(experiment, transfer_tasks, similarities):
+    """
+    Evaluates all similarities with one choice of word vectors
+    :param experiment: (word vectors name, word counts, norm, dtype)
+    :param transfer_tasks: list of tasks
+    :param similarities: list of similarity names
+    :return: list of result dicts, one per similarity
+    """
+    params_vectors = experiment_params(experiment)
+
+    logging.info('Word vectors: {0}'.format(params_vectors['word_vec_name']))
+    logging.info('Word Counts : {0}'.format(params_vectors['word_count_name']))
+    logging.info('Similarities: {0}'.format(', '.join(similarities)))
+    logging.info('Normalize: {0}'.format(params_vectors['norm']))
+    logging.info('Precision: {0}'.format(params_vectors['dtype']))
+    logging.info('BEGIN\n\n\n')
+
+    params_senteval = {
+        'task_path': PATH_TO_DATA
+    }
+    params_senteval.update(params_vectors)
+    params_senteval['cache_representations'] = 'global'
+    params_senteval['score_cache'] = PATH_TO_SCORES
+    params_senteval['score_key'] = params_vectors
+    params_senteval['score_files'] = utils.get_word_vec_files(params_vectors['word_vec_name'],
+                                                              params_vectors['word_count_path'])
+    params_senteval['similarity_names'] = similarities
+    params_senteval['multi_similarity'] = get_multi_similarity_by_names(
+        similarities)
+
+    se = senteval.engine.SE(params_senteval, batcher, prepare)
+    result = se.eval(transfer_tasks)
+    result_dicts = []
+    for sim_name in similarities:
+        params_experiment = dict(params_vectors, similarity_name=sim_name)
+        result_dict = {
+            'param': params_experiment,
+            'eval': {task: result[task][sim_name] for task in transfer_tasks}
+        }
+        result_dicts.append(result_dict)
+    return result_dicts
 
 
 if __name__ == "__main__":
@@ -101,46 +157,47 @@ if __name__ == "__main__":
         # True
     ]
 
+    dtype_choice = [
+        'float64',
+        # 'float32'
+    ]
+
+    # number of worker processes, None for all cores
+    processes = None
+
     results = []
 
+    # all similarities of an experiment are scored together in a single pass
     experiments = list(itertools.product(word_vectors,
-                                         similarities,
                                          word_counts_choice,
-                                         norm_choice))
-
-    logging.info('Running {0} experiments. Good luck! :)\n\n\n'.format(len(experiments)))
-
-    for idx, experiment in enumerate(experiments):
-        word_vec_name = experiment[0]
-        sim_name = experiment[1]
-        word_counts = experiment[2]
-        norm = experiment[3]
-
-        logging.info('Word vectors: {0}'.format(word_vec_name))
-        logging.info('Word Counts : {0}'.format(word_counts.name))
-        logging.info('Similarity: {0}'.format(sim_name))
-        logging.info('Normalize: {0}'.format(norm))
-        logging.info('BEGIN\n\n\n')
-
-        params_senteval = {
-            'task_path': PATH_TO_DATA
-        }
-        params_experiment = {
-            'word_vec_name': word_vec_name,
-            'word_count_name': word_counts.name,
-            'word_count_path': word_counts.path,
-            'similarity_name': sim_name,
-            'norm': norm
-        }
-        params_senteval.update(params_experiment)
-        params_senteval['similarity'] = get_similarity_by_name(
-            sim_name)
-
-        se = senteval.engine.SE(params_senteval, batcher, prepare)
-        result = se.eval(transfer_tasks)
-        result_dict = {
-            'param': params_experiment,
-            'eval': result
-        }
-        results.append(result_dict)
+                                         norm_choice,
+                                         dtype_choice))
+
+    # experiments already in the store are not run again
+    store = utils.ResultsStore(os.path.join(PATH_TO_RESULTS, 'fuzzy_eval.jsonl'))
+    pending = [experiment for experiment in experiments
+               if not all(store.has(dict(experiment_params(experiment), similarity_name=sim_name),
+                                    transfer_tasks)
+                          for sim_name in similarities)]
+
+    logging.info('Running {0} experiments, {1} already done. Good luck! :)\n\n\n'.format(
+        len(pending) * len(similarities),
+        (len(experiments) - len(pending)) * len(similarities)))
+
+    def save(idx, result_dicts):
+        for result_dict in result_dicts:
+            store.add(result_dict)
         logging.info('END. Experiment #{0} saved\n\n\n'.format(idx + 1))
+
+    grid.run_grid(pending,
+                  functools.partial(run_experiment,
+                                    transfer_tasks=transfer_tasks,
+                                    similarities=similarities),
+                  processes=processes,
+                  key=lambda experiment: experiment[0],
+                  on_result=save)
+
+    for experiment in experiments:
+        for sim_name in similarities:
+            results.append(store.get(dict(experiment_params(experiment), similarity_name=sim_name),
+                                     transfer_tasks))
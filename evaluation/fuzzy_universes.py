@@ -21,82 +21,110 @@ from __future__ import absolute_import, division, unicode_literals
 import numpy as np
 import sys
 import logging
+import collections
 
 # Set PATHs
 PATH_TO_SENTEVAL = '../'
 PATH_TO_DATA = '../data'
 
-import utils
 sys.path.insert(0, PATH_TO_SENTEVAL)
 import senteval
+import utils
 from similarity.fuzzy import fbow_jaccard_factory
+from similarity.batch import fbow_multi_batched
+from similarity.universe import kmeans_universe
 
 # Set up logger
 logging.basicConfig(format='%(asctime)s : %(name)s : %(message)s', level=logging.DEBUG)
 
 
 def prepare(params, samples):
-    word_vec_path = utils.get_word_vec_path_by_name(params.word_vec_name)
     word_count_path = params.word_count_path
     norm = params.norm
     params.wvec_dim = 300
 
     _, params.word2id = utils.create_dictionary(samples)
-    params.word_vec = utils.get_wordvec(word_vec_path,
-                                        params.word2id,
-                                        norm=norm,
-                                        path_to_counts=word_count_path)
+    _, vocab = utils.create_dictionary(params.all_samples or samples)
+    params.word_vec = utils.WORD_VEC_CACHE.get(params.word_vec_name,
+                                               vocab,
+                                               norm=norm,
+                                               path_to_counts=word_count_path,
+                                               dtype=params.dtype or 'float64')
     return
 
 
 def batcher(params, batch):
     batch = [sent if sent != [] else ['.'] for sent in batch]
-    embeddings = []
+    return params.word_vec.batch(batch)
+
+
+def run_universes(word_vec_name, universes, transfer_tasks, dtype, top_k, sweep):
+    """
+    Evaluates FBoW-Jaccard with every universe
+    :param word_vec_name: word vectors name
+    :param universes: dict containing name: universe matrix U
+    :param transfer_tasks: list of tasks
+    :param dtype: floating point type of the word vectors and universes
+    :param top_k: number of memberships cached per word, None for all
+    :param sweep: score all the universes in one pass over the data, with
+                  their stacked memberships, instead of one run each
+    :return: list of result dicts, one per universe
+    """
+    params_vectors = {
+        'word_vec_name': word_vec_name,
+        'similarity_name': 'fbow_jaccard',
+        'dtype': dtype
+    }
+    if sweep:
+        runs = [(list(universes), {
+            'similarity_names': list(universes),
+            'multi_similarity': fbow_multi_batched(universes)
+        })]
+    else:
+        runs = [([name], {
+            'similarity': fbow_jaccard_factory(U, top_k=top_k, dtype=dtype)
+        }) for name, U in universes.items()]
+
+    result_dicts = []
+    for names, params_similarity in runs:
+        logging.info('Word vectors: {0}'.format(word_vec_name))
+        logging.info('Similarity: {0}'.format('FBoW-Jaccard custom U'))
+        logging.info('Universes: {0}'.format(', '.join(names)))
+        logging.info('BEGIN\n\n\n')
 
-    for sent in batch:
-        sentvec = []
-        for word in sent:
-            if word in params.word_vec:
-                sentvec.append(params.word_vec[word])
-        if not sentvec:
-            vec = np.zeros(params.wvec_dim)
-            sentvec.append(vec)
-        embeddings.append(sentvec)
+        params_senteval = {
+            'task_path': PATH_TO_DATA
+        }
+        params_senteval.update(params_vectors)
+        params_senteval.update(params_similarity)
 
-    return embeddings
+        se = senteval.engine.SE(params_senteval, batcher, prepare)
+        result = se.eval(transfer_tasks)
+        for name in names:
+            params_experiment = dict(params_vectors, universe=name,
+                                     top_k=None if sweep else top_k)
+            result_dicts.append({
+                'param': params_experiment,
+                'eval': {task: result[task][name] for task in transfer_tasks} if sweep else result
+            })
+    return result_dicts
 
 
 if __name__ == "__main__":
     transfer_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']
     results = []
     np.random.seed(1111)
+    dtype = 'float64'  # 'float32'
+    top_k = None  # e.g. 1000 memberships per word with the 100k words universe
+    sweep = True
     for word_vec_name in ['glove']:
         wv_path = utils.get_word_vec_path_by_name(word_vec_name)
 
-        # U = utils.load_wordvec_matrix(wv_path, lo=0, hi=100000)
-        # U = np.identity(300, dtype=np.float64)
-        U = np.random.normal(size=(300, 300))
-
-        fsimilarity = fbow_jaccard_factory(U)
+        universes = collections.OrderedDict()
+        # universes['top_100k'] = utils.load_wordvec_matrix(wv_path, lo=0, hi=100000)
+        universes['identity'] = np.identity(300, dtype=np.float64)
+        # universes['kmeans_1000'] = kmeans_universe(utils.load_wordvec_matrix(wv_path, lo=0, hi=100000), 1000)
+        universes['random'] = np.random.normal(size=(300, 300))
+        universes = collections.OrderedDict((name, U.astype(dtype)) for name, U in universes.items())
 
-        logging.info('Word vectors: {0}'.format(word_vec_name))
-        logging.info('Similarity: {0}'.format('FBoW-Jaccard custom U'))
-        logging.info('BEGIN\n\n\n')
-
-        params_senteval = {
-            'task_path': PATH_TO_DATA
-        }
-        params_experiment = {
-            'word_vec_name': word_vec_name,
-            'similarity_name': 'fbow_jaccard'
-        }
-        params_senteval.update(params_experiment)
-        params_senteval['similarity'] = fsimilarity
-
-        se = senteval.engine.SE(params_senteval, batcher, prepare)
-        result = se.eval(transfer_tasks)
-        result_dict = {
-            'param': params_experiment,
-            'eval': result
-        }
-        results.append(result_dict)
+        results += run_universes(word_vec_name, universes, transfer_tasks, dtype, top_k, sweep)
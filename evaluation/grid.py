@@ -0,0 +1,127 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+from __future__ import absolute_import, division, unicode_literals
+
+import queue
+import logging
+import functools
+import traceback
+import collections
+import multiprocessing
+
+
+# queue of (idx, result, error) of every experiment, inherited by the forked workers
+_RESULTS = None
+
+
+def run_grid(experiments, run_experiment, processes=None, key=None, on_result=None):
+    """
+    Runs a grid of experiments on a pool of worker processes.
+    Workers are forked and load word vectors through the memory-mapped binary
+    stores (see utils.convert_wordvec_to_binary), so the embedding matrices
+    stay in the shared page cache and every worker only copies the rows of
+    its task vocabulary. Experiments with the same key run one after another
+    in the same worker, where they share its word vectors cache
+    :param experiments: list of experiments
+    :param run_experiment: module-level function running one experiment
+    :param processes: number of worker processes, defaults to the number of cores
+    :param key: function mapping an experiment to its group, e.g. word vectors
+    :param on_result: function called in this process with the index and
+    result of every experiment as soon as it finishes. When an experiment
+    fails, the other groups still run to completion and their results are
+    reported before the RuntimeError is raised
+    :return: list of results in the order of experiments
+    """
+    global _RESULTS
+    groups = collections.OrderedDict()
+    for idx, experiment in enumerate(experiments):
+        group = key(experiment) if key else idx
+        groups.setdefault(group, []).append((idx, experiment))
+
+    results = [None] * len(experiments)
+    if processes == 1 or len(groups) <= 1:
+        for group in groups.values():
+            for idx, experiment in group:
+                _collect(results, on_result, idx, run_experiment(experiment))
+        return results
+
+    processes = min(processes or multiprocessing.cpu_count(), len(groups))
+    logging.info('Running {0} experiments on {1} processes'.format(len(experiments), processes))
+    context = multiprocessing.get_context('fork')
+    _RESULTS = context.Queue()
+    pool = context.Pool(processes)
+    failure = None
+    try:
+        done = pool.map_async(functools.partial(_run_group, run_experiment), groups.values())
+        for idx, result, error in _iter_results(done, len(experiments)):
+            if error is not None:
+                # the other groups run to completion and their results are still collected
+                failure = failure or (idx, error)
+            else:
+                _collect(results, on_result, idx, result)
+        done.wait()
+        if failure is None and not done.successful():
+            # raises the error of a group that failed without reporting it
+            done.get()
+        pool.close()
+    except BaseException:
+        # workers blocked on sending results nobody reads would never exit
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _RESULTS = None
+    if failure is not None:
+        raise RuntimeError('Experiment #{0} failed:\n{1}'.format(failure[0] + 1, failure[1]))
+    return results
+
+
+def _iter_results(done, count):
+    while count and not done.ready():
+        try:
+            item = _RESULTS.get(timeout=1)
+        except queue.Empty:
+            continue
+        count -= 1
+        yield item
+    # the last results may still be in the pipe when the groups are done,
+    # including the error of the experiment that failed a group
+    while count:
+        try:
+            item = _RESULTS.get(timeout=60 if done.successful() else 5)
+        except queue.Empty:
+            break
+        count -= 1
+        yield item
+    if count and done.successful():
+        raise RuntimeError('Experiment results are missing, they may not be picklable')
+
+
+def _collect(results, on_result, idx, result):
+    results[idx] = result
+    if on_result is not None:
+        on_result(idx, result)
+
+
+def _run_group(run_experiment, group):
+    # results are sent one by one so the driver saves them before the group ends
+    for idx, experiment in group:
+        try:
+            result = run_experiment(experiment)
+        except Exception:
+            _RESULTS.put((idx, None, traceback.format_exc()))
+            raise
+        _RESULTS.put((idx, result, None))
@@ -0,0 +1,108 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# This source code is derived from SentEval source code.
+# SentEval Copyright (c) 2017-present, Facebook, Inc.
+# ==============================================================================
+
+from __future__ import absolute_import, division, unicode_literals
+
+import sys
+import logging
+
+# Set PATHs
+PATH_TO_SENTEVAL = '../'
+PATH_TO_DATA = '../data'
+
+
+sys.path.insert(0, PATH_TO_SENTEVAL)
+import senteval
+from similarity import get_multi_similarity_by_names
+from evaluation.constants import *
+from fuzzy_eval import prepare, batcher
+
+# Set up logger
+logging.basicConfig(format='%(asctime)s : %(message)s', level=logging.DEBUG)
+
+
+def precision_deltas(result64, result32, transfer_tasks, similarities):
+    """
+    Differences in correlation between float32 and float64 runs
+    :param result64: result of SE.eval in float64
+    :param result32: result of SE.eval in float32
+    :param transfer_tasks: evaluated tasks
+    :param similarities: evaluated similarities
+    :return: dict containing similarity: task: dataset: deltas
+    """
+    deltas = {}
+    for sim_name in similarities:
+        deltas[sim_name] = {}
+        for task in transfer_tasks:
+            r64 = result64[task][sim_name]
+            r32 = result32[task][sim_name]
+            deltas[sim_name][task] = {
+                dataset: {'pearson': r32[dataset]['pearson'][0] - r64[dataset]['pearson'][0],
+                          'spearman': r32[dataset]['spearman'][0] - r64[dataset]['spearman'][0]}
+                for dataset in r64 if dataset != 'all'}
+            deltas[sim_name][task]['all'] = {
+                'pearson': r32['all']['pearson']['wmean'] - r64['all']['pearson']['wmean'],
+                'spearman': r32['all']['spearman']['wmean'] - r64['all']['spearman']['wmean']}
+    return deltas
+
+
+if __name__ == "__main__":
+    # Reports how much STS correlations move when scoring in float32
+    transfer_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']
+
+    word_vectors = [
+        'glove',
+        'fasttext',
+        'word2vec'
+    ]
+
+    similarities = [
+        'avg_cosine',
+        'max_jaccard',
+        'dynamax_jaccard',
+        'dynamax_otsuka',
+        'dynamax_dice'
+    ]
+
+    results = []
+
+    for word_vec_name in word_vectors:
+        result = {}
+        for dtype in ['float64', 'float32']:
+            params_senteval = {
+                'task_path': PATH_TO_DATA,
+                'word_vec_name': word_vec_name,
+                'word_count_path': NO_CNT.path,
+                'norm': False,
+                'dtype': dtype,
+                'similarity_names': similarities,
+                'multi_similarity': get_multi_similarity_by_names(similarities)
+            }
+            se = senteval.engine.SE(params_senteval, batcher, prepare)
+            result[dtype] = se.eval(transfer_tasks)
+
+        deltas = precision_deltas(result['float64'], result['float32'],
+                                  transfer_tasks, similarities)
+        for sim_name in similarities:
+            for task in transfer_tasks:
+                for dataset, delta in sorted(deltas[sim_name][task].items()):
+                    logging.info('{0} {1} {2} {3}: pearson delta = {4:.2e}, spearman delta = {5:.2e}'
+                                 .format(word_vec_name, sim_name, task, dataset,
+                                         delta['pearson'], delta['spearman']))
+        results.append({'param': {'word_vec_name': word_vec_name},
+                        'deltas': deltas})
@@ -18,36 +18,42 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
+import os
 import sys
 import numpy as np
 import logging
 import itertools
+import functools
 from evaluation.constants import *
 
 
 # Set PATHs
 PATH_TO_SENTEVAL = '../'
 PATH_TO_DATA = '../data'
+PATH_TO_RESULTS = '../results'
+PATH_TO_SCORES = '../results/scores'
 
 sys.path.insert(0, PATH_TO_SENTEVAL)
 import senteval
 import utils
+import grid
 
 # Set up logger
 logging.basicConfig(format='%(asctime)s : %(message)s', level=logging.DEBUG)
 
 
 def prepare(params, samples):
-    word_vec_path = utils.get_word_vec_path_by_name(params.word_vec_name)
     word_count_path = params.word_count_path
     norm = params.norm
     params.wvec_dim = 300
 
     _, params.word2id = utils.create_dictionary(samples)
-    params.word_vec = utils.get_wordvec(word_vec_path,
-                                        params.word2id,
-                                        norm=norm,
-                                        path_to_counts=word_count_path)
+    _, vocab = utils.create_dictionary(params.all_samples or samples)
+    params.word_vec = utils.WORD_VEC_CACHE.get(params.word_vec_name,
+                                               vocab,
+                                               norm=norm,
+                                               path_to_counts=word_count_path,
+                                               dtype=params.dtype or 'float64')
     params.pc = None
     X = batcher(params, samples)
     params.pc = utils.compute_pc(X, npc=1)
@@ -58,14 +64,7 @@ def batcher(params, batch):
     batch = [sent if sent != [] else ['.'] for sent in batch]
     embeddings = []
 
-    for sent in batch:
-        sentvec = []
-        for word in sent:
-            if word in params.word_vec:
-                sentvec.append(params.word_vec[word])
-        if not sentvec:
-            vec = np.zeros(params.wvec_dim)
-            sentvec.append(vec)
+    for sentvec in params.word_vec.batch(batch):
         sentvec = np.mean(sentvec, axis=0)
         if params.pc is not None:
             pc = params.pc
@@ -76,6 +75,55 @@ def batcher(params, batch):
     return embeddings
 
 
+def experiment_params(experiment):
+    """
+    :param experiment: (word vectors name, similarity name, word counts)
+    :return: parameters of the experiment
+    """
+    word_vec_name = experiment[0]
+    sim_name = experiment[1]
+    word_counts = experiment[2]
+    return {
+        'word_vec_name': word_vec_name,
+        'word_count_name': word_counts.name,
+        'word_count_path': word_counts.path,
+        'similarity_name': sim_name
+    }
+
+
+def run_experiment(experiment, transfer_tasks):
+    """
+    Evaluates SIF embeddings with one choice of word vectors and counts
+    :param experiment: (word vectors name, similarity name, word counts)
+    :param transfer_tasks: list of tasks
+    :return: result dict
+    """
+    params_experiment = experiment_params(experiment)
+
+    logging.info('Word vectors: {0}'.format(params_experiment['word_vec_name']))
+    logging.info('Word Counts : {0}'.format(params_experiment['word_count_name']))
+    logging.info('Similarity: {0}'.format(params_experiment['similarity_name']))
+    logging.info('BEGIN\n\n\n')
+
+    params_senteval = {
+        'task_path': PATH_TO_DATA
+    }
+    params_senteval.update(params_experiment)
+    params_senteval['cache_representations'] = 'task'
+    params_senteval['score_cache'] = PATH_TO_SCORES
+    params_senteval['score_key'] = params_experiment
+    params_senteval['score_files'] = utils.get_word_vec_files(params_experiment['word_vec_name'],
+                                                              params_experiment['word_count_path'])
+
+    se = senteval.engine.SE(params_senteval, batcher, prepare)
+    result = se.eval(transfer_tasks)
+    result_dict = {
+        'param': params_experiment,
+        'eval': result
+    }
+    return result_dict
+
+
 if __name__ == "__main__":
 
     word_vectors = [
@@ -98,36 +146,24 @@ if __name__ == "__main__":
                                          similarities,
                                          word_counts))
 
-    logging.info('Running {0} experiments. Good luck! :)\n\n\n'.format(len(experiments)))
-
     transfer_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']
-    results = []
-
-    for idx, experiment in enumerate(experiments):
-        word_vec_name = experiment[0]
-        sim_name = experiment[1]
-        word_counts = experiment[2]
-
-        logging.info('Word vectors: {0}'.format(word_vec_name))
-        logging.info('Word Counts : {0}'.format(word_counts.name))
-        logging.info('Similarity: {0}'.format(sim_name))
-        logging.info('BEGIN\n\n\n')
-
-        params_senteval = {
-            'task_path': PATH_TO_DATA
-        }
-        params_experiment = {
-            'word_vec_name': word_vec_name,
-            'word_count_name': word_counts.name,
-            'word_count_path': word_counts.path,
-            'similarity_name': sim_name
-        }
-        params_senteval.update(params_experiment)
-
-        se = senteval.engine.SE(params_senteval, batcher, prepare)
-        result = se.eval(transfer_tasks)
-        result_dict = {
-            'param': params_experiment,
-            'eval': result
-        }
-        results.append(result_dict)
+    # number of worker processes, None for all cores
+    processes = None
+
+    # experiments already in the store are not run again
+    store = utils.ResultsStore(os.path.join(PATH_TO_RESULTS, 'sif.jsonl'))
+    pending = [experiment for experiment in experiments
+               if not store.has(experiment_params(experiment), transfer_tasks)]
+
+    logging.info('Running {0} experiments, {1} already done. Good luck! :)\n\n\n'.format(
+        len(pending), len(experiments) - len(pending)))
+
+    grid.run_grid(pending,
+                  functools.partial(run_experiment,
+                                    transfer_tasks=transfer_tasks),
+                  processes=processes,
+                  key=lambda experiment: experiment[0],
+                  on_result=lambda idx, result_dict: store.add(result_dict))
+
+    results = [store.get(experiment_params(experiment), transfer_tasks)
+               for experiment in experiments]
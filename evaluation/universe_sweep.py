@@ -0,0 +1,152 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+# This source code is derived from SentEval source code.
+# SentEval Copyright (c) 2017-present, Facebook, Inc.
+# ==============================================================================
+
+from __future__ import absolute_import, division, unicode_literals
+
+import sys
+import time
+import logging
+import numpy as np
+
+# Set PATHs
+PATH_TO_SENTEVAL = '../'
+PATH_TO_DATA = '../data'
+
+sys.path.insert(0, PATH_TO_SENTEVAL)
+import senteval
+import utils
+from similarity.fuzzy import fbow_jaccard_factory
+from similarity.universe import kmeans_universe, random_universe, svd_universe
+from fuzzy_universes import prepare, batcher
+
+# Set up logger
+logging.basicConfig(format='%(asctime)s : %(message)s', level=logging.DEBUG)
+
+
+def build_universe(builder, k, vocab_matrix):
+    """
+    :param builder: 'kmeans', 'random', 'svd' or 'top_words'
+    :param k: size of the universe
+    :param vocab_matrix: word embeddings of the most frequent words
+    :return: the universe matrix U with shape (k, d)
+    """
+    if builder == 'kmeans':
+        return kmeans_universe(vocab_matrix, k)
+    if builder == 'random':
+        return random_universe(vocab_matrix.shape[1], k)
+    if builder == 'svd':
+        return svd_universe(vocab_matrix, k)
+    if builder == 'top_words':
+        return np.array(vocab_matrix[:k], dtype=np.float64)
+    raise ValueError('Unknown universe builder {0}'.format(builder))
+
+
+def timed(similarity, stats):
+    """
+    :param similarity: similarity between two sentences
+    :param stats: dict accumulating the number of pairs and seconds spent scoring
+    :return: the similarity, timed
+    """
+    def timed_similarity(x, y):
+        start = time.perf_counter()
+        score = similarity(x, y)
+        stats['seconds'] += time.perf_counter() - start
+        stats['pairs'] += 1
+        return score
+    return timed_similarity
+
+
+def smallest_universes(results, tolerance):
+    """
+    :param results: list of result dicts of the sweep
+    :param tolerance: accepted loss in correlation
+    :return: dict containing builder: result of the smallest universe within
+             tolerance of the best correlation of the builder
+    """
+    smallest = {}
+    for builder in set(result['param']['builder'] for result in results):
+        runs = [result for result in results if result['param']['builder'] == builder]
+        best = max(result['pearson'] for result in runs)
+        smallest[builder] = min((result for result in runs if result['pearson'] >= best - tolerance),
+                                key=lambda result: result['param']['k'])
+    return smallest
+
+
+if __name__ == "__main__":
+    # Reports STS correlation against scoring throughput of FBoW-Jaccard
+    # for universes of growing size
+    transfer_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']
+    word_vec_name = 'glove'
+    dtype = 'float64'
+    vocab_size = 100000
+    tolerance = 0.005
+    sweep = [
+        ('kmeans', [50, 100, 300, 1000, 3000]),
+        ('random', [50, 100, 300, 1000, 3000]),
+        ('svd', [50, 100, 200, 300]),
+        ('top_words', [1000, 3000, 10000, 30000, 100000])
+    ]
+
+    wv_path = utils.get_word_vec_path_by_name(word_vec_name)
+    vocab_matrix = utils.load_wordvec_matrix(wv_path, lo=0, hi=vocab_size)
+
+    results = []
+    for builder, sizes in sweep:
+        for k in sizes:
+            start = time.perf_counter()
+            U = build_universe(builder, k, vocab_matrix)
+            build_seconds = time.perf_counter() - start
+
+            logging.info('Word vectors: {0}'.format(word_vec_name))
+            logging.info('Universe: {0}, K = {1}'.format(builder, k))
+            logging.info('BEGIN\n\n\n')
+
+            stats = {'pairs': 0, 'seconds': 0.}
+            params_experiment = {
+                'word_vec_name': word_vec_name,
+                'similarity_name': 'fbow_jaccard',
+                'dtype': dtype,
+                'builder': builder,
+                'k': k
+            }
+            params_senteval = {
+                'task_path': PATH_TO_DATA
+            }
+            params_senteval.update(params_experiment)
+            params_senteval['similarity'] = timed(
+                fbow_jaccard_factory(U.astype(dtype), dtype=dtype), stats)
+
+            se = senteval.engine.SE(params_senteval, batcher, prepare)
+            result = se.eval(transfer_tasks)
+            results.append({
+                'param': params_experiment,
+                'eval': result,
+                'pearson': np.mean([result[task]['all']['pearson']['wmean']
+                                    for task in transfer_tasks]),
+                'pairs_per_second': stats['pairs'] / stats['seconds'],
+                'build_seconds': build_seconds
+            })
+
+    logging.info('builder      K  pearson  pairs/s  build (s)')
+    for result in results:
+        logging.info('{0:10} {1:6d}  {2:.4f}  {3:7.0f}  {4:.1f}'.format(
+            result['param']['builder'], result['param']['k'], result['pearson'],
+            result['pairs_per_second'], result['build_seconds']))
+    for builder, result in sorted(smallest_universes(results, tolerance).items()):
+        logging.info('Smallest {0} universe within {1} of its best pearson: K = {2}'.format(
+            builder, tolerance, result['param']['k']))
@@ -19,9 +19,14 @@
 from __future__ import absolute_import, division, unicode_literals
 
 import io
+import os
+import json
+import hashlib
+import collections
 import numpy as np
 import logging
 from sklearn.decomposition import TruncatedSVD
+from similarity.store import VectorStore
 
 
 WORD_VEC_MAP = {
@@ -40,10 +45,14 @@ WORD_VEC_MAP = {
 
 # Create dictionary
 def create_dictionary(sentences, threshold=0):
-    words = {}
-    for s in sentences:
-        for word in s:
-            words[word] = words.get(word, 0) + 1
+    if hasattr(sentences, 'vocab'):
+        # word counts of compiled tasks, see senteval.dataset.Samples
+        words = dict(sentences.vocab)
+    else:
+        words = {}
+        for s in sentences:
+            for word in s:
+                words[word] = words.get(word, 0) + 1
 
     if threshold > 0:
         newwords = {}
@@ -68,20 +77,45 @@ def create_dictionary(sentences, threshold=0):
 # Get word vectors from vocabulary (glove, word2vec, fasttext ..)
 def get_wordvec(path_to_vec, word2id,
                 norm=False,
-                path_to_counts=None):
+                path_to_counts=None,
+                dtype=np.float64):
     """
-    Loads words and word vectors from a text file
+    Loads words and word vectors from a binary store if one was created with
+    convert_wordvec_to_binary, and from a text file otherwise. Text files are
+    read through their byte offset index, see index_wordvec_text
     :param path_to_vec: path to word vector file in word2vec format
     :param word2id: words to load
     :param norm: normalise word vectors
     :param path_to_counts: path to word counts (enables SIF weights)
-    :return: dict containing word: word vector
+    :param dtype: floating point type of the loaded vectors, normalisation
+                  and weighting are always done in float64
+    :return: VectorStore with the word vectors
     """
     word_vec = {}
     word_freq_map = None
     if path_to_counts:
         word_freq_map = _get_word_freq_map(path_to_counts)
 
+    path_to_store = get_binary_store_path(path_to_vec)
+    if os.path.exists(path_to_store + '.npy'):
+        word_vec = _get_wordvec_from_store(path_to_store, word2id,
+                                           norm=norm,
+                                           word_freq_map=word_freq_map,
+                                           dtype=dtype)
+        logging.info('Found {0} words with word vectors, out of \
+            {1} words'.format(len(word_vec), len(word2id)))
+        return word_vec
+
+    index = _load_text_index(path_to_vec)
+    if index is not None:
+        word_vec = _get_wordvec_from_index(path_to_vec, index, word2id,
+                                           norm=norm,
+                                           word_freq_map=word_freq_map,
+                                           dtype=dtype)
+        logging.info('Found {0} words with word vectors, out of \
+            {1} words'.format(len(word_vec), len(word2id)))
+        return word_vec
+
     with io.open(path_to_vec, 'r', encoding='utf-8', errors='ignore') as f:
         next(f)  # always skip the first line, contains num of words and dim
         for line in f:
@@ -96,7 +130,225 @@ def get_wordvec(path_to_vec, word2id,
 
     logging.info('Found {0} words with word vectors, out of \
         {1} words'.format(len(word_vec), len(word2id)))
-    return word_vec
+    return VectorStore(list(word_vec.keys()), list(word_vec.values()),
+                       dim=_get_wordvec_dim(path_to_vec),
+                       dtype=dtype)
+
+
+def _get_wordvec_dim(path_to_vec):
+    with io.open(path_to_vec, 'r', encoding='utf-8', errors='ignore') as f:
+        return int(next(f).split()[1])
+
+
+def _get_wordvec_from_store(path_to_store, word2id, norm=False, word_freq_map=None,
+                            dtype=np.float64):
+    """
+    Gathers the requested word vectors from a memory-mapped binary store
+    :param path_to_store: path to the binary store without extension
+    :param word2id: words to load
+    :param norm: normalise word vectors
+    :param word_freq_map: dict containing word: word freq. (enables SIF weights)
+    :param dtype: floating point type of the loaded vectors
+    :return: VectorStore with the word vectors
+    """
+    vocab_index = _load_vocab_index(path_to_store)
+    words = [word for word in word2id if word in vocab_index]
+    rows = np.array([vocab_index[word] for word in words], dtype=np.int64)
+    # gather in file order so that the memory map is read sequentially
+    order = np.argsort(rows)
+    words = [words[i] for i in order]
+    matrix = np.load(path_to_store + '.npy', mmap_mode='r')
+    vectors = np.array(matrix[rows[order]], dtype=np.float64)
+    if norm:
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    if word_freq_map:
+        vectors *= np.array([_get_word_weight(word, word_freq_map)
+                             for word in words])[:, None]
+    return VectorStore(words, vectors, dim=matrix.shape[1], dtype=dtype)
+
+
+def get_binary_store_path(path_to_vec):
+    """
+    Path of the binary store of a word vector file, without extension.
+    The store consists of the vector matrix (.npy) and its vocabulary (.vocab)
+    :param path_to_vec: path to word vector file in word2vec format
+    :return: path to the binary store
+    """
+    return os.path.splitext(path_to_vec)[0]
+
+
+def _load_vocab_index(path_to_store):
+    """
+    Loads the vocabulary of a binary store
+    :param path_to_store: path to the binary store without extension
+    :return: dict containing word: row in the vector matrix
+    """
+    with io.open(path_to_store + '.vocab', 'r', encoding='utf-8', newline='\n') as f:
+        words = f.read().split('\n')[:-1]
+    # duplicated words resolve to the last occurrence, as in the text loader
+    return {word: idx for idx, word in enumerate(words)}
+
+
+def convert_wordvec_to_binary(path_to_vec, path_to_store=None, dtype=np.float64):
+    """
+    Converts a word vector file in word2vec text format into a binary store:
+    a contiguous matrix in .npy format and the list of words in .vocab, one
+    word per line. Lines whose dimension does not match the header are skipped
+    :param path_to_vec: path to word vector file in word2vec format
+    :param path_to_store: path to the binary store without extension
+    :param dtype: floating point type of the stored matrix
+    :return: path to the binary store
+    """
+    if path_to_store is None:
+        path_to_store = get_binary_store_path(path_to_vec)
+    logging.info('Converting {0} to {1}.npy'.format(path_to_vec, path_to_store))
+
+    words = []
+    with io.open(path_to_vec, 'r', encoding='utf-8', errors='ignore') as f:
+        num_words, dim = (int(n) for n in next(f).split())
+        matrix = np.lib.format.open_memmap(path_to_store + '.tmp.npy', mode='w+',
+                                           dtype=dtype, shape=(num_words, dim))
+        for line in f:
+            if len(words) == num_words:
+                break
+            word, vec = line.split(' ', 1)
+            np_vector = np.fromstring(vec, sep=' ')
+            if np_vector.shape[0] != dim:
+                continue
+            matrix[len(words)] = np_vector
+            words.append(word)
+
+    if len(words) < num_words:
+        logging.info('Skipped {0} malformed lines'.format(num_words - len(words)))
+        trimmed = np.lib.format.open_memmap(path_to_store + '.npy', mode='w+',
+                                            dtype=dtype, shape=(len(words), dim))
+        trimmed[:] = matrix[:len(words)]
+        del trimmed, matrix
+        os.remove(path_to_store + '.tmp.npy')
+    else:
+        del matrix
+        os.rename(path_to_store + '.tmp.npy', path_to_store + '.npy')
+
+    with io.open(path_to_store + '.vocab', 'w', encoding='utf-8', newline='\n') as f:
+        for word in words:
+            f.write(word + '\n')
+
+    logging.info('Converted {0}, Vocab size: {1}'.format(path_to_vec, len(words)))
+    return path_to_store
+
+
+def get_text_index_path(path_to_vec):
+    """
+    Path of the byte offset index of a word vector text file, without
+    extension. The index consists of the offset of every line after the
+    header followed by the file size (.npy) and the word of every line
+    (.vocab), one word per line
+    :param path_to_vec: path to word vector file in word2vec format
+    :return: path to the index
+    """
+    return get_binary_store_path(path_to_vec) + '.idx'
+
+
+def index_wordvec_text(path_to_vec, path_to_index=None):
+    """
+    Indexes a word vector file in word2vec text format, so that single words
+    and slices of rows are read with seeks instead of a scan of the file
+    :param path_to_vec: path to word vector file in word2vec format
+    :param path_to_index: path to the index without extension
+    :return: path to the index
+    """
+    if path_to_index is None:
+        path_to_index = get_text_index_path(path_to_vec)
+    logging.info('Indexing {0}'.format(path_to_vec))
+
+    offsets = []
+    tmp_path = '{0}.{1}.tmp'.format(path_to_index, os.getpid())
+    try:
+        with io.open(path_to_vec, 'rb') as f, \
+                io.open(tmp_path + '.vocab', 'w', encoding='utf-8', newline='\n') as vocab:
+            pos = len(next(f))
+            for line in f:
+                offsets.append(pos)
+                pos += len(line)
+                vocab.write(line.split(b' ', 1)[0].decode('utf-8', 'ignore') + '\n')
+            offsets.append(pos)
+        np.save(tmp_path + '.npy', np.array(offsets, dtype=np.int64))
+        # the offsets are written last, they tell whether the index is fresh
+        os.replace(tmp_path + '.vocab', path_to_index + '.vocab')
+        os.replace(tmp_path + '.npy', path_to_index + '.npy')
+    except OSError:
+        # e.g. a full disk, no partial index is left behind
+        for path in (tmp_path + '.vocab', tmp_path + '.npy'):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    logging.info('Indexed {0}, Vocab size: {1}'.format(path_to_vec, len(offsets) - 1))
+    return path_to_index
+
+
+def _load_text_index(path_to_vec):
+    """
+    Loads the index of a word vector text file, indexing the file first if
+    the index is missing or older than the file
+    :param path_to_vec: path to word vector file in word2vec format
+    :return: (words, offsets), or None if the file cannot be indexed, e.g.
+             in a read-only directory, and must be scanned
+    """
+    path_to_index = get_text_index_path(path_to_vec)
+    offsets = None
+    if os.path.exists(path_to_index + '.npy') and \
+            os.path.getmtime(path_to_index + '.npy') >= os.path.getmtime(path_to_vec):
+        offsets = np.load(path_to_index + '.npy')
+    if offsets is None or offsets[-1] != os.path.getsize(path_to_vec):
+        try:
+            index_wordvec_text(path_to_vec, path_to_index)
+        except OSError as e:
+            logging.warning('Cannot index {0} ({1}), scanning it'.format(path_to_vec, e))
+            return None
+        offsets = np.load(path_to_index + '.npy')
+    with io.open(path_to_index + '.vocab', 'r', encoding='utf-8', newline='\n') as f:
+        words = f.read().split('\n')[:-1]
+    return words, offsets
+
+
+def _get_wordvec_from_index(path_to_vec, index, word2id, norm=False, word_freq_map=None,
+                            dtype=np.float64):
+    """
+    Reads the requested word vectors from a text file with seeks
+    :param path_to_vec: path to word vector file in word2vec format
+    :param index: (words, offsets) of the file, see _load_text_index
+    :param word2id: words to load
+    :param norm: normalise word vectors
+    :param word_freq_map: dict containing word: word freq. (enables SIF weights)
+    :param dtype: floating point type of the loaded vectors
+    :return: VectorStore with the word vectors
+    """
+    words, offsets = index
+    # duplicated words resolve to the last occurrence, as in the scan
+    rows = {word: idx for idx, word in enumerate(words) if word in word2id}
+    words = sorted(rows, key=rows.get)
+    dim = _get_wordvec_dim(path_to_vec)
+    with io.open(path_to_vec, 'rb') as f:
+        lines = []
+        for word in words:
+            f.seek(offsets[rows[word]])
+            lines.append(f.read(offsets[rows[word] + 1] - offsets[rows[word]]))
+    vectors = _parse_vectors(lines)
+    if norm:
+        vectors = [vector / np.linalg.norm(vector) for vector in vectors]
+    if word_freq_map:
+        vectors = [_get_word_weight(word, word_freq_map) * vector
+                   for word, vector in zip(words, vectors)]
+    return VectorStore(words, vectors, dim=dim, dtype=dtype)
+
+
+def _parse_vectors(lines):
+    """
+    :param lines: lines of a word vector text file
+    :return: list of word vectors
+    """
+    return [np.fromstring(line.split(b' ', 1)[1], sep=' ') for line in lines]
 
 
 def _get_word_freq_map(path_to_counts):
@@ -140,14 +392,216 @@ def get_word_vec_path_by_name(word_vec_name):
     return base_path + WORD_VEC_MAP[word_vec_name]
 
 
-def load_wordvec_matrix(path_to_vec, lo=0, hi=None):
+def get_word_vec_files(word_vec_name, path_to_counts=None):
+    """
+    Files the word vectors of an experiment may be loaded from, whose
+    identity keys the cached scores (see senteval.cache.ScoreCache)
+    :param word_vec_name: word vectors name, see WORD_VEC_MAP
+    :param path_to_counts: path to word counts (enables SIF weights)
+    :return: list of paths: text file, binary store and word counts
+    """
+    path_to_vec = get_word_vec_path_by_name(word_vec_name)
+    path_to_store = get_binary_store_path(path_to_vec)
+    files = [path_to_vec, path_to_store + '.npy', path_to_store + '.vocab']
+    if path_to_counts:
+        files.append(path_to_counts)
+    return files
+
+
+class WordVecCache(object):
+    """
+    In-process LRU cache of loaded word vectors, keyed by
+    (word_vec_name, norm, word_count_path, dtype). Entries grow to the union of the
+    vocabularies requested so far; only words never requested before are
+    loaded from disk and appended in place to the entry (VectorStore.extend),
+    so a merge does not copy the vectors already cached. Least recently used entries are evicted once the
+    vectors held exceed max_bytes
+    """
+    def __init__(self, max_bytes=8 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+
+    def get(self, word_vec_name, word2id, norm=False, path_to_counts=None,
+            dtype=np.float64):
+        """
+        Word vectors for the requested vocabulary
+        :param word_vec_name: word vectors name, see WORD_VEC_MAP
+        :param word2id: words to load
+        :param norm: normalise word vectors
+        :param path_to_counts: path to word counts (enables SIF weights)
+        :param dtype: floating point type of the loaded vectors
+        :return: VectorStore with the word vectors of a superset of word2id
+        """
+        key = (word_vec_name, norm, path_to_counts, np.dtype(dtype).name)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        else:
+            self.entries[key] = {'word_vec': None, 'requested': set()}
+        entry = self.entries[key]
+
+        missing = {word: None for word in word2id if word not in entry['requested']}
+        if missing or entry['word_vec'] is None:
+            logging.info('Loading {0} new words for {1}'.format(len(missing), key))
+            word_vec = get_wordvec(get_word_vec_path_by_name(word_vec_name), missing,
+                                   norm=norm,
+                                   path_to_counts=path_to_counts,
+                                   dtype=dtype)
+            if entry['word_vec'] is not None:
+                word_vec = entry['word_vec'].extend(word_vec)
+            entry['word_vec'] = word_vec
+            entry['requested'].update(missing)
+            self._evict()
+        else:
+            logging.info('Word vectors cache hit for {0}'.format(key))
+        return entry['word_vec']
+
+    def nbytes(self):
+        return sum(entry['word_vec'].nbytes for entry in self.entries.values())
+
+    def _evict(self):
+        # the most recently used entry is kept even if it exceeds the budget
+        while len(self.entries) > 1 and self.nbytes() > self.max_bytes:
+            key, _ = self.entries.popitem(last=False)
+            logging.info('Evicted {0} from word vectors cache'.format(key))
+
+
+WORD_VEC_CACHE = WordVecCache()
+
+
+class ResultsStore(object):
+    """
+    Append-only JSON lines file of evaluation results with one line per
+    experiment, task and dataset, keyed by a hash of the three. Results are
+    written as soon as an experiment finishes, so an interrupted grid is
+    resumed by skipping the experiments already in the store
+    """
+    def __init__(self, path):
+        self.path = path
+        self.records = collections.OrderedDict()
+        if os.path.exists(path):
+            self._load()
+        elif os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    @staticmethod
+    def key(params_experiment, task=None, dataset=None):
+        """
+        :param params_experiment: parameters of the experiment
+        :param task: task name
+        :param dataset: dataset name, 'all' for the averages
+        :return: hash of the arguments
+        """
+        blob = json.dumps([params_experiment, task, dataset], sort_keys=True)
+        return hashlib.sha1(blob.encode('utf8')).hexdigest()
+
+    def has(self, params_experiment, tasks):
+        """
+        :param params_experiment: parameters of the experiment
+        :param tasks: list of tasks
+        :return: True if the experiment completed on all tasks
+        """
+        # the averages are written last, after every dataset of the task
+        return all(self.key(params_experiment, task, 'all') in self.records
+                   for task in tasks)
+
+    def get(self, params_experiment, tasks):
+        """
+        :param params_experiment: parameters of the experiment
+        :param tasks: list of tasks
+        :return: result dict of the experiment
+        """
+        experiment = self.key(params_experiment)
+        evals = {task: collections.OrderedDict() for task in tasks}
+        for record in self.records.values():
+            if record['experiment'] == experiment and record['task'] in evals:
+                evals[record['task']][record['dataset']] = record['eval']
+        return {
+            'param': params_experiment,
+            'eval': evals
+        }
+
+    def add(self, result_dict):
+        """
+        Appends the results of an experiment
+        :param result_dict: dict containing param and eval of the experiment
+        """
+        params_experiment = result_dict['param']
+        experiment = self.key(params_experiment)
+        with io.open(self.path, 'a', encoding='utf8') as f:
+            for task, task_eval in result_dict['eval'].items():
+                datasets = [dataset for dataset in task_eval if dataset != 'all'] + ['all']
+                for dataset in datasets:
+                    record = {
+                        'key': self.key(params_experiment, task, dataset),
+                        'experiment': experiment,
+                        'param': params_experiment,
+                        'task': task,
+                        'dataset': dataset,
+                        'eval': _to_json(task_eval[dataset])
+                    }
+                    self.records[record['key']] = record
+                    f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _load(self):
+        with io.open(self.path, 'rb+') as f:
+            data = f.read()
+            # drop the last line of a write that was interrupted
+            end = data.rfind(b'\n') + 1
+            if end < len(data):
+                logging.warning('Dropping incomplete record at the end of {0}'.format(self.path))
+                f.truncate(end)
+        for line in data[:end].decode('utf8').splitlines():
+            record = json.loads(line)
+            self.records[record['key']] = record
+        logging.info('Loaded {0} results from {1}'.format(len(self.records), self.path))
+
+
+def _to_json(obj):
+    if isinstance(obj, dict):
+        return {key: _to_json(value) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (tuple, list)):
+        return [_to_json(value) for value in obj]
+    if isinstance(obj, (str, int, float, bool)) or obj is None:
+        return obj
+    # e.g. correlation results of newer scipy versions
+    return [_to_json(value) for value in obj]
+
+
+def load_wordvec_matrix(path_to_vec, lo=0, hi=None, dtype=np.float64):
     """
     Loads word vectors into a matrix
     :param path_to_vec: path to word vector file in word2vec format
     :param lo: start index
     :param hi: stop index
+    :param dtype: floating point type of the matrix
     :return: word vectors matrix
     """
+    path_to_store = get_binary_store_path(path_to_vec)
+    if os.path.exists(path_to_store + '.npy'):
+        logging.info('Mapping {0}.npy'.format(path_to_store))
+        matrix = np.load(path_to_store + '.npy', mmap_mode='r')[lo:hi or None]
+        # the memory map is only shared if no conversion is needed
+        return matrix if matrix.dtype == dtype else matrix.astype(dtype)
+
+    index = _load_text_index(path_to_vec)
+    if index is not None:
+        _, offsets = index
+        lo, hi, _ = slice(lo, hi or None).indices(len(offsets) - 1)
+        hi = max(lo, hi)
+        logging.info('Loading rows {0}:{1} of {2}'.format(lo, hi, path_to_vec))
+        with io.open(path_to_vec, 'rb') as f:
+            f.seek(offsets[lo])
+            data = f.read(offsets[hi] - offsets[lo])
+        bounds = offsets[lo:hi + 1] - offsets[lo]
+        lines = [data[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        return np.array(_parse_vectors(lines), dtype=dtype)
+
     logging.info('Loading {0}'.format(path_to_vec))
     word_vec_list = []
 
@@ -165,7 +619,7 @@ def load_wordvec_matrix(path_to_vec, lo=0, hi=None):
             word_vec_list.append(np_vector)
     logging.info('Loaded {0}, Vocab size: {1}'.format(path_to_vec,
                                                       len(word_vec_list)))
-    return np.array(word_vec_list)
+    return np.array(word_vec_list, dtype=dtype)
 
 
 def compute_pc(X, npc=1):
@@ -18,41 +18,50 @@
 
 from __future__ import absolute_import, division, unicode_literals
 
+import os
 import sys
 import logging
-from gensim.models import KeyedVectors
 
 # Set PATHs
 PATH_TO_SENTEVAL = '../'
 PATH_TO_DATA = '../data'
+PATH_TO_RESULTS = '../results'
+PATH_TO_SCORES = '../results/scores'
 
-import utils
 sys.path.insert(0, PATH_TO_SENTEVAL)
 import senteval
+import utils
+from similarity import get_batch_similarity_by_name
 
 # Set up logger
 logging.basicConfig(format='%(asctime)s : %(name)s : %(message)s', level=logging.DEBUG)
 
-#  Disable genism logging (too many WMD logs)
-logging.getLogger('gensim').setLevel(logging.ERROR)
-logging.getLogger('smart_open').setLevel(logging.ERROR)
-
 
 def prepare(params, samples):
+    _, params.word2id = utils.create_dictionary(samples)
+    _, vocab = utils.create_dictionary(params.all_samples or samples)
+    params.word_vec = utils.WORD_VEC_CACHE.get(params.word_vec_name, vocab)
     return
 
 
 def batcher(params, batch):
     batch = [sent if sent != [] else ['.'] for sent in batch]
-    return batch
+    return params.word_vec.batch(batch)
 
 
 if __name__ == "__main__":
     transfer_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']
     results = []
+    store = utils.ResultsStore(os.path.join(PATH_TO_RESULTS, 'wmd.jsonl'))
     for word_vec_name in ['glove', 'word2vec', 'fasttext']:
-        wv_path = utils.get_word_vec_path_by_name(word_vec_name)
-        w2v_model = KeyedVectors.load_word2vec_format(wv_path, binary=False)
+        params_experiment = {
+            'word_vec_name': word_vec_name,
+            'similarity_name': 'wmd'
+        }
+        if store.has(params_experiment, transfer_tasks):
+            logging.info('Skipping {0}, already in {1}'.format(params_experiment, store.path))
+            results.append(store.get(params_experiment, transfer_tasks))
+            continue
 
         logging.info('Word vectors: {0}'.format(word_vec_name))
         logging.info('Similarity: {0}'.format('wmd'))
@@ -61,12 +70,11 @@ if __name__ == "__main__":
         params_senteval = {
             'task_path': PATH_TO_DATA
         }
-        params_experiment = {
-            'word_vec_name': word_vec_name,
-            'similarity_name': 'wmd'
-        }
         params_senteval.update(params_experiment)
-        params_senteval['similarity'] = w2v_model.wmdistance
+        params_senteval['score_cache'] = PATH_TO_SCORES
+        params_senteval['score_key'] = params_experiment
+        params_senteval['score_files'] = utils.get_word_vec_files(word_vec_name)
+        params_senteval['batch_similarity'] = get_batch_similarity_by_name('wmd')
 
         se = senteval.engine.SE(params_senteval, batcher, prepare)
         result = se.eval(transfer_tasks)
@@ -74,4 +82,5 @@ if __name__ == "__main__":
             'param': params_experiment,
             'eval': result
         }
+        store.add(result_dict)
         results.append(result_dict)
@@ -0,0 +1,163 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Vectorized bootstrap confidence intervals for Pearson correlations.
+Resamples are drawn from the global numpy random state in the same order as
+scikits.bootstrap 0.3.3, which STSEval used before, so intervals match it for
+a fixed seed. scikits.bootstrap 1.x draws from its own numpy Generator and
+only agrees up to the Monte Carlo error. All resamples are evaluated at once
+from weighted moment sums instead of calling a statistic per resample
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import numpy as np
+from scipy.stats import norm
+
+
+def bootstrap_counts(n, n_samples=10000, block_size=1000):
+    """
+    Bootstrap resamples of n items as counts of every item
+    :param n: number of items
+    :param n_samples: number of resamples
+    :param block_size: number of resamples per block
+    :return: generator of count matrices with shape (block_size, n)
+    """
+    for lo in range(0, n_samples, block_size):
+        size = min(block_size, n_samples - lo)
+        indices = np.random.randint(n, size=(size, n))
+        indices += np.arange(size)[:, None] * n
+        yield np.bincount(indices.ravel(), minlength=size * n).reshape(size, n)
+
+
+def _moment_columns(gs, systems):
+    # columns g, g^2 and s, s^2, g*s for every system, all centered for accuracy
+    g = np.asarray(gs, dtype=np.float64)
+    s = np.asarray(systems, dtype=np.float64).reshape(-1, len(g)).T
+    g = g - g.mean()
+    s = s - s.mean(axis=0)
+    return np.hstack((g[:, None], g[:, None] ** 2, s, s ** 2, g[:, None] * s))
+
+
+def _pearson_from_sums(sums, n):
+    n_systems = (sums.shape[-1] - 2) // 3
+    sg = sums[..., 0:1]
+    sgg = sums[..., 1:2]
+    ss = sums[..., 2:2 + n_systems]
+    sss = sums[..., 2 + n_systems:2 + 2 * n_systems]
+    sgs = sums[..., 2 + 2 * n_systems:]
+    cov = n * sgs - sg * ss
+    var_g = n * sgg - sg ** 2
+    var_s = n * sss - ss ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = cov / np.sqrt(var_g * var_s)
+    return np.clip(r, -1., 1.)
+
+
+def pearson(gs, systems):
+    """
+    Pearson correlations between the gold scores and every system
+    :param gs: gold scores, shape (n,)
+    :param systems: system scores, shape (N, n)
+    :return: correlations, shape (N,)
+    """
+    columns = _moment_columns(gs, systems)
+    return _pearson_from_sums(columns.sum(axis=0), len(columns))
+
+
+def bootstrap_pearson(gs, systems, n_samples=10000):
+    """
+    Pearson correlations of every system on the same bootstrap resamples
+    :param gs: gold scores, shape (n,)
+    :param systems: system scores, shape (N, n)
+    :param n_samples: number of resamples
+    :return: correlations, shape (n_samples, N)
+    """
+    columns = _moment_columns(gs, systems)
+    n = len(columns)
+    return np.vstack([_pearson_from_sums(np.dot(counts, columns), n)
+                      for counts in bootstrap_counts(n, n_samples)])
+
+
+def jackknife_pearson(gs, systems):
+    """
+    Leave-one-out Pearson correlations of every system
+    :param gs: gold scores, shape (n,)
+    :param systems: system scores, shape (N, n)
+    :return: correlations, shape (n, N)
+    """
+    columns = _moment_columns(gs, systems)
+    return _pearson_from_sums(columns.sum(axis=0) - columns, len(columns) - 1)
+
+
+def bca_ci(stat, ostat, jstat, alpha=0.05):
+    """
+    Bias-corrected and accelerated bootstrap confidence intervals,
+    computed as in scikits.bootstrap 0.3.3 and vectorized over trailing axes
+    :param stat: bootstrap statistics, shape (n_samples, ...)
+    :param ostat: statistics on the original data, shape (...)
+    :param jstat: jackknife statistics, shape (n, ...)
+    :param alpha: significance level
+    :return: low and high ends of the intervals, shape (2, ...)
+    """
+    n_samples = len(stat)
+    stat = np.sort(stat, axis=0)
+    alphas = np.array([alpha / 2, 1 - alpha / 2])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z0 = norm.ppf(np.sum(stat < ostat, axis=0) / n_samples)
+        jdev = np.mean(jstat, axis=0) - jstat
+        a = np.sum(jdev ** 3, axis=0) / (6.0 * np.sum(jdev ** 2, axis=0) ** 1.5)
+        zs = z0 + norm.ppf(alphas).reshape(alphas.shape + (1,) * np.ndim(z0))
+        avals = norm.cdf(z0 + zs / (1 - a * zs))
+    nvals = np.nan_to_num(np.round((n_samples - 1) * avals)).astype(int)
+    return np.take_along_axis(stat, nvals, axis=0)
+
+
+def pearson_delta_ci(gs, sys_scores, sys_scores_base, alpha=0.05, n_samples=10000):
+    """
+    BCa confidence interval of pearson(gs, sys) - pearson(gs, sys_base)
+    :param gs: gold scores
+    :param sys_scores: system scores
+    :param sys_scores_base: baseline system scores
+    :param alpha: significance level
+    :param n_samples: number of bootstrap resamples
+    :return: low and high ends of the interval
+    """
+    systems = np.vstack((sys_scores, sys_scores_base))
+    stat = np.dot(bootstrap_pearson(gs, systems, n_samples), [1., -1.])
+    ostat = np.dot(pearson(gs, systems), [1., -1.])
+    jstat = np.dot(jackknife_pearson(gs, systems), [1., -1.])
+    return bca_ci(stat, ostat, jstat, alpha)
+
+
+def pearson_delta_matrix_ci(gs, systems, alpha=0.05, n_samples=10000):
+    """
+    BCa confidence intervals of pearson(gs, sys_i) - pearson(gs, sys_j) for
+    all pairs of systems, all computed from one set of bootstrap resamples
+    :param gs: gold scores, shape (n,)
+    :param systems: system scores, shape (N, n)
+    :param alpha: significance level
+    :param n_samples: number of bootstrap resamples
+    :return: deltas with shape (N, N) and intervals with shape (2, N, N)
+    """
+    stat = bootstrap_pearson(gs, systems, n_samples)
+    ostat = pearson(gs, systems)
+    jstat = jackknife_pearson(gs, systems)
+    delta = ostat[:, None] - ostat[None, :]
+    # one row of the matrix at a time keeps memory at n_samples x N
+    conf_int = np.stack([bca_ci(stat[:, i:i + 1] - stat, delta[i], jstat[:, i:i + 1] - jstat, alpha)
+                         for i in range(len(ostat))], axis=1)
+    return delta, conf_int
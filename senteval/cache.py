@@ -0,0 +1,103 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+On-disk cache of per-pair similarity scores
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import json
+import hashlib
+import numpy as np
+
+
+class ScoreCache(object):
+    """
+    Directory of per-pair score arrays, one .npy file per scores vector,
+    named by a fingerprint of the scoring configuration and sentence pairs
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(score_key, name, task, dataset, pairs, files=None):
+        """
+        :param score_key: JSON serializable description of the scoring
+        configuration, e.g. word vectors parameters
+        :param name: name of the scores, e.g. the similarity name
+        :param task: task name
+        :param dataset: dataset name
+        :param pairs: digest of the sentence pairs, see pairs_digest
+        :param files: identity of the files the scores depend on, see files_identity
+        :return: fingerprint of the scores
+        """
+        blob = json.dumps([score_key, name, task, dataset, pairs, files], sort_keys=True)
+        return hashlib.sha1(blob.encode('utf8')).hexdigest()
+
+    @staticmethod
+    def files_identity(paths):
+        """
+        :param paths: paths to the files the scores depend on, e.g. word vectors
+        :return: list of [absolute path, size, mtime], size and mtime are None
+                 for missing files so that creating them changes the identity
+        """
+        identity = []
+        for path in paths or []:
+            path = os.path.abspath(path)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                identity.append([path, stat.st_size, stat.st_mtime])
+            else:
+                identity.append([path, None, None])
+        return identity
+
+    @staticmethod
+    def pairs_digest(input1, input2):
+        """
+        :param input1: first sentences, each a list of words
+        :param input2: second sentences, each a list of words
+        :return: digest of the sentence pairs
+        """
+        digest = hashlib.sha1()
+        for sent1, sent2 in zip(input1, input2):
+            digest.update(' '.join(sent1).encode('utf8'))
+            digest.update(b'\t')
+            digest.update(' '.join(sent2).encode('utf8'))
+            digest.update(b'\n')
+        return digest.hexdigest()
+
+    def load(self, fingerprint):
+        """
+        :param fingerprint: fingerprint of the scores
+        :return: array of scores or None if they are not cached
+        """
+        path = os.path.join(self.path, fingerprint + '.npy')
+        if not os.path.exists(path):
+            return None
+        return np.load(path)
+
+    def save(self, fingerprint, scores):
+        """
+        :param fingerprint: fingerprint of the scores
+        :param scores: scores of every pair
+        """
+        path = os.path.join(self.path, fingerprint + '.npy')
+        # concurrent writers of the same scores each write a complete file
+        tmp_path = '{0}.{1}.tmp.npy'.format(path[:-4], os.getpid())
+        np.save(tmp_path, np.asarray(scores))
+        os.replace(tmp_path, path)
@@ -0,0 +1,201 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Compiled STS datasets.
+The sentence pairs of a task are tokenized and sorted once and stored in a
+cache directory as int32 token ids with offsets into a task vocabulary, gold
+scores and the sort permutation. Later loads read the arrays and rebuild the
+sentences from the vocabulary instead of splitting and sorting the text files
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+
+
+class Samples(list):
+    """
+    Sentences of compiled tasks. vocab contains word: number of occurrences
+    in order of first occurrence, taken from the compiled token ids, so that
+    dictionaries are built without going through the tokens again (see
+    create_dictionary in evaluation/utils.py)
+    """
+    def __init__(self, sentences, vocab):
+        """
+        :param sentences: list of sentences, each a list of words
+        :param vocab: dict containing word: number of occurrences in sentences
+        """
+        list.__init__(self, sentences)
+        self.vocab = vocab
+
+
+def concat_samples(samples):
+    """
+    :param samples: list of sample lists
+    :return: the concatenated samples, Samples if they all know their vocab
+    """
+    sentences = [sent for task_samples in samples for sent in task_samples]
+    if not all(isinstance(task_samples, Samples) for task_samples in samples):
+        return sentences
+    vocab = {}
+    for task_samples in samples:
+        for word, count in task_samples.vocab.items():
+            vocab[word] = vocab.get(word, 0) + count
+    return Samples(sentences, vocab)
+
+
+def get_compiled_path(fpath, compiled_path=None):
+    """
+    :param fpath: path to the task directory
+    :param compiled_path: directory of the compiled tasks, defaults to
+                          $XDG_CACHE_HOME/fuzzymax/sts (~/.cache/fuzzymax/sts)
+    :return: directory of the compiled task
+    """
+    if compiled_path is None:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        compiled_path = os.path.join(cache_home, 'fuzzymax', 'sts')
+    fpath = os.path.abspath(fpath)
+    # tasks of different data directories do not collide
+    digest = hashlib.sha1(fpath.encode('utf8')).hexdigest()[:12]
+    return os.path.join(compiled_path, '{0}.{1}'.format(os.path.basename(fpath), digest))
+
+
+def load_sts(fpath, datasets, compiled_path=None):
+    """
+    Loads the sentence pairs of a task, compiling it first if needed
+    :param fpath: path to the task directory
+    :param datasets: dataset names
+    :param compiled_path: directory of the compiled tasks, see get_compiled_path
+    :return: dict containing dataset: (sent1, sent2, gs_scores) sorted by length,
+             and dict containing word: number of occurrences, None if the task
+             could not be compiled
+    """
+    path = get_compiled_path(fpath, compiled_path)
+    if not _is_fresh(path, fpath, datasets):
+        try:
+            compile_sts(fpath, datasets, path)
+        except OSError as e:
+            logging.warning('Cannot compile {0} ({1}), reading text files'.format(fpath, e))
+            return {dataset: _read_dataset(fpath, dataset)[:3] for dataset in datasets}, None
+
+    with io.open(os.path.join(path, 'vocab.json'), encoding='utf8') as f:
+        # every occurrence of a word is the same string object
+        vocab = np.array(json.load(f), dtype=object)
+    counts = np.zeros(len(vocab), dtype=np.int64)
+    data = {}
+    for dataset in datasets:
+        arrays = load_compiled_dataset(path, dataset)
+        counts += np.bincount(arrays['ids'], minlength=len(vocab))
+        tokens = vocab[arrays['ids']].tolist()
+        offsets = arrays['offsets'].tolist()
+        sents = [tokens[lo:hi] for lo, hi in zip(offsets[:-1], offsets[1:])]
+        n = len(arrays['gs'])
+        data[dataset] = (sents[:n], sents[n:], arrays['gs'].tolist())
+    # words are numbered by first occurrence, as a count over the sentences would find them
+    return data, {word: count for word, count in zip(vocab.tolist(), counts.tolist()) if count}
+
+
+def load_compiled_dataset(path, dataset):
+    """
+    :param path: path to the compiled task
+    :param dataset: dataset name
+    :return: dict of arrays: ids and offsets of the first sentences followed
+    by the second sentences, gs scores and perm, the index of every pair
+    among the scored lines of the text files
+    """
+    return {name: np.load(os.path.join(path, '{0}.{1}.npy'.format(dataset, name)))
+            for name in ('ids', 'offsets', 'gs', 'perm')}
+
+
+def compile_sts(fpath, datasets, path):
+    """
+    Compiles the sentence pairs of a task
+    :param fpath: path to the task directory
+    :param datasets: dataset names
+    :param path: directory of the compiled task, see get_compiled_path
+    """
+    logging.info('Compiling {0} into {1}'.format(fpath, path))
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    os.makedirs(tmp_path)
+
+    vocab = {}
+    for dataset in datasets:
+        sent1, sent2, gs_scores, perm = _read_dataset(fpath, dataset)
+        ids = [vocab.setdefault(word, len(vocab)) for sent in sent1 + sent2 for word in sent]
+        offsets = np.cumsum([0] + [len(sent) for sent in sent1 + sent2])
+        arrays = {
+            'ids': np.array(ids, dtype=np.int32),
+            'offsets': offsets.astype(np.int64),
+            'gs': np.array(gs_scores, dtype=np.float64),
+            'perm': np.array(perm, dtype=np.int64)
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, '{0}.{1}.npy'.format(dataset, name)), array)
+
+    with io.open(os.path.join(tmp_path, 'vocab.json'), 'w', encoding='utf8') as f:
+        f.write(json.dumps(sorted(vocab, key=vocab.get), ensure_ascii=False))
+    # the manifest is written last, a compiled task without it is recompiled
+    with io.open(os.path.join(tmp_path, 'manifest.json'), 'w', encoding='utf8') as f:
+        f.write(json.dumps(_manifest(fpath, datasets)))
+
+    if _is_fresh(path, fpath, datasets):
+        # compiled concurrently by another process
+        shutil.rmtree(tmp_path)
+        return
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+def _read_dataset(fpath, dataset):
+    sent1, sent2 = zip(*[l.split("\t") for l in
+                       io.open(fpath + '/STS.input.%s.txt' % dataset,
+                               encoding='utf8').read().splitlines()])
+    raw_scores = io.open(fpath + '/STS.gs.%s.txt' % dataset,
+                         encoding='utf8').read().splitlines()
+    not_empty_idx = [idx for idx, score in enumerate(raw_scores) if score != '']
+
+    gs_scores = [float(raw_scores[idx]) for idx in not_empty_idx]
+    sent1 = [sent1[idx].split() for idx in not_empty_idx]
+    sent2 = [sent2[idx].split() for idx in not_empty_idx]
+    # sort data by length to minimize padding in batcher
+    perm = sorted(range(len(gs_scores)),
+                  key=lambda i: (len(sent1[i]), len(sent2[i]), gs_scores[i]))
+    return ([sent1[i] for i in perm], [sent2[i] for i in perm],
+            [gs_scores[i] for i in perm], perm)
+
+
+def _manifest(fpath, datasets):
+    files = {}
+    for dataset in datasets:
+        for name in ('STS.input.%s.txt' % dataset, 'STS.gs.%s.txt' % dataset):
+            stat = os.stat(os.path.join(fpath, name))
+            files[name] = [stat.st_size, stat.st_mtime]
+    return files
+
+
+def _is_fresh(path, fpath, datasets):
+    manifest_path = os.path.join(path, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return False
+    with io.open(manifest_path, encoding='utf8') as f:
+        return json.load(f) == _manifest(fpath, datasets)
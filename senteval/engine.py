@@ -23,8 +23,13 @@ Generic sentence evaluation scripts wrapper
 '''
 from __future__ import absolute_import, division, unicode_literals
 
+import logging
 from senteval import utils
+from senteval.profiling import Profiler, NULL_PROFILER
+from senteval.representations import RepresentationCache
 from senteval.sts import STS12Eval, STS13Eval, STS14Eval, STS15Eval, STS16Eval
+from senteval.streaming import StreamingEval, SampleChain
+from senteval.dataset import concat_samples
 
 
 class SE(object):
@@ -34,30 +39,103 @@ class SE(object):
         params.seed = 1111 if 'seed' not in params else params.seed
 
         params.batch_size = 128 if 'batch_size' not in params else params.batch_size
+        # pairs are scored in parallel by that many processes (or threads),
+        # batchers must then be deterministic to give the serial scores
+        params.workers = 1 if 'workers' not in params else params.workers
+        params.worker_type = 'process' if 'worker_type' not in params else params.worker_type
+        # dict containing name: path to a pair file evaluated as a streaming task,
+        # read by chunks of stream_chunk_size pairs with 'exact' or 'approx' Spearman
+        params.streaming_tasks = {} if 'streaming_tasks' not in params else params.streaming_tasks
+        params.stream_chunk_size = 100000 if 'stream_chunk_size' not in params \
+            else params.stream_chunk_size
+        params.stream_spearman = 'exact' if 'stream_spearman' not in params else params.stream_spearman
+        assert params.stream_spearman in ('exact', 'approx')
+        # directory of the compiled STS tasks, see senteval.dataset.get_compiled_path
+        params.compiled_path = None if 'compiled_path' not in params else params.compiled_path
+        # time the phases of the evaluation per task and dataset, see senteval.profiling;
+        # the records are in self.profiler and written to profile_path as JSON if set
+        params.profile = False if 'profile' not in params else params.profile
+        params.profile_memory = True if 'profile_memory' not in params else params.profile_memory
+        self.profiler = Profiler(memory=params.profile_memory) if params.profile else NULL_PROFILER
+        params.profiler = self.profiler
         self.params = params
 
         # batcher and prepare
         self.batcher = batcher
         self.prepare = prepare if prepare else lambda x, y: None
 
-        self.list_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']
+        self.list_tasks = ['STS12', 'STS13', 'STS14', 'STS15', 'STS16'] + \
+            list(params.streaming_tasks)
+        self.evaluations = {}
+        # 'task' shares sentence representations between the pairs of a task,
+        # 'global' between all tasks if the batcher does not depend on the task
+        assert params.cache_representations in (None, False, 'task', 'global')
+        self.representations = RepresentationCache()
 
     def eval(self, name):
         # evaluate on evaluation [name], either takes string or list of strings
         if (isinstance(name, list)):
-            self.results = {x: self.eval(x) for x in name}
-            return self.results
+            # load all tasks first so that prepare can see the union of their samples
+            self.evaluations = {x: self.load_task(x) for x in name}
+            if any(self.evaluations[x].streaming for x in name):
+                self.params.all_samples = SampleChain([self.evaluations[x].samples for x in name])
+            else:
+                self.params.all_samples = concat_samples([self.evaluations[x].samples
+                                                          for x in name])
+            if self.params.cache_representations and isinstance(self.params.all_samples, list):
+                logging.info('{0} sentences, {1} unique'.format(
+                    len(self.params.all_samples),
+                    len(set(tuple(sample) for sample in self.params.all_samples))))
+            self.results = {x: self._eval_task(x) for x in name}
+        else:
+            # samples of an earlier list of tasks must not leak into prepare
+            self.params.all_samples = None
+            self._eval_task(name)
 
-        tpath = self.params.task_path
-        assert name in self.list_tasks, str(name) + ' not in ' + str(self.list_tasks)
+        if self.params.profile and self.params.profile_path:
+            self.profiler.to_json(self.params.profile_path)
+        return self.results
 
-        # STS tasks only
-        if name in ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']:
-            fpath = name + '-en-test'
-            self.evaluation = eval(name + 'Eval')(tpath + '/downstream/STS/' + fpath, seed=self.params.seed)
+    def _eval_task(self, name):
+        if name in self.evaluations:
+            self.evaluation = self.evaluations.pop(name)
+        else:
+            self.evaluation = self.load_task(name)
 
         self.params.current_task = name
-        self.evaluation.do_prepare(self.params, self.prepare)
-        self.results = self.evaluation.run(self.params, self.batcher)
+        with self.profiler.phase('prepare', name):
+            self.evaluation.do_prepare(self.params, self.prepare)
+        if self.params.cache_representations and not self.evaluation.streaming:
+            if self.params.cache_representations == 'task':
+                self.representations.clear()
+            hits, lookups = self.representations.hits, self.representations.lookups
+            with self.profiler.phase('run', name):
+                self.results = self.evaluation.run(self.params,
+                                                   self.representations.wrap(self.batcher))
+            if self.representations.lookups > lookups:
+                logging.info('{0} : representations hit rate {1:.1%} ({2:.1%} overall)'.format(
+                    name,
+                    (self.representations.hits - hits) / (self.representations.lookups - lookups),
+                    self.representations.hit_rate))
+        else:
+            with self.profiler.phase('run', name):
+                self.results = self.evaluation.run(self.params, self.batcher)
 
         return self.results
+
+    def load_task(self, name):
+        assert name in self.list_tasks, str(name) + ' not in ' + str(self.list_tasks)
+        with self.profiler.phase('load', name):
+            return self._load_task(name)
+
+    def _load_task(self, name):
+        tpath = self.params.task_path
+
+        if name in self.params.streaming_tasks:
+            return StreamingEval(self.params.streaming_tasks[name], seed=self.params.seed)
+
+        # STS tasks only
+        if name in ['STS12', 'STS13', 'STS14', 'STS15', 'STS16']:
+            fpath = name + '-en-test'
+            return eval(name + 'Eval')(tpath + '/downstream/STS/' + fpath, seed=self.params.seed,
+                                       compiled_path=self.params.compiled_path)
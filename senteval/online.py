@@ -0,0 +1,333 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Correlations of streams of score pairs fed chunk by chunk.
+Pearson is computed from running moments in constant memory. Spearman is
+either exact, ranking the pairs with an external merge sort on disk, or
+approximate, from a fixed grid of quantile bins
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from scipy.stats import t as student_t
+
+
+def correlation_pvalue(r, n):
+    """
+    Two-sided p-value of a correlation coefficient, as in scipy.stats
+    :param r: correlation coefficient
+    :param n: number of pairs
+    :return: p-value
+    """
+    if n <= 2 or np.isnan(r):
+        return np.nan
+    r = min(max(r, -1.), 1.)
+    if abs(r) == 1.:
+        return 0.
+    statistic = r * np.sqrt((n - 2) / ((1. + r) * (1. - r)))
+    return 2 * student_t.sf(abs(statistic), n - 2)
+
+
+class OnlinePearson(object):
+    """
+    Pearson correlation of a stream of pairs. Chunk moments are combined
+    with the pairwise update of Chan et al., which is stable for long streams
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.
+        self.mean_y = 0.
+        self.m2_x = 0.
+        self.m2_y = 0.
+        self.c_xy = 0.
+
+    def update(self, x, y):
+        """
+        :param x: first scores of a chunk of pairs
+        :param y: second scores of the chunk
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x) == 0:
+            return
+        chunk = OnlinePearson()
+        chunk.n = len(x)
+        chunk.mean_x = x.mean()
+        chunk.mean_y = y.mean()
+        dx = x - chunk.mean_x
+        dy = y - chunk.mean_y
+        chunk.m2_x = np.dot(dx, dx)
+        chunk.m2_y = np.dot(dy, dy)
+        chunk.c_xy = np.dot(dx, dy)
+        self.merge(chunk)
+
+    def merge(self, other):
+        """
+        :param other: OnlinePearson of other pairs of the stream
+        """
+        n = self.n + other.n
+        if other.n == 0:
+            return
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        self.m2_x += other.m2_x + delta_x * delta_x * weight
+        self.m2_y += other.m2_y + delta_y * delta_y * weight
+        self.c_xy += other.c_xy + delta_x * delta_y * weight
+        self.mean_x += delta_x * other.n / n
+        self.mean_y += delta_y * other.n / n
+        self.n = n
+
+    def correlation(self):
+        """
+        :return: (correlation, p-value), nan if either score is constant
+        """
+        denominator = np.sqrt(self.m2_x * self.m2_y)
+        r = self.c_xy / denominator if denominator > 0 else np.nan
+        return r, correlation_pvalue(r, self.n)
+
+
+class ExternalSpearman(object):
+    """
+    Exact Spearman correlation of a stream of pairs with memory bounded by
+    run_size pairs. Pairs are spilled to disk in runs sorted by x, the runs
+    are merged to rank x and spilled again sorted by y with their x rank,
+    and the second merge ranks y and feeds both ranks to OnlinePearson.
+    Ties get their average rank, as in scipy.stats.spearmanr
+    """
+    def __init__(self, run_size=100000, tmp_dir=None):
+        """
+        :param run_size: number of pairs sorted in memory at once
+        :param tmp_dir: directory of the runs, the system default if None
+        """
+        self.run_size = run_size
+        self.path = tempfile.mkdtemp(prefix='spearman.', dir=tmp_dir)
+        self.runs = _RunWriter(self.path, 'x', run_size)
+
+    def update(self, x, y):
+        """
+        :param x: first scores of a chunk of pairs
+        :param y: second scores of the chunk
+        """
+        self.runs.add(x, y)
+
+    def correlation(self):
+        """
+        :return: (correlation, p-value)
+        """
+        try:
+            # x ranks of ties spanning merged blocks, by their first position
+            spans_x = {}
+            runs_y = _RunWriter(self.path, 'y', self.run_size)
+            for block, ranks_x in _rank_blocks(_merge(self.runs.close(), self.run_size), spans_x):
+                runs_y.add(block[:, 1], ranks_x)
+
+            pearson = OnlinePearson()
+            # pairs whose y tie group continues in the next block
+            pending = OnlinePearson()
+            pending_start = None
+            spans_y = {}
+            for block, ranks_y in _rank_blocks(_merge(runs_y.close(), self.run_size), spans_y):
+                ranks_x = _resolve(block[:, 1], spans_x)
+                if pending_start in spans_y:
+                    pending.mean_y = spans_y[pending_start]
+                    pearson.merge(pending)
+                    pending, pending_start = OnlinePearson(), None
+                resolved = _resolve(ranks_y, spans_y)
+                known = ~np.isnan(resolved)
+                pearson.update(ranks_x[known], resolved[known])
+                if not known.all():
+                    pending_start = -ranks_y[~known][0]
+                    pending.update(ranks_x[~known], np.zeros((~known).sum()))
+            if pending_start is not None:
+                pending.mean_y = spans_y[pending_start]
+                pearson.merge(pending)
+            return pearson.correlation()
+        finally:
+            self.close()
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class SketchSpearman(object):
+    """
+    Approximate Spearman correlation of a stream of pairs from counts on a
+    bins x bins grid. The bin edges are the quantiles of the first chunk, so
+    the first chunk should be representative of the stream (e.g. shuffled
+    logs); pairs in the same bin are ties
+    """
+    def __init__(self, bins=1000):
+        """
+        :param bins: number of quantile bins of each score
+        """
+        self.bins = bins
+        self.edges_x = None
+        self.edges_y = None
+        self.counts = None
+
+    def update(self, x, y):
+        """
+        :param x: first scores of a chunk of pairs
+        :param y: second scores of the chunk
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        if len(x) == 0:
+            return
+        if self.counts is None:
+            quantiles = np.linspace(0, 1, self.bins + 1)[1:-1]
+            self.edges_x = np.unique(np.quantile(x, quantiles))
+            self.edges_y = np.unique(np.quantile(y, quantiles))
+            self.counts = np.zeros((len(self.edges_x) + 1, len(self.edges_y) + 1), dtype=np.int64)
+        bins_x = np.searchsorted(self.edges_x, x, side='right')
+        bins_y = np.searchsorted(self.edges_y, y, side='right')
+        self.counts += np.bincount(bins_x * self.counts.shape[1] + bins_y,
+                                   minlength=self.counts.size).reshape(self.counts.shape)
+
+    def correlation(self):
+        """
+        :return: (correlation, p-value)
+        """
+        if self.counts is None:
+            return np.nan, np.nan
+        n = self.counts.sum()
+        counts_x = self.counts.sum(axis=1)
+        counts_y = self.counts.sum(axis=0)
+        # average rank of the pairs of every bin
+        ranks_x = np.cumsum(counts_x) - (counts_x - 1) / 2
+        ranks_y = np.cumsum(counts_y) - (counts_y - 1) / 2
+        dx = ranks_x - np.dot(counts_x, ranks_x) / n
+        dy = ranks_y - np.dot(counts_y, ranks_y) / n
+        denominator = np.sqrt(np.dot(counts_x, dx * dx) * np.dot(counts_y, dy * dy))
+        r = dx.dot(self.counts).dot(dy) / denominator if denominator > 0 else np.nan
+        return r, correlation_pvalue(r, n)
+
+    def close(self):
+        pass
+
+
+class _RunWriter(object):
+    # buffers (key, payload) pairs and spills them in runs sorted by key
+    def __init__(self, path, name, run_size):
+        self.path = path
+        self.name = name
+        self.run_size = run_size
+        self.keys = []
+        self.payloads = []
+        self.size = 0
+        self.paths = []
+
+    def add(self, keys, payloads):
+        self.keys.append(np.asarray(keys, dtype=np.float64))
+        self.payloads.append(np.asarray(payloads, dtype=np.float64))
+        self.size += len(self.keys[-1])
+        if self.size >= self.run_size:
+            self.spill()
+
+    def spill(self):
+        if self.size == 0:
+            return
+        run = np.column_stack((np.concatenate(self.keys), np.concatenate(self.payloads)))
+        run = run[np.argsort(run[:, 0], kind='mergesort')]
+        path = os.path.join(self.path, '{0}.{1}.npy'.format(self.name, len(self.paths)))
+        np.save(path, run)
+        self.paths.append(path)
+        self.keys, self.payloads, self.size = [], [], 0
+
+    def close(self):
+        self.spill()
+        return self.paths
+
+
+def _merge(paths, run_size):
+    """
+    k-way merge of sorted runs, block by block
+    :param paths: paths to the runs, (key, payload) arrays sorted by key
+    :param run_size: number of pairs the merge may hold in memory
+    :return: generator of blocks of (key, payload) rows, sorted by key
+    """
+    runs = [np.load(path, mmap_mode='r') for path in paths]
+    block_size = max(1024, run_size // max(len(runs), 1))
+    positions = [0] * len(runs)
+    buffers = [np.zeros((0, 2)) for _ in runs]
+    while True:
+        for i, run in enumerate(runs):
+            if len(buffers[i]) < block_size and positions[i] < len(run):
+                block = np.array(run[positions[i]:positions[i] + block_size])
+                buffers[i] = np.concatenate((buffers[i], block))
+                positions[i] += len(block)
+        if not any(len(buffer) for buffer in buffers):
+            return
+        # rows up to the smallest last loaded key of unfinished runs are final
+        bound = min([buffers[i][-1, 0] for i, run in enumerate(runs)
+                     if positions[i] < len(run)] or [np.inf])
+        taken = []
+        for i, buffer in enumerate(buffers):
+            split = np.searchsorted(buffer[:, 0], bound, side='right')
+            taken.append(buffer[:split])
+            buffers[i] = buffer[split:]
+        block = np.concatenate(taken)
+        yield block[np.argsort(block[:, 0], kind='mergesort')]
+
+
+def _rank_blocks(blocks, spans):
+    """
+    Average ranks of the keys of merged blocks. The last tie group of a block
+    may continue in the next blocks: its rows get -start, the rank of its
+    first row, and spans[start] is set to its average rank once it ends
+    :param blocks: generator of (key, payload) blocks sorted by key
+    :param spans: dict filled with start: average rank
+    :return: generator of (block, ranks)
+    """
+    position = 0
+    open_start = None
+    open_key = None
+    for block in blocks:
+        keys = block[:, 0]
+        ranks = np.empty(len(keys))
+        lo = 0
+        if open_start is not None:
+            lo = np.searchsorted(keys, open_key, side='right')
+            ranks[:lo] = -open_start
+            if lo < len(keys):
+                spans[open_start] = open_start + (position + lo - open_start) / 2
+                open_start = None
+        if lo < len(keys):
+            group_keys = keys[lo:]
+            starts = np.flatnonzero(np.concatenate(([True], group_keys[1:] != group_keys[:-1])))
+            sizes = np.diff(np.append(starts, len(group_keys)))
+            ranks[lo:] = np.repeat(position + lo + starts + 1 + (sizes - 1) / 2, sizes)
+            open_start = position + lo + starts[-1] + 1
+            open_key = group_keys[-1]
+            ranks[lo + starts[-1]:] = -open_start
+        position += len(keys)
+        yield block, ranks
+    if open_start is not None:
+        spans[open_start] = open_start + (position - open_start) / 2
+
+
+def _resolve(ranks, spans):
+    # replaces -start by the average rank of the group, nan if it is still open
+    ranks = np.array(ranks)
+    negative = ranks < 0
+    for start in np.unique(-ranks[negative]):
+        ranks[ranks == -start] = spans.get(start, np.nan)
+    return ranks
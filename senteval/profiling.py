@@ -0,0 +1,149 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Phase-level timing of an evaluation: load, prepare, run, and within run
+batcher, similarity and statistics, per task and dataset
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import json
+import time
+import threading
+import tracemalloc
+import contextlib
+
+
+class Profiler(object):
+    """
+    Wall time, CPU time, number of calls and pairs and peak traced memory of
+    every (phase, task, dataset), summed over the calls of the phase.
+    Only phases of the thread and process that created the profiler are
+    recorded, those of scoring workers are not.
+    Memory is traced with tracemalloc while a phase is open, the peak of a
+    phase includes the peaks of the phases nested in it. Before Python 3.9
+    peaks cannot be reset and are the peaks since tracing started
+    """
+    def __init__(self, memory=True):
+        """
+        :param memory: trace the peak memory of the phases, which slows down
+                       allocations while a phase is open
+        """
+        self.memory = memory
+        self.records = {}
+        # peak memory of the open phases so far
+        self.peaks = []
+        self.tracing = False
+        self.pid = os.getpid()
+        self.thread = threading.current_thread()
+
+    def phase(self, name, task=None, dataset=None, pairs=0):
+        """
+        :param name: phase name
+        :param task: task name
+        :param dataset: dataset name
+        :param pairs: number of sentence pairs processed by the phase
+        :return: context manager timing the phase
+        """
+        if os.getpid() != self.pid or threading.current_thread() is not self.thread:
+            return _NULL_PHASE
+        return self._phase(name, task, dataset, pairs)
+
+    @contextlib.contextmanager
+    def _phase(self, name, task, dataset, pairs):
+        self._enter()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak = self._exit()
+            key = (name, task, dataset)
+            if key not in self.records:
+                self.records[key] = {'phase': name, 'task': task, 'dataset': dataset,
+                                     'calls': 0, 'pairs': 0, 'wall': 0., 'cpu': 0.,
+                                     'peak_bytes': None}
+            record = self.records[key]
+            record['calls'] += 1
+            record['pairs'] += pairs
+            record['wall'] += wall
+            record['cpu'] += cpu
+            if peak is not None:
+                record['peak_bytes'] = max(record['peak_bytes'] or 0, peak)
+
+    def to_list(self):
+        """
+        :return: list of records, in the order the phases were first closed
+        """
+        return [dict(record) for record in self.records.values()]
+
+    def to_json(self, path):
+        """
+        :param path: path of the JSON file
+        """
+        with io.open(path, 'w', encoding='utf8') as f:
+            f.write(json.dumps(self.to_list(), indent=1))
+
+    def _enter(self):
+        if not self.memory:
+            return
+        if not self.peaks and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        peak = tracemalloc.get_traced_memory()[1]
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self.peaks.append(0)
+
+    def _exit(self):
+        if not self.memory:
+            return None
+        peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], peak)
+        elif self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        return peak
+
+
+class NullProfiler(object):
+    """
+    Profiler recording nothing, its phases cost one call
+    """
+    def phase(self, name, task=None, dataset=None, pairs=0):
+        return _NULL_PHASE
+
+    def to_list(self):
+        return []
+
+
+class _NullPhase(object):
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,174 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Cache of sentence representations shared by all pairs referencing a sentence
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import threading
+import numpy as np
+
+
+class RepresentationCache(object):
+    """
+    Representations computed by a batcher, one per unique sentence.
+    Ragged batches (objects with ids, offsets and matrix such as
+    similarity.RaggedBatch) are kept as the token ids of every sentence in
+    one growing array, with the max-pooled vector of every sentence if the
+    batch has a max_pool method, so that a batch of cached sentences is put
+    together with a few vectorized gathers and carries its pooled vectors.
+    Matrices with one row per sentence (e.g. SIF embeddings) and lists are
+    cached item by item. The cache can be shared by the threads of a
+    scoring pool; forked worker processes fill their own copy
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.table = {}
+            self.ragged = None
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.
+
+    def wrap(self, batcher):
+        """
+        :param batcher: function (params, batch) returning representations
+        :return: batcher computing representations of unseen sentences only
+        """
+        def cached_batcher(params, batch):
+            return self.encode(params, batcher, batch)
+        return cached_batcher
+
+    def encode(self, params, batcher, batch):
+        """
+        :param params: senteval parameters
+        :param batcher: function (params, batch) returning representations
+        :param batch: list of sentences, each a list of words
+        :return: representations of the batch as returned by batcher
+        """
+        keys = [tuple(sent) for sent in batch]
+        with self.lock:
+            missing = [key for key in dict.fromkeys(keys) if key not in self.table]
+            self.lookups += len(keys)
+            self.hits += len(keys) - len(missing)
+        if missing:
+            # encoded outside the lock, a sentence encoded twice by two threads is kept once
+            output = batcher(params, [list(key) for key in missing])
+            with self.lock:
+                if hasattr(output, 'ids') and hasattr(output, 'offsets'):
+                    if self.ragged is None:
+                        self.ragged = _RaggedStore(type(output))
+                    values = self.ragged.add(output)
+                else:
+                    values = list(output)
+                for key, value in zip(missing, values):
+                    self.table.setdefault(key, value)
+        with self.lock:
+            values = [self.table[key] for key in keys]
+            if self.ragged is not None:
+                return self.ragged.combine(values)
+        if isinstance(values[0], np.ndarray):
+            return np.vstack(values)
+        return values
+
+
+class _RaggedStore(object):
+    # token ids, offsets, matrices and pooled vectors of the cached sentences of
+    # ragged batches, in arrays grown by doubling and indexed by sentence number
+    def __init__(self, cls):
+        self.cls = cls
+        self.count = 0
+        self.size = 0
+        self.ids = None
+        self.starts = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int64)
+        self.matrix_of = np.zeros(0, dtype=np.int32)
+        self.matrices = []
+        self.pooled = None
+        self.pooling = True
+
+    def add(self, output):
+        ids = np.asarray(output.ids)
+        offsets = np.asarray(output.offsets, dtype=np.int64)
+        n = len(offsets) - 1
+        matrix = next((i for i, m in enumerate(self.matrices) if m is output.matrix), None)
+        if matrix is None:
+            matrix = len(self.matrices)
+            self.matrices.append(output.matrix)
+
+        first = self.count
+        if self.ids is None:
+            self.ids = np.zeros(0, dtype=ids.dtype)
+        self.ids = _put(self.ids, self.size, ids[offsets[0]:offsets[-1]])
+        self.starts = _put(self.starts, first, self.size + offsets[:-1] - offsets[0])
+        self.lengths = _put(self.lengths, first, np.diff(offsets))
+        self.matrix_of = _put(self.matrix_of, first, np.full(n, matrix, dtype=np.int32))
+        self.size += offsets[-1] - offsets[0]
+        self.count += n
+
+        pooled = output.max_pool() if self.pooling and hasattr(output, 'max_pool') else None
+        if pooled is None or (self.pooled is not None and pooled.shape[1:] != self.pooled.shape[1:]):
+            self.pooling = False
+            self.pooled = None
+        else:
+            if self.pooled is None:
+                self.pooled = np.zeros((0,) + pooled.shape[1:], dtype=pooled.dtype)
+            self.pooled = _put(self.pooled, first, pooled)
+        return range(first, first + n)
+
+    def combine(self, sentences):
+        sentences = np.asarray(sentences, dtype=np.int64)
+        lengths = self.lengths[sentences]
+        offsets = np.zeros(len(sentences) + 1, dtype=self.ids.dtype)
+        np.cumsum(lengths, out=offsets[1:])
+        # position of every token of the batch in self.ids
+        index = np.repeat(self.starts[sentences] - offsets[:-1], lengths) + \
+            np.arange(offsets[-1], dtype=np.int64)
+        ids = self.ids[index]
+
+        matrix_of = self.matrix_of[sentences]
+        if (matrix_of == matrix_of[0]).all():
+            batch = self.cls(ids, offsets, self.matrices[matrix_of[0]])
+        else:
+            # sentences cached from different vector stores, gather their vectors
+            token_matrix = np.repeat(matrix_of, lengths)
+            first = self.matrices[matrix_of[0]]
+            vectors = np.zeros((len(ids),) + first.shape[1:], dtype=first.dtype)
+            for m in np.unique(matrix_of):
+                mask = token_matrix == m
+                vectors[mask] = self.matrices[m][ids[mask]]
+            batch = self.cls(np.arange(len(ids), dtype=ids.dtype), offsets, vectors)
+        if self.pooled is not None:
+            batch.pooled = self.pooled[sentences]
+        return batch
+
+
+def _put(array, used, values):
+    # writes values after the first used rows of array, growing it by doubling
+    end = used + len(values)
+    if end > len(array):
+        grown = np.zeros((max(end, 2 * len(array)),) + array.shape[1:], dtype=array.dtype)
+        grown[:used] = array[:used]
+        array = grown
+    array[used:end] = values
+    return array
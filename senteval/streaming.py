@@ -0,0 +1,139 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Streaming STS task over pair files too large to be held in memory.
+Lines are "sentence 1<TAB>sentence 2<TAB>gold score", lines without a score
+are skipped. Pairs are read and scored chunk by chunk and the correlations
+are computed online, see senteval.online
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import logging
+import itertools
+import numpy as np
+from senteval.sts import STSEval
+from senteval.online import OnlinePearson, ExternalSpearman, SketchSpearman
+from senteval.profiling import NULL_PROFILER
+
+
+class StreamingEval(STSEval):
+    # sentences are read lazily, they cannot be cached for the whole task
+    streaming = True
+
+    def __init__(self, fpath, seed=1111):
+        logging.debug('***** Transfer task : {0} (streaming) *****\n\n'.format(fpath))
+        self.seed = seed
+        self.fpath = fpath
+        self.datasets = [os.path.splitext(os.path.basename(fpath))[0]]
+        self.samples = PairFileSentences(fpath)
+
+    def do_prepare(self, params, prepare):
+        assert not self.compute_conf_intervals(params), \
+            'Confidence intervals need all the scores, they are not computed on streams'
+        self.set_similarities(params)
+        return prepare(params, self.samples)
+
+    def run(self, params, batcher):
+        np.random.seed(params.seed)
+        profiler = params.profiler or NULL_PROFILER
+        dataset = self.datasets[0]
+        names = list(params.similarity_names) if self.multi_similarity is not None else [None]
+        pearson = {name: OnlinePearson() for name in names}
+        spearman = {name: ExternalSpearman(params.stream_chunk_size, params.stream_tmp_dir)
+                    if params.stream_spearman == 'exact' else SketchSpearman()
+                    for name in names}
+        try:
+            for input1, input2, gs_scores in read_pairs(self.fpath, params.stream_chunk_size):
+                sys_scores, _ = self.score_pairs(params, batcher, input1, input2, dataset=dataset)
+                if self.multi_similarity is None:
+                    sys_scores = {None: sys_scores}
+                with profiler.phase('statistics', params.current_task, dataset, pairs=len(gs_scores)):
+                    for name in names:
+                        pearson[name].update(sys_scores[name], gs_scores)
+                        spearman[name].update(sys_scores[name], gs_scores)
+            with profiler.phase('statistics', params.current_task, dataset):
+                results = {name: self.summarize(pearson[name], spearman[name]) for name in names}
+        finally:
+            for estimator in spearman.values():
+                estimator.close()
+
+        if self.multi_similarity is not None:
+            return results
+        return results[None]
+
+    def summarize(self, pearson, spearman):
+        dataset = self.datasets[0]
+        results = {dataset: {'pearson': pearson.correlation(),
+                             'spearman': spearman.correlation(),
+                             'nsamples': pearson.n}}
+        logging.debug('%s : pearson = %.4f, spearman = %.4f, %d pairs' %
+                      (dataset, results[dataset]['pearson'][0],
+                       results[dataset]['spearman'][0], pearson.n))
+        # a single dataset, averages are its correlations
+        results['all'] = {'pearson': {'mean': results[dataset]['pearson'][0],
+                                      'wmean': results[dataset]['pearson'][0]},
+                          'spearman': {'mean': results[dataset]['spearman'][0],
+                                       'wmean': results[dataset]['spearman'][0]}}
+        return results
+
+
+class PairFileSentences(object):
+    """
+    Sentences of a pair file, read again on every iteration
+    """
+    def __init__(self, fpath):
+        self.fpath = fpath
+
+    def __iter__(self):
+        for input1, input2, _ in read_pairs(self.fpath):
+            for sent1, sent2 in zip(input1, input2):
+                yield sent1
+                yield sent2
+
+
+class SampleChain(object):
+    """
+    Samples of several tasks, read again on every iteration
+    """
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.samples)
+
+
+def read_pairs(fpath, chunk_size=100000):
+    """
+    Reads the scored pairs of a pair file chunk by chunk
+    :param fpath: path to the pair file
+    :param chunk_size: number of pairs per chunk
+    :return: generator of (sent1, sent2, gs_scores), sorted by length within
+             the chunk to minimize padding in batcher
+    """
+    with io.open(fpath, encoding='utf8') as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            pairs = [line.rstrip('\r\n').split('\t') for line in lines]
+            pairs = [(pair[0].split(), pair[1].split(), float(pair[2]))
+                     for pair in pairs if len(pair) == 3 and pair[2] != '']
+            if pairs:
+                pairs.sort(key=lambda z: (len(z[0]), len(z[1]), z[2]))
+                yield tuple(map(list, zip(*pairs)))
@@ -22,41 +22,61 @@ STS-{2012,2013,2014,2015,2016} (unsupervised)
 
 from __future__ import absolute_import, division, unicode_literals
 
-import io
 import numpy as np
 import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from scipy.stats import spearmanr, pearsonr
-import scikits.bootstrap as bstrap
 from senteval.utils import cosine
+from senteval.bootstrap import pearson_delta_ci
+from senteval.cache import ScoreCache
+from senteval.dataset import load_sts, Samples
+from senteval.profiling import NULL_PROFILER
+
+# evaluation being scored in parallel, inherited by the forked workers
+_SCORING_STATE = None
+
+
+def _score_chunk(chunk):
+    evaluation, params, batcher = _SCORING_STATE
+    dataset, lo, hi = chunk
+    # the global RNG is shared by the threads of a pool and is left alone, so batchers
+    # and similarities must be deterministic for chunks to score as the serial loop
+    return evaluation.score(params, batcher, dataset, lo, hi)
 
 
 class STSEval(object):
-    def loadFile(self, fpath):
-        self.data = {}
+    # all sentences are in memory, see senteval.streaming otherwise
+    streaming = False
+
+    def loadFile(self, fpath, compiled_path=None):
+        # pairs are tokenized and sorted by length once, see senteval.dataset
+        self.data, vocab = load_sts(fpath, self.datasets, compiled_path)
         self.samples = []
 
         for dataset in self.datasets:
-            sent1, sent2 = zip(*[l.split("\t") for l in
-                               io.open(fpath + '/STS.input.%s.txt' % dataset,
-                                       encoding='utf8').read().splitlines()])
-            raw_scores = np.array([x for x in
-                                   io.open(fpath + '/STS.gs.%s.txt' % dataset,
-                                           encoding='utf8')
-                                   .read().splitlines()])
-            not_empty_idx = raw_scores != ''
-
-            gs_scores = [float(x) for x in raw_scores[not_empty_idx]]
-            sent1 = np.array([s.split() for s in sent1])[not_empty_idx]
-            sent2 = np.array([s.split() for s in sent2])[not_empty_idx]
-            # sort data by length to minimize padding in batcher
-            sorted_data = sorted(zip(sent1, sent2, gs_scores),
-                                 key=lambda z: (len(z[0]), len(z[1]), z[2]))
-            sent1, sent2, gs_scores = map(list, zip(*sorted_data))
-
-            self.data[dataset] = (sent1, sent2, gs_scores)
+            sent1, sent2, gs_scores = self.data[dataset]
             self.samples += sent1 + sent2
+        if vocab is not None:
+            self.samples = Samples(self.samples, vocab)
 
     def do_prepare(self, params, prepare):
+        self.set_similarities(params)
+
+        # score_key must identify everything the scores depend on besides the pairs and
+        # the files in score_files, e.g. word vectors, whose path, size and mtime are added
+        if 'score_cache' in params and 'score_key' in params:
+            self.score_cache = ScoreCache(params.score_cache)
+        else:
+            self.score_cache = None
+        self.cached_scores = self.load_scores(params)
+        if len(self.cached_scores) == len(self.datasets):
+            logging.debug('All scores cached in {0}, skipping prepare'.format(params.score_cache))
+            return
+
+        return prepare(params, self.samples)
+
+    def set_similarities(self, params):
         if 'similarity' in params:
             self.similarity = lambda s1, s2: np.nan_to_num(
                 params.similarity(np.nan_to_num(s1), np.nan_to_num(s2)))
@@ -64,71 +84,203 @@ class STSEval(object):
             self.similarity = lambda s1, s2: np.nan_to_num(
                 cosine(np.nan_to_num(s1), np.nan_to_num(s2)))
 
+        if 'batch_similarity' in params:
+            self.batch_similarity = lambda b1, b2: np.nan_to_num(
+                params.batch_similarity(b1, b2))
+        else:
+            self.batch_similarity = None
+
+        if 'multi_similarity' in params:
+            assert 'similarity_names' in params
+            self.multi_similarity = lambda b1, b2: {
+                name: np.nan_to_num(scores)
+                for name, scores in params.multi_similarity(b1, b2).items()}
+        else:
+            self.multi_similarity = None
+
         if self.compute_conf_intervals(params):
             assert 'baseline_similarity' in params
             self.baseline_similarity = lambda s1, s2: np.nan_to_num(
                 params.baseline_similarity(np.nan_to_num(s1), np.nan_to_num(s2)))
 
-        return prepare(params, self.samples)
-
     def run(self, params, batcher):
         seed = params.seed
         np.random.seed(seed)
-        results = {}
-        for dataset in self.datasets:
+        sys_scores = {}
+        sys_scores_base = {}
+        datasets = [dataset for dataset in self.datasets if dataset not in self.cached_scores]
+        if params.workers > 1 and datasets:
+            # batcher and similarity phases are timed in the workers and not reported
+            profiler = params.profiler or NULL_PROFILER
+            with profiler.phase('score', params.current_task,
+                                pairs=sum(len(self.data[dataset][2]) for dataset in datasets)):
+                sys_scores, sys_scores_base = self.score_parallel(params, batcher, datasets)
+        else:
+            for dataset in datasets:
+                sys_scores[dataset], sys_scores_base[dataset] = self.score(params, batcher, dataset)
+
+        for dataset in datasets:
+            if self.score_cache is not None:
+                self.save_scores(params, dataset, sys_scores[dataset], sys_scores_base[dataset])
+        for dataset, (scores, scores_base) in self.cached_scores.items():
+            sys_scores[dataset], sys_scores_base[dataset] = scores, scores_base
+
+        if self.multi_similarity is not None:
+            # one set of results per similarity, all from a single scoring pass
+            results = {}
+            for name in params.similarity_names:
+                np.random.seed(seed)
+                results[name] = self.evaluate(params,
+                                              {dataset: sys_scores[dataset][name]
+                                               for dataset in self.datasets},
+                                              sys_scores_base)
+            return results
+
+        # bootstrap resamples do not depend on how the pairs were scored
+        np.random.seed(seed)
+        return self.evaluate(params, sys_scores, sys_scores_base)
+
+    def score(self, params, batcher, dataset, lo=0, hi=None):
+        input1, input2, gs_scores = self.data[dataset]
+        return self.score_pairs(params, batcher, input1, input2, lo, hi, dataset=dataset)
+
+    def score_pairs(self, params, batcher, input1, input2, lo=0, hi=None, dataset=None):
+        profiler = params.profiler or NULL_PROFILER
+        task = params.current_task
+        if self.multi_similarity is not None:
+            sys_scores = {name: [] for name in params.similarity_names}
+        else:
             sys_scores = []
-            sys_scores_base = []
-            input1, input2, gs_scores = self.data[dataset]
-            for ii in range(0, len(gs_scores), params.batch_size):
-                batch1 = input1[ii:ii + params.batch_size]
-                batch2 = input2[ii:ii + params.batch_size]
-
-                # we assume get_batch already throws out the faulty ones
-                if len(batch1) == len(batch2) and len(batch1) > 0:
+        sys_scores_base = []
+        hi = len(input1) if hi is None else min(hi, len(input1))
+        for ii in range(lo, hi, params.batch_size):
+            batch1 = input1[ii:min(ii + params.batch_size, hi)]
+            batch2 = input2[ii:min(ii + params.batch_size, hi)]
+
+            # we assume get_batch already throws out the faulty ones
+            if len(batch1) == len(batch2) and len(batch1) > 0:
+                with profiler.phase('batcher', task, dataset, pairs=len(batch1)):
                     enc1 = batcher(params, batch1)
                     enc2 = batcher(params, batch2)
 
-                    for kk in range(len(enc2)):
-                        sys_score = self.similarity(enc1[kk], enc2[kk])
-                        sys_scores.append(sys_score)
-
-                        if self.compute_conf_intervals(params):
+                with profiler.phase('similarity', task, dataset, pairs=len(batch1)):
+                    if self.multi_similarity is not None:
+                        multi_scores = self.multi_similarity(enc1, enc2)
+                        for name in params.similarity_names:
+                            sys_scores[name].extend(multi_scores[name])
+                    elif self.batch_similarity is not None:
+                        sys_scores.extend(self.batch_similarity(enc1, enc2))
+                    else:
+                        for kk in range(len(enc2)):
+                            sys_score = self.similarity(enc1[kk], enc2[kk])
+                            sys_scores.append(sys_score)
+
+                if self.compute_conf_intervals(params):
+                    with profiler.phase('baseline_similarity', task, dataset, pairs=len(batch1)):
+                        for kk in range(len(enc2)):
                             sys_score_base = self.baseline_similarity(enc1[kk], enc2[kk])
                             sys_scores_base.append(sys_score_base)
 
-            results[dataset] = {'pearson': pearsonr(sys_scores, gs_scores),
-                                'spearman': spearmanr(sys_scores, gs_scores),
-                                'nsamples': len(sys_scores)}
-
-            if self.compute_conf_intervals(params):
-                r_sys = pearsonr(gs_scores, sys_scores)[0]
-                r_sys_base = pearsonr(gs_scores, sys_scores_base)[0]
-
-                data = list(zip(gs_scores, sys_scores, sys_scores_base))
-
-                def statistic(data):
-                    gs = data[:, 0]
-                    sys = data[:, 1]
-                    sysb = data[:, 2]
-                    r1 = pearsonr(gs, sys)[0]
-                    r2 = pearsonr(gs, sysb)[0]
-                    return r1 - r2
-
-                conf_int = bstrap.ci(data, statfunction=statistic, method='bca')
-                results[dataset]['conf_int'] = {
-                    'delta': r_sys - r_sys_base,
-                    'conf_int': list(conf_int),
-                    'baseline': r_sys_base
-                }
-
-                logging.debug('%s : r  = %.4f, r base = %.4f, delta = %.4f, CI = [%.4f, %.4f]' %
-                              (dataset, r_sys, r_sys_base, r_sys - r_sys_base,
-                               conf_int[0], conf_int[1]))
-
+        return sys_scores, sys_scores_base
+
+    def score_parallel(self, params, batcher, datasets):
+        """
+        Scores the pairs of the datasets in chunks of params.batch_size pairs
+        on params.workers forked processes, or threads if params.worker_type
+        is 'thread' or when running inside a worker process of a pool.
+        Scores are returned in the same order as with score
+        """
+        global _SCORING_STATE
+        chunks = [(dataset, lo, lo + params.batch_size)
+                  for dataset in datasets
+                  for lo in range(0, len(self.data[dataset][2]), params.batch_size)]
+
+        _SCORING_STATE = (self, params, batcher)
+        if params.worker_type == 'thread' or multiprocessing.current_process().daemon:
+            pool = ThreadPool(params.workers)
+        else:
+            pool = multiprocessing.get_context('fork').Pool(params.workers)
+        try:
+            scored = pool.map(_score_chunk, chunks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+            _SCORING_STATE = None
+
+        sys_scores = {}
+        sys_scores_base = {}
+        for dataset in datasets:
+            if self.multi_similarity is not None:
+                sys_scores[dataset] = {name: [] for name in params.similarity_names}
             else:
-                logging.debug('%s : pearson = %.4f, spearman = %.4f' %
-                              (dataset, results[dataset]['pearson'][0],
-                               results[dataset]['spearman'][0]))
+                sys_scores[dataset] = []
+            sys_scores_base[dataset] = []
+        for (dataset, _, _), (chunk_scores, chunk_scores_base) in zip(chunks, scored):
+            if self.multi_similarity is not None:
+                for name in params.similarity_names:
+                    sys_scores[dataset][name].extend(chunk_scores[name])
+            else:
+                sys_scores[dataset].extend(chunk_scores)
+            sys_scores_base[dataset].extend(chunk_scores_base)
+        return sys_scores, sys_scores_base
+
+    def score_names(self, params):
+        if self.multi_similarity is not None:
+            names = list(params.similarity_names)
+        else:
+            names = [params.similarity_name or 'similarity']
+        if self.compute_conf_intervals(params):
+            names.append('baseline')
+        return names
+
+    def score_fingerprints(self, params, dataset):
+        input1, input2, _ = self.data[dataset]
+        pairs = ScoreCache.pairs_digest(input1, input2)
+        files = ScoreCache.files_identity(params.score_files)
+        fingerprints = {}
+        for name in self.score_names(params):
+            key = name
+            if name == 'baseline':
+                # changing the baseline similarity must not reuse its old scores
+                key = 'baseline:' + (params.baseline_similarity_name or
+                                     getattr(params.baseline_similarity, '__name__', ''))
+            fingerprints[name] = ScoreCache.fingerprint(params.score_key, key, params.current_task,
+                                                        dataset, pairs, files)
+        return fingerprints
+
+    def load_scores(self, params):
+        cached = {}
+        if self.score_cache is None:
+            return cached
+        for dataset in self.datasets:
+            scores = {name: self.score_cache.load(fingerprint)
+                      for name, fingerprint in self.score_fingerprints(params, dataset).items()}
+            if any(value is None for value in scores.values()):
+                continue
+            scores_base = scores.pop('baseline', [])
+            if self.multi_similarity is None:
+                scores = scores.popitem()[1]
+            cached[dataset] = (scores, scores_base)
+        return cached
+
+    def save_scores(self, params, dataset, sys_scores, sys_scores_base):
+        fingerprints = self.score_fingerprints(params, dataset)
+        scores = dict(sys_scores) if self.multi_similarity is not None \
+            else {self.score_names(params)[0]: sys_scores}
+        if self.compute_conf_intervals(params):
+            scores['baseline'] = sys_scores_base
+        for name, values in scores.items():
+            self.score_cache.save(fingerprints[name], values)
+
+    def evaluate(self, params, all_sys_scores, all_sys_scores_base):
+        profiler = params.profiler or NULL_PROFILER
+        results = {}
+        for dataset in self.datasets:
+            with profiler.phase('statistics', params.current_task, dataset,
+                                pairs=len(all_sys_scores[dataset])):
+                results[dataset] = self.evaluate_dataset(params, dataset,
+                                                         all_sys_scores[dataset],
+                                                         all_sys_scores_base[dataset])
 
         weights = [results[dset]['nsamples'] for dset in results.keys()]
         list_prs = np.array([results[dset]['pearson'][0] for
@@ -152,51 +304,85 @@ class STSEval(object):
 
         return results
 
+    def evaluate_dataset(self, params, dataset, sys_scores, sys_scores_base):
+        # statistics are computed in double precision whatever the scores dtype
+        sys_scores = np.asarray(sys_scores, dtype=np.float64)
+        sys_scores_base = np.asarray(sys_scores_base, dtype=np.float64)
+        gs_scores = self.data[dataset][2]
+
+        result = {'pearson': pearsonr(sys_scores, gs_scores),
+                  'spearman': spearmanr(sys_scores, gs_scores),
+                  'nsamples': len(sys_scores)}
+        if params.keep_scores:
+            # kept for significance tests across systems, see senteval.bootstrap
+            result['sys_scores'] = sys_scores
+            result['gs_scores'] = np.asarray(gs_scores, dtype=np.float64)
+
+        if self.compute_conf_intervals(params):
+            r_sys = pearsonr(gs_scores, sys_scores)[0]
+            r_sys_base = pearsonr(gs_scores, sys_scores_base)[0]
+
+            conf_int = pearson_delta_ci(gs_scores, sys_scores, sys_scores_base)
+            result['conf_int'] = {
+                'delta': r_sys - r_sys_base,
+                'conf_int': list(conf_int),
+                'baseline': r_sys_base
+            }
+
+            logging.debug('%s : r  = %.4f, r base = %.4f, delta = %.4f, CI = [%.4f, %.4f]' %
+                          (dataset, r_sys, r_sys_base, r_sys - r_sys_base,
+                           conf_int[0], conf_int[1]))
+
+        else:
+            logging.debug('%s : pearson = %.4f, spearman = %.4f' %
+                          (dataset, result['pearson'][0], result['spearman'][0]))
+        return result
+
     @staticmethod
     def compute_conf_intervals(params):
         return 'conf_intervals' in params and params['conf_intervals']
 
 
 class STS12Eval(STSEval):
-    def __init__(self, taskpath, seed=1111):
+    def __init__(self, taskpath, seed=1111, compiled_path=None):
         logging.debug('***** Transfer task : STS12 *****\n\n')
         self.seed = seed
         self.datasets = ['MSRpar', 'MSRvid', 'SMTeuroparl',
                          'surprise.OnWN', 'surprise.SMTnews']
-        self.loadFile(taskpath)
+        self.loadFile(taskpath, compiled_path)
 
 
 class STS13Eval(STSEval):
     # STS13 here does not contain the "SMT" subtask due to LICENSE issue
-    def __init__(self, taskpath, seed=1111):
+    def __init__(self, taskpath, seed=1111, compiled_path=None):
         logging.debug('***** Transfer task : STS13 (-SMT) *****\n\n')
         self.seed = seed
         self.datasets = ['FNWN', 'headlines', 'OnWN']
-        self.loadFile(taskpath)
+        self.loadFile(taskpath, compiled_path)
 
 
 class STS14Eval(STSEval):
-    def __init__(self, taskpath, seed=1111):
+    def __init__(self, taskpath, seed=1111, compiled_path=None):
         logging.debug('***** Transfer task : STS14 *****\n\n')
         self.seed = seed
         self.datasets = ['deft-forum', 'deft-news', 'headlines',
                          'images', 'OnWN', 'tweet-news']
-        self.loadFile(taskpath)
+        self.loadFile(taskpath, compiled_path)
 
 
 class STS15Eval(STSEval):
-    def __init__(self, taskpath, seed=1111):
+    def __init__(self, taskpath, seed=1111, compiled_path=None):
         logging.debug('***** Transfer task : STS15 *****\n\n')
         self.seed = seed
         self.datasets = ['answers-forums', 'answers-students',
                          'belief', 'headlines', 'images']
-        self.loadFile(taskpath)
+        self.loadFile(taskpath, compiled_path)
 
 
 class STS16Eval(STSEval):
-    def __init__(self, taskpath, seed=1111):
+    def __init__(self, taskpath, seed=1111, compiled_path=None):
         logging.debug('***** Transfer task : STS16 *****\n\n')
         self.seed = seed
         self.datasets = ['answer-answer', 'headlines', 'plagiarism',
                          'postediting', 'question-question']
-        self.loadFile(taskpath)
+        self.loadFile(taskpath, compiled_path)
@@ -18,6 +18,10 @@ from .classical import *
 from .fuzzy import *
 from .ablation import *
 from .soft_card import *
+from .wmd import *
+from .universe import *
+from .batch import *
+from .store import *
 
 
 NAME_TO_SIM = {
@@ -26,6 +30,7 @@ NAME_TO_SIM = {
     'set_jaccard': set_jaccard,
     'bag_jaccard': bag_jaccard,
     'sc_jaccard': sc_jaccard,
+    'wmd': wmd,
 
     # Fuzzy set similarities
     'max_jaccard': max_jaccard,
@@ -41,5 +46,25 @@ NAME_TO_SIM = {
 }
 
 
+# Vectorized versions scoring a whole batch of sentence pairs in one call
+NAME_TO_BATCH_SIM = {
+    'max_jaccard': max_batched(jaccard_scores),
+    'dynamax_jaccard': batched(dynamax_jaccard_batch),
+    'dynamax_otsuka': batched(dynamax_otsuka_batch),
+    'dynamax_dice': batched(dynamax_dice_batch),
+    'dynamax_cosine': batched(dynamax_cosine_batch),
+    'sc_jaccard': batched(sc_jaccard_batch),
+    'wmd': batched(wmd_batch)
+}
+
+
 def get_similarity_by_name(sim_name):
     return NAME_TO_SIM[sim_name]
+
+
+def get_batch_similarity_by_name(sim_name):
+    return NAME_TO_BATCH_SIM[sim_name]
+
+
+def get_multi_similarity_by_names(sim_names):
+    return multi_batched(sim_names, NAME_TO_SIM)
@@ -0,0 +1,455 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+from .soft_card import multiset_sc_jaccard, vector_labels
+from .wmd import wmd_batch
+
+
+class RaggedBatch(object):
+    """
+    Batch of sentences stored as row ids into an embedding matrix.
+    Sentence i consists of the rows ids[offsets[i]:offsets[i + 1]], no
+    word vector is copied until the batch is scored
+    """
+    __slots__ = ('ids', 'offsets', 'matrix', 'pooled')
+
+    def __init__(self, ids, offsets, matrix, pooled=None):
+        """
+        :param ids: int32 array of row ids of all the words in the batch
+        :param offsets: int32 array of sentence offsets with shape (n + 1,)
+        :param matrix: embedding matrix the ids refer to
+        :param pooled: max-pooled sentence vectors if already known, see
+                       senteval.representations
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.matrix = matrix
+        self.pooled = pooled
+
+    def vectors(self):
+        """
+        :return: concatenated word embeddings with shape (N, d)
+        """
+        return self.matrix[self.ids]
+
+    def max_pool(self):
+        """
+        :return: max-pooled word embeddings of every sentence with shape (n, d),
+                 after the NaN/inf clean-up of the batch similarities
+        """
+        x, offsets = _finite_ragged(self)
+        if len(offsets) == 1 or np.diff(offsets).min() == 0:
+            return None
+        return segment_max(x, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        # word embeddings of the i-th sentence, as returned by the old batchers
+        return self.matrix[self.ids[self.offsets[i]:self.offsets[i + 1]]]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def ragged(sentences):
+    """
+    Packs a batch of sentences into the ragged form
+    :param sentences: RaggedBatch or list of sentences, each a non-empty
+                      list of word embeddings
+    :return: concatenated word embeddings with shape (N, d) and
+             sentence offsets with shape (n + 1,)
+    """
+    if isinstance(sentences, RaggedBatch):
+        return sentences.vectors(), sentences.offsets
+    offsets = np.zeros(len(sentences) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in sentences], out=offsets[1:])
+    return np.concatenate(sentences), offsets
+
+
+def pad_index(offsets):
+    """
+    Row indices padding a ragged batch to its longest sentence.
+    Shorter sentences are padded by repeating their last word, which leaves
+    max pooling unchanged
+    :param offsets: sentence offsets with shape (n + 1,), no empty sentences
+    :return: index matrix with shape (n, L)
+    """
+    lengths = np.diff(offsets)
+    positions = np.arange(lengths.max())
+    return offsets[:-1, None] + np.minimum(positions, lengths[:, None] - 1)
+
+
+def segment_max(x, offsets):
+    """
+    Max pooling over the sentences of a ragged batch
+    :param x: concatenated word embeddings with shape (N, d)
+    :param offsets: sentence offsets with shape (n + 1,), no empty sentences
+    :return: max-pooled sentence vectors with shape (n, d)
+    """
+    # one vectorized step per word position instead of one per sentence
+    index = pad_index(offsets)
+    m = x[index[:, 0]]
+    for j in range(1, index.shape[1]):
+        np.maximum(m, x[index[:, j]], out=m)
+    return m
+
+
+def max_jaccard_batch(x, x_offsets, y, y_offsets):
+    """
+    MaxPool-Jaccard similarity measure between the sentence pairs of a batch
+    :param x: concatenated word embeddings of the first sentences
+    :param x_offsets: offsets of the first sentences in x
+    :param y: concatenated word embeddings of the second sentences
+    :param y_offsets: offsets of the second sentences in y
+    :return: array of similarity scores, one per sentence pair
+    """
+    m_x = segment_max(x, x_offsets)
+    m_x = np.maximum(m_x, 0, m_x)
+    m_y = segment_max(y, y_offsets)
+    m_y = np.maximum(m_y, 0, m_y)
+    return jaccard_scores(m_x, m_y)
+
+
+def length_buckets(x_offsets, y_offsets, bucket_size=32):
+    """
+    Groups sentence pairs of similar total length
+    :param x_offsets: offsets of the first sentences
+    :param y_offsets: offsets of the second sentences
+    :param bucket_size: maximum number of pairs per bucket
+    :return: list of arrays with pair indices
+    """
+    lengths = np.diff(x_offsets) + np.diff(y_offsets)
+    order = np.argsort(lengths, kind='mergesort')
+    return [order[i:i + bucket_size] for i in range(0, len(order), bucket_size)]
+
+
+def pad_pairs(z, x_offsets, y_offsets, index):
+    """
+    Packs a bucket of sentence pairs into a zero-padded tensor.
+    Row i holds the words of the i-th first sentence followed by the words
+    of the i-th second sentence, i.e. the DynaMax universe of the pair
+    :param z: word embeddings of all first sentences, then all second
+              sentences, then a single zero row
+    :param x_offsets: offsets of the first sentences in z
+    :param y_offsets: offsets of the second sentences in z
+    :param index: indices of the B pairs in the bucket
+    :return: tensor with shape (B, L, d) and masks with shape (B, L)
+             marking the words of the first and the second sentences
+    """
+    x_starts = x_offsets[index]
+    x_lengths = x_offsets[index + 1] - x_starts
+    y_starts = y_offsets[index]
+    u_lengths = x_lengths + y_offsets[index + 1] - y_starts
+    positions = np.arange(u_lengths.max())
+    x_mask = positions < x_lengths[:, None]
+    y_mask = ~x_mask & (positions < u_lengths[:, None])
+    rows = np.full(x_mask.shape, len(z) - 1)
+    rows = np.where(x_mask, x_starts[:, None] + positions, rows)
+    rows = np.where(y_mask, (y_starts - x_lengths)[:, None] + positions, rows)
+    return z[rows], x_mask, y_mask
+
+
+def dynamax_memberships(u, x_mask, y_mask):
+    """
+    DynaMax membership vectors for a bucket of sentence pairs.
+    Padding universe elements are zero vectors and only ever get zero
+    memberships, so they leave every score unchanged
+    :param u: tensor with the universe of every pair, shape (B, L, d)
+    :param x_mask: mask of the first sentence words in u
+    :param y_mask: mask of the second sentence words in u
+    :return: membership vectors m_x and m_y, each with shape (B, L)
+    """
+    f = np.matmul(u, u.transpose(0, 2, 1))
+    # masked out words get membership 0, which the ReLU would clip to anyway
+    m_x = np.max(np.where(x_mask[:, :, None], f, 0), axis=1)
+    m_y = np.max(np.where(y_mask[:, :, None], f, 0), axis=1)
+    return m_x, m_y
+
+
+def jaccard_scores(m_x, m_y):
+    m_inter = np.sum(np.minimum(m_x, m_y), axis=1)
+    m_union = np.sum(np.maximum(m_x, m_y), axis=1)
+    return m_inter / m_union
+
+
+def otsuka_scores(m_x, m_y):
+    m_inter = np.sum(np.minimum(m_x, m_y), axis=1)
+    m_x_card = np.sum(m_x, axis=1)
+    m_y_card = np.sum(m_y, axis=1)
+    return m_inter / np.sqrt(m_x_card * m_y_card)
+
+
+def dice_scores(m_x, m_y):
+    f_inter = np.sum(np.minimum(m_x, m_y), axis=1)
+    m_x_card = np.sum(m_x, axis=1)
+    m_y_card = np.sum(m_y, axis=1)
+    return 2 * f_inter / (m_x_card + m_y_card)
+
+
+def cosine_scores(m_x, m_y):
+    dot = np.einsum('ij,ij->i', m_x, m_y)
+    return dot / (np.linalg.norm(m_x, axis=1) * np.linalg.norm(m_y, axis=1))
+
+
+def dynamax_batch(x, x_offsets, y, y_offsets, scores, bucket_size=32):
+    """
+    DynaMax similarity measure between the sentence pairs of a batch.
+    Pairs are bucketed by length and every bucket is fuzzified with one
+    batched matrix product
+    :param x: concatenated word embeddings of the first sentences
+    :param x_offsets: offsets of the first sentences in x
+    :param y: concatenated word embeddings of the second sentences
+    :param y_offsets: offsets of the second sentences in y
+    :param scores: function scoring the membership vectors, e.g. jaccard_scores
+    :param bucket_size: maximum number of pairs per bucket
+    :return: array of similarity scores, one per sentence pair
+    """
+    return dynamax_multi_batch(x, x_offsets, y, y_offsets, {None: scores},
+                               bucket_size=bucket_size)[None]
+
+
+def dynamax_multi_batch(x, x_offsets, y, y_offsets, scores, bucket_size=32):
+    """
+    Several DynaMax similarity measures computed from one membership pass
+    :param x: concatenated word embeddings of the first sentences
+    :param x_offsets: offsets of the first sentences in x
+    :param y: concatenated word embeddings of the second sentences
+    :param y_offsets: offsets of the second sentences in y
+    :param scores: dict containing name: function scoring the membership vectors
+    :param bucket_size: maximum number of pairs per bucket
+    :return: dict containing name: array of similarity scores
+    """
+    z = np.concatenate((x, y, np.zeros((1, x.shape[1]), dtype=x.dtype)))
+    y_offsets = y_offsets + len(x)
+    sims = {name: np.zeros(len(x_offsets) - 1, dtype=z.dtype) for name in scores}
+    for index in length_buckets(x_offsets, y_offsets, bucket_size):
+        u, x_mask, y_mask = pad_pairs(z, x_offsets, y_offsets, index)
+        m_x, m_y = dynamax_memberships(u, x_mask, y_mask)
+        for name, score in scores.items():
+            sims[name][index] = score(m_x, m_y)
+    return sims
+
+
+def max_multi_batch(x, x_offsets, y, y_offsets, scores):
+    """
+    Several MaxPool similarity measures computed from one pooling pass
+    :param x: concatenated word embeddings of the first sentences
+    :param x_offsets: offsets of the first sentences in x
+    :param y: concatenated word embeddings of the second sentences
+    :param y_offsets: offsets of the second sentences in y
+    :param scores: dict containing name: function scoring the membership vectors
+    :return: dict containing name: array of similarity scores
+    """
+    m_x = segment_max(x, x_offsets)
+    m_x = np.maximum(m_x, 0, m_x)
+    m_y = segment_max(y, y_offsets)
+    m_y = np.maximum(m_y, 0, m_y)
+    return {name: score(m_x, m_y) for name, score in scores.items()}
+
+
+def stack_universes(universes):
+    """
+    :param universes: dict containing name: universe matrix U with shape (K, d)
+    :return: the stacked universes with shape (sum of K, d) and dict
+             containing name: slice of its rows in the stack
+    """
+    u = np.vstack(list(universes.values()))
+    bounds = np.cumsum([0] + [len(universe) for universe in universes.values()])
+    slices = {name: slice(lo, hi) for name, lo, hi in zip(universes, bounds[:-1], bounds[1:])}
+    return u, slices
+
+
+def fbow_multi_batch(x, x_offsets, y, y_offsets, u, slices, score=jaccard_scores):
+    """
+    FBoW similarity measure with several fixed universes between the
+    sentence pairs of a batch. The sentences are fuzzified against all the
+    stacked universes with one matrix product, so its size grows with the
+    batch size times the total size of the universes
+    :param x: concatenated word embeddings of the first sentences
+    :param x_offsets: offsets of the first sentences in x
+    :param y: concatenated word embeddings of the second sentences
+    :param y_offsets: offsets of the second sentences in y
+    :param u: stacked universes, see stack_universes
+    :param slices: dict containing name: slice of the universe in u
+    :param score: function scoring the membership vectors, e.g. jaccard_scores
+    :return: dict containing name: array of similarity scores
+    """
+    m_x = segment_max(np.dot(x, u.T), x_offsets)
+    m_x = np.maximum(m_x, 0, m_x)
+    m_y = segment_max(np.dot(y, u.T), y_offsets)
+    m_y = np.maximum(m_y, 0, m_y)
+    return {name: score(m_x[:, rows], m_y[:, rows]) for name, rows in slices.items()}
+
+
+def dynamax_jaccard_batch(x, x_offsets, y, y_offsets):
+    return dynamax_batch(x, x_offsets, y, y_offsets, jaccard_scores)
+
+
+def dynamax_otsuka_batch(x, x_offsets, y, y_offsets):
+    return dynamax_batch(x, x_offsets, y, y_offsets, otsuka_scores)
+
+
+def dynamax_dice_batch(x, x_offsets, y, y_offsets):
+    return dynamax_batch(x, x_offsets, y, y_offsets, dice_scores)
+
+
+def dynamax_cosine_batch(x, x_offsets, y, y_offsets):
+    return dynamax_batch(x, x_offsets, y, y_offsets, cosine_scores)
+
+
+DYNAMAX_SCORES = {
+    'dynamax_jaccard': jaccard_scores,
+    'dynamax_otsuka': otsuka_scores,
+    'dynamax_dice': dice_scores,
+    'dynamax_cosine': cosine_scores
+}
+
+MAX_SCORES = {
+    'max_jaccard': jaccard_scores,
+    'max_cosine': cosine_scores
+}
+
+
+def sc_jaccard_batch(x, x_offsets, y, y_offsets):
+    """
+    Soft cardinality Jaccard similarity of a batch of sentence pairs.
+    Words are labelled by their vectors once for the whole batch, the
+    multisets of every pair are then built from the integer labels
+    :param x: concatenated word embeddings of the first sentences
+    :param x_offsets: offsets of the first sentences in x
+    :param y: concatenated word embeddings of the second sentences
+    :param y_offsets: offsets of the second sentences in y
+    :return: array of similarity scores, one per sentence pair
+    """
+    v, labels = vector_labels(np.concatenate((x, y)))
+    x_labels = labels[:len(x)]
+    y_labels = labels[len(x):]
+    return np.array([multiset_sc_jaccard(v,
+                                         x_labels[x_offsets[i]:x_offsets[i + 1]],
+                                         y_labels[y_offsets[i]:y_offsets[i + 1]])
+                     for i in range(len(x_offsets) - 1)], dtype=x.dtype)
+
+
+# measures with a ragged batch version but no shared intermediate results
+RAGGED_SIMILARITIES = {
+    'sc_jaccard': sc_jaccard_batch,
+    'wmd': wmd_batch
+}
+
+
+def _max_pooled(sentences, x=None, offsets=None):
+    # rectified max-pooled vectors, from the pooled vectors the batch carries if any
+    pooled = getattr(sentences, 'pooled', None)
+    if pooled is not None:
+        return np.maximum(pooled, 0)
+    if x is None:
+        x, offsets = _finite_ragged(sentences)
+    pooled = segment_max(x, offsets)
+    return np.maximum(pooled, 0, pooled)
+
+
+def _finite_ragged(sentences):
+    # the same NaN/inf clean-up STSEval applies to every sentence
+    x, offsets = ragged(sentences)
+    if not np.isfinite(x).all():
+        x = np.nan_to_num(x, copy=False)
+    return x, offsets
+
+
+def batched(batch_similarity):
+    """
+    Adapts a ragged batch similarity to the output of the batcher
+    :param batch_similarity: similarity over (x, x_offsets, y, y_offsets)
+    :return: similarity over two equally sized lists of sentences
+    """
+    def similarity(batch1, batch2):
+        x, x_offsets = _finite_ragged(batch1)
+        y, y_offsets = _finite_ragged(batch2)
+        return batch_similarity(x, x_offsets, y, y_offsets)
+    return similarity
+
+
+def max_batched(scores):
+    """
+    Adapts a MaxPool score to the output of the batcher, using the pooled
+    vectors of batches that carry them
+    :param scores: function scoring the membership vectors, e.g. jaccard_scores
+    :return: similarity over two equally sized lists of sentences
+    """
+    def similarity(batch1, batch2):
+        return scores(_max_pooled(batch1), _max_pooled(batch2))
+    return similarity
+
+
+def multi_batched(sim_names, similarities):
+    """
+    Fused similarity computing several measures in one pass over a batch.
+    DynaMax and MaxPool measures share their membership vectors, measures in
+    RAGGED_SIMILARITIES use their batch version and any other measure is
+    computed pair by pair
+    :param sim_names: names of the similarity measures
+    :param similarities: dict containing name: similarity between two sentences
+    :return: similarity over two equally sized lists of sentences returning
+             a dict containing name: array of similarity scores
+    """
+    dynamax = {name: DYNAMAX_SCORES[name] for name in sim_names if name in DYNAMAX_SCORES}
+    maxpool = {name: MAX_SCORES[name] for name in sim_names if name in MAX_SCORES}
+    ragged_sims = {name: RAGGED_SIMILARITIES[name] for name in sim_names
+                   if name in RAGGED_SIMILARITIES}
+    others = [name for name in sim_names
+              if name not in dynamax and name not in maxpool and name not in ragged_sims]
+
+    def multi_similarity(batch1, batch2):
+        sims = {}
+        x, x_offsets, y, y_offsets = None, None, None, None
+        if dynamax or ragged_sims:
+            x, x_offsets = _finite_ragged(batch1)
+            y, y_offsets = _finite_ragged(batch2)
+            if dynamax:
+                sims.update(dynamax_multi_batch(x, x_offsets, y, y_offsets, dynamax))
+            for name, batch_similarity in ragged_sims.items():
+                sims[name] = batch_similarity(x, x_offsets, y, y_offsets)
+        if maxpool:
+            # sentence level, so they may come pooled from the representation cache
+            m_x = _max_pooled(batch1, x, x_offsets)
+            m_y = _max_pooled(batch2, y, y_offsets)
+            sims.update({name: score(m_x, m_y) for name, score in maxpool.items()})
+        for name in others:
+            similarity = similarities[name]
+            sims[name] = np.array([similarity(np.nan_to_num(s1), np.nan_to_num(s2))
+                                   for s1, s2 in zip(batch1, batch2)])
+        return sims
+    return multi_similarity
+
+
+def fbow_multi_batched(universes, score=jaccard_scores):
+    """
+    Fused FBoW similarity sweeping several fixed universes in one pass over
+    a batch, see fbow_multi_batch
+    :param universes: dict containing name: universe matrix U with shape (K, d)
+    :param score: function scoring the membership vectors, e.g. jaccard_scores
+    :return: similarity over two equally sized lists of sentences returning
+             a dict containing name: array of similarity scores
+    """
+    u, slices = stack_universes(universes)
+
+    def multi_similarity(batch1, batch2):
+        x, x_offsets = _finite_ragged(batch1)
+        y, y_offsets = _finite_ragged(batch2)
+        return fbow_multi_batch(x, x_offsets, y, y_offsets, u, slices, score=score)
+    return multi_similarity
@@ -13,7 +13,9 @@
 # limitations under the License.
 # ==============================================================================
 
+import threading
 import numpy as np
+from collections import OrderedDict
 
 
 def fuzzify(s, u):
@@ -97,16 +99,103 @@ def max_jaccard(x, y):
     return m_inter / m_union
 
 
-def fbow_jaccard_factory(u):
+class MembershipCache(object):
+    """
+    Memberships of single words to a fixed universe U, computed once per word.
+    The membership vector of a sentence is the max of the cached vectors of
+    its words, which equals fuzzify(s, u). Words are identified by their
+    embedding. Cached vectors are dense, or keep only the top_k largest
+    memberships for large universes (the others count as 0), and the least
+    recently used words are evicted when the cache exceeds max_bytes
+    """
+    def __init__(self, u, top_k=None, dtype=np.float64, max_bytes=2 ** 30):
+        """
+        :param u: the universe matrix U with shape (K, d)
+        :param top_k: number of memberships kept per word, None for all
+        :param dtype: floating point type of the cached memberships
+        :param max_bytes: memory bound of the cached memberships
+        """
+        self.u = u
+        self.top_k = top_k if top_k is not None and top_k < len(u) else None
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.rows = OrderedDict()
+        self.lock = threading.Lock()
+
+    def fuzzify(self, s):
+        """
+        :param s: list of word embeddings for the sentence
+        :return: membership vector for the sentence
+        """
+        s = np.asarray(s)
+        keys = [row.tobytes() for row in s]
+        rows = {}
+        with self.lock:
+            for key in keys:
+                if key in self.rows and key not in rows:
+                    self.rows.move_to_end(key)
+                    rows[key] = self.rows[key]
+        missing = list({key: i for i, key in enumerate(keys) if key not in rows}.values())
+        if missing:
+            f_s = np.dot(s[missing], self.u.T)
+            f_s = np.maximum(f_s, 0, f_s)
+            for i, f_w in zip(missing, f_s):
+                rows[keys[i]] = self._add(keys[i], f_w)
+
+        m_s = np.zeros(len(self.u), dtype=self.dtype)
+        for row in rows.values():
+            if self.top_k is None:
+                np.maximum(m_s, row, m_s)
+            else:
+                idx, values = row
+                m_s[idx] = np.maximum(m_s[idx], values)
+        return m_s
+
+    def _add(self, key, f_w):
+        if self.top_k is None:
+            row = f_w.astype(self.dtype)
+            nbytes = row.nbytes
+        else:
+            idx = np.argpartition(f_w, -self.top_k)[-self.top_k:].astype(np.int32)
+            row = (idx, f_w[idx].astype(self.dtype))
+            nbytes = idx.nbytes + row[1].nbytes
+        with self.lock:
+            if key not in self.rows:
+                self.rows[key] = row
+                self.nbytes += nbytes
+            while self.nbytes > self.max_bytes and len(self.rows) > 1:
+                _, evicted = self.rows.popitem(last=False)
+                self.nbytes -= (evicted.nbytes if self.top_k is None
+                                else evicted[0].nbytes + evicted[1].nbytes)
+        return row
+
+    def clear(self):
+        with self.lock:
+            self.rows.clear()
+            self.nbytes = 0
+
+
+def fbow_jaccard_factory(u, top_k=None, dtype=np.float64, max_bytes=2 ** 30, cache=None):
     """
     Factory for building FBoW-Jaccard similarity measures
-    with the custom universe matrix U
+    with the custom universe matrix U. Word memberships are cached,
+    see MembershipCache
     :param u: the universe matrix U
+    :param top_k: number of memberships kept per word, None for all
+    :param dtype: floating point type of the cached memberships, float32
+        halves their memory at a small loss of precision
+    :param max_bytes: memory bound of the cached memberships
+    :param cache: MembershipCache of U to use instead of a new one, which
+        top_k, dtype and max_bytes then do not apply to
     :return: similarity function
     """
+    if cache is None:
+        cache = MembershipCache(u, top_k=top_k, dtype=dtype, max_bytes=max_bytes)
+
     def u_jaccard(x, y):
-        m_x = fuzzify(x, u)
-        m_y = fuzzify(y, u)
+        m_x = cache.fuzzify(x)
+        m_y = cache.fuzzify(y)
 
         m_inter = np.sum(np.minimum(m_x, m_y))
         m_union = np.sum(np.maximum(m_x, m_y))
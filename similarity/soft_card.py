@@ -18,12 +18,67 @@ from collections import Counter
 
 
 def sc_jaccard(x, y):
-    xUy = munion(x, y)
-    sc_x = soft_cardinality(x)
-    sc_y = soft_cardinality(y)
-    sc_xUy = soft_cardinality(xUy)
-    sc_uIv = sc_x + sc_y - sc_xUy
-    return sc_uIv / sc_xUy
+    """
+    Soft cardinality Jaccard similarity between two sentences. Equal word
+    vectors are the same element of the multisets, see munion
+    :param x: list of word embeddings for the first sentence
+    :param y: list of word embeddings for the second sentence
+    :return: similarity score between the two sentences
+    """
+    v, labels = vector_labels(np.concatenate((x, y)))
+    return multiset_sc_jaccard(v, labels[:len(x)], labels[len(x):])
+
+
+def vector_labels(z):
+    """
+    Labels rows by their values, equal rows get the same label
+    :param z: matrix of word vectors
+    :return: distinct rows and the label of every row
+    """
+    index = {}
+    labels = np.array([index.setdefault(row.tobytes(), len(index)) for row in z],
+                      dtype=np.intp)
+    _, first = np.unique(labels, return_index=True)
+    return z[first], labels
+
+
+def multiset_sc_jaccard(v, x_labels, y_labels):
+    """
+    Soft cardinality Jaccard similarity between two multisets of vectors.
+    The union takes the larger multiplicity of every vector, and all three
+    soft cardinalities come from one Gram matrix of the distinct vectors
+    :param v: distinct word vectors
+    :param x_labels: rows of v of the words in the first sentence
+    :param y_labels: rows of v of the words in the second sentence
+    :return: similarity score between the two sentences
+    """
+    keys, first, inverse = np.unique(np.concatenate((x_labels, y_labels)),
+                                     return_index=True, return_inverse=True)
+    # vectors in order of first occurrence in the pair, as labelled by sc_jaccard, so that
+    # sums run in the same order and equal pairs get equal scores in any batch
+    order = np.argsort(first, kind='mergesort')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    keys = keys[order]
+    inverse = rank[inverse.ravel()]
+    c_x = np.bincount(inverse[:len(x_labels)], minlength=len(keys))
+    c_y = np.bincount(inverse[len(x_labels):], minlength=len(keys))
+    v = v[keys]
+    gram = np.dot(v, v.T)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # cs_ij = <v_i, v_j> / |v_j|^2 as in soft_cardinality
+        cs = np.clip(gram / np.diag(gram), a_min=0, a_max=None)
+        sc_x = _multiset_soft_cardinality(cs, c_x)
+        sc_y = _multiset_soft_cardinality(cs, c_y)
+        sc_xUy = _multiset_soft_cardinality(cs, np.maximum(c_x, c_y))
+        sc_uIv = sc_x + sc_y - sc_xUy
+        return sc_uIv / sc_xUy
+
+
+def _multiset_soft_cardinality(cs, counts):
+    # soft_cardinality of the multiset with every vector repeated counts times
+    present = counts > 0
+    return np.sum(counts[present] / np.dot(counts, cs)[present])
 
 
 def soft_cardinality(s):
@@ -0,0 +1,142 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+from .batch import RaggedBatch
+
+
+class VectorStore(object):
+    """
+    Word vectors held in one contiguous matrix with a word: row index.
+    The last row of the matrix is a zero vector standing in for sentences
+    without any known word. Rows past the words are spare zero rows that
+    extend fills in place
+    """
+    __slots__ = ('index', 'matrix', 'size')
+
+    def __init__(self, words, vectors, dim=None, dtype=np.float64):
+        """
+        :param words: list of words
+        :param vectors: word vectors, one per word
+        :param dim: dimension of the word vectors, required if there are none
+        :param dtype: floating point type of the matrix
+        """
+        vectors = np.asarray(vectors, dtype=dtype)
+        if dim is None:
+            dim = vectors.shape[1]
+        self.index = {word: idx for idx, word in enumerate(words)}
+        self.matrix = np.zeros((len(words) + 1, dim), dtype=dtype)
+        self.matrix[:len(words)] = vectors.reshape(len(words), dim)
+        # number of rows holding word vectors
+        self.size = len(words)
+
+    @property
+    def pad_id(self):
+        return len(self.matrix) - 1
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    @property
+    def dtype(self):
+        return self.matrix.dtype
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def lookup(self, tokens):
+        """
+        Row ids of the tokens, -1 for unknown tokens
+        :param tokens: list of words
+        :return: int32 array of row ids
+        """
+        index = self.index
+        return np.array([index.get(token, -1) for token in tokens], dtype=np.int32)
+
+    def gather(self, ids):
+        """
+        Word vectors of the row ids
+        :param ids: array of row ids
+        :return: matrix with shape (len(ids), dim)
+        """
+        return self.matrix[ids]
+
+    def batch(self, sentences):
+        """
+        Ragged batch with the row ids of the known tokens of every sentence.
+        Sentences without any known token get the zero vector
+        :param sentences: list of sentences, each a list of words
+        :return: RaggedBatch referring to the matrix of this store
+        """
+        index = self.index
+        ids = []
+        offsets = [0]
+        for sent in sentences:
+            ids.extend([index[word] for word in sent if word in index])
+            if len(ids) == offsets[-1]:
+                ids.append(self.pad_id)
+            offsets.append(len(ids))
+        return RaggedBatch(np.array(ids, dtype=np.int32),
+                           np.array(offsets, dtype=np.int32),
+                           self.matrix)
+
+    def extend(self, other):
+        """
+        Adds the words of other in place, words of other take precedence.
+        Rows are only ever appended, so row ids and batches taken from the
+        store stay valid; when the matrix is full it is reallocated with
+        twice the rows, which keeps the cost of growing linear
+        :param other: VectorStore
+        :return: this store
+        """
+        words = list(other.index)
+        start = self.size
+        end = start + len(words)
+        if end + 1 > len(self.matrix):
+            matrix = np.zeros((max(end + 1, 2 * len(self.matrix)), self.dim), dtype=self.dtype)
+            matrix[:start] = self.matrix[:start]
+            self.matrix = matrix
+        self.matrix[start:end] = other.matrix[[other.index[word] for word in words]]
+        self.index.update(zip(words, range(start, end)))
+        self.size = end
+        return self
+
+    def merge(self, other):
+        """
+        Store with the words of both stores, words of other take precedence
+        :param other: VectorStore
+        :return: new VectorStore
+        """
+        words = [word for word in self.index if word not in other.index]
+        rows = [self.index[word] for word in words]
+        other_rows = [other.index[word] for word in other.index]
+        return VectorStore(words + list(other.index),
+                           np.concatenate((self.matrix[rows], other.matrix[other_rows])),
+                           dim=self.dim,
+                           dtype=self.dtype)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __getitem__(self, word):
+        return self.matrix[self.index[word]]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
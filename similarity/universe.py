@@ -0,0 +1,82 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def kmeans_universe(vectors, k, n_iter=20, seed=1111, batch_size=10000):
+    """
+    Universe of the k-means centroids of a vocabulary
+    :param vectors: word embeddings of the vocabulary with shape (N, d)
+    :param k: size of the universe
+    :param n_iter: maximum number of Lloyd iterations
+    :param seed: seed of the initial centroids, k distinct words
+    :param batch_size: number of words assigned to centroids at once
+    :return: the universe matrix U with shape (k, d)
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    rng = np.random.RandomState(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)]
+    labels = None
+    for _ in range(n_iter):
+        new_labels = _nearest_centroids(vectors, centroids, batch_size)
+        if labels is not None and np.array_equal(labels, new_labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        assignment = csr_matrix((np.ones(len(labels)), (labels, np.arange(len(labels)))),
+                                shape=(k, len(labels)))
+        sums = assignment.dot(vectors)
+        # empty clusters keep their centroid
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def random_universe(d, k, seed=1111):
+    """
+    Universe of random Gaussian directions
+    :param d: dimension of the word embeddings
+    :param k: size of the universe
+    :param seed: seed of the directions
+    :return: the universe matrix U with shape (k, d)
+    """
+    return np.random.RandomState(seed).normal(size=(k, d))
+
+
+def svd_universe(vectors, k):
+    """
+    Universe of the top right singular vectors of a vocabulary
+    :param vectors: word embeddings of the vocabulary with shape (N, d)
+    :param k: size of the universe, at most d
+    :return: the universe matrix U with shape (k, d)
+    """
+    vectors = np.asarray(vectors, dtype=np.float64)
+    if k > vectors.shape[1]:
+        raise ValueError('SVD universe of size {0} exceeds the dimension {1}'
+                         .format(k, vectors.shape[1]))
+    _, _, vt = np.linalg.svd(vectors, full_matrices=False)
+    return vt[:k]
+
+
+def _nearest_centroids(vectors, centroids, batch_size):
+    c_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for lo in range(0, len(vectors), batch_size):
+        # squared distances up to the norms of the words
+        distances = c_norms - 2 * np.dot(vectors[lo:lo + batch_size], centroids.T)
+        labels[lo:lo + batch_size] = np.argmin(distances, axis=1)
+    return labels
@@ -0,0 +1,256 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+import heapq
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from scipy.optimize import linprog
+from scipy.spatial.distance import cdist
+from .soft_card import vector_labels
+
+try:
+    from pyemd import emd as _pyemd
+except ImportError:
+    _pyemd = None
+
+
+class WordDistanceCache(object):
+    """
+    Distance matrices between the distinct words of sentence pairs, so that
+    pairs seen again, in either order, e.g. in another task or experiment
+    with the same word vectors, reuse their distances. Sentences are
+    identified by a digest of the embeddings of their distinct words, and
+    the least recently used matrices are evicted when the cache exceeds
+    max_bytes
+    """
+    def __init__(self, max_bytes=2 ** 28):
+        """
+        :param max_bytes: memory bound of the cached matrices
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.matrices = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def distances(self, x_doc, y_doc):
+        """
+        :param x_doc: first sentence, see _documents
+        :param y_doc: second sentence
+        :return: distances between the distinct words of the sentences
+        """
+        with self.lock:
+            self.lookups += 1
+            for key, transposed in (((x_doc[3], y_doc[3]), False), ((y_doc[3], x_doc[3]), True)):
+                if key in self.matrices:
+                    self.matrices.move_to_end(key)
+                    self.hits += 1
+                    return self.matrices[key].T if transposed else self.matrices[key]
+        distances = cdist(x_doc[2], y_doc[2])
+        with self.lock:
+            key = (x_doc[3], y_doc[3])
+            if key not in self.matrices and distances.nbytes <= self.max_bytes:
+                self.matrices[key] = distances
+                self.nbytes += distances.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self.matrices.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+        return distances
+
+    def clear(self):
+        with self.lock:
+            self.matrices.clear()
+            self.nbytes = 0
+
+
+# cache of wmd and wmd_batch
+WORD_DISTANCES = WordDistanceCache()
+
+
+def wmd(x, y, cache=WORD_DISTANCES):
+    """
+    Word Mover's Distance between two sentences (Kusner et al. 2015) as in
+    gensim's KeyedVectors.wmdistance: words are weighted by their normalized
+    counts, and the distance to a sentence without known words (only zero
+    vectors, see VectorStore.batch) is inf. Equal vectors are the same word
+    :param x: list of word embeddings for the first sentence
+    :param y: list of word embeddings for the second sentence
+    :param cache: WordDistanceCache of the word distances, None to disable
+    :return: distance between the two sentences
+    """
+    return wmd_batch(x, [0, len(x)], y, [0, len(y)], cache)[0]
+
+
+def wmd_batch(x, x_offsets, y, y_offsets, cache=WORD_DISTANCES):
+    """
+    Word Mover's Distance of a batch of sentence pairs. Every pair needs its
+    exact distance, so the WCD and relaxed WMD bounds cannot prune anything
+    here; they only pay off when ranking candidates, see wmd_nearest
+    :param x: concatenated word embeddings of the first sentences
+    :param x_offsets: offsets of the first sentences in x
+    :param y: concatenated word embeddings of the second sentences
+    :param y_offsets: offsets of the second sentences in y
+    :param cache: WordDistanceCache of the word distances, None to disable
+    :return: array of distances, one per sentence pair
+    """
+    v, labels = vector_labels(np.concatenate((x, y)))
+    x_docs = _documents(v, labels[:len(x)], x_offsets)
+    y_docs = _documents(v, labels[len(x):], y_offsets)
+    distances = np.full(len(x_docs), np.inf)
+    for i, (x_doc, y_doc) in enumerate(zip(x_docs, y_docs)):
+        if x_doc is not None and y_doc is not None:
+            word_distances = cache.distances(x_doc, y_doc) if cache is not None \
+                else cdist(x_doc[2], y_doc[2])
+            distances[i] = transport(x_doc[1], y_doc[1], word_distances)
+    return distances
+
+
+def wmd_one_vs_many(x, y, y_offsets):
+    """
+    Word Mover's Distance between one sentence and many. The distances
+    between the words of x and all words of y are computed once
+    :param x: word embeddings of the sentence
+    :param y: concatenated word embeddings of the other sentences
+    :param y_offsets: offsets of the other sentences in y
+    :return: array of distances, one per sentence in y
+    """
+    x_doc, y_docs, word_distances = _query(x, y, y_offsets)
+    distances = np.full(len(y_docs), np.inf)
+    if x_doc is None:
+        return distances
+    for i, y_doc in enumerate(y_docs):
+        if y_doc is not None:
+            distances[i] = transport(x_doc[1], y_doc[1], word_distances[:, y_doc[0]])
+    return distances
+
+
+def wmd_nearest(x, y, y_offsets, k=1):
+    """
+    The k sentences nearest to x by Word Mover's Distance. Candidates are
+    visited by increasing word centroid distance, and the full distance is
+    only computed when neither the word centroid distance nor the relaxed
+    WMD rule the candidate out (prefetch and prune, Kusner et al. 2015)
+    :param x: word embeddings of the sentence
+    :param y: concatenated word embeddings of the other sentences
+    :param y_offsets: offsets of the other sentences in y
+    :param k: number of nearest sentences
+    :return: indices of the nearest sentences in y and their distances,
+             sorted by distance
+    """
+    x_doc, y_docs, word_distances = _query(x, y, y_offsets)
+    if x_doc is None:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    wcd = np.array([word_centroid_distance(x_doc[1], x_doc[2], y_doc[1], y_doc[2])
+                    if y_doc is not None else np.inf for y_doc in y_docs])
+    # heap of the k nearest candidates so far, the farthest first
+    nearest = []
+    for i in np.argsort(wcd, kind='mergesort'):
+        if y_docs[i] is None:
+            break
+        distances = word_distances[:, y_docs[i][0]]
+        if len(nearest) == k:
+            kth = -nearest[0][0]
+            if wcd[i] >= kth:
+                break
+            if relaxed_wmd(x_doc[1], y_docs[i][1], distances) >= kth:
+                continue
+        entry = (-transport(x_doc[1], y_docs[i][1], distances), -i)
+        if len(nearest) < k:
+            heapq.heappush(nearest, entry)
+        elif entry > nearest[0]:
+            heapq.heapreplace(nearest, entry)
+    nearest = sorted((-d, -i) for d, i in nearest)
+    return (np.array([i for _, i in nearest], dtype=np.int64),
+            np.array([d for d, _ in nearest]))
+
+
+def word_centroid_distance(x_weights, x_vectors, y_weights, y_vectors):
+    """
+    Distance between the weighted word centroids, a lower bound of the WMD
+    :param x_weights: normalized word counts of the first sentence
+    :param x_vectors: word embeddings of the distinct words of the first sentence
+    :param y_weights: normalized word counts of the second sentence
+    :param y_vectors: word embeddings of the distinct words of the second sentence
+    :return: lower bound of the WMD
+    """
+    return np.linalg.norm(np.dot(x_weights, x_vectors) - np.dot(y_weights, y_vectors))
+
+
+def relaxed_wmd(x_weights, y_weights, distances):
+    """
+    Relaxed WMD, the tighter of the two bounds dropping one flow constraint
+    :param x_weights: normalized word counts of the first sentence
+    :param y_weights: normalized word counts of the second sentence
+    :param distances: distances between the words of the sentences
+    :return: lower bound of the WMD
+    """
+    return max(np.dot(x_weights, distances.min(axis=1)),
+               np.dot(y_weights, distances.min(axis=0)))
+
+
+def transport(x_weights, y_weights, distances):
+    """
+    Cost of the optimal flow between two histograms
+    :param x_weights: normalized word counts of the first sentence
+    :param y_weights: normalized word counts of the second sentence
+    :param distances: distances between the words of the sentences
+    :return: earth mover's distance
+    """
+    if len(x_weights) == 1 or len(y_weights) == 1:
+        # every word sends its mass to the single word of the other sentence
+        return np.dot(x_weights, distances).dot(y_weights)
+    n, m = distances.shape
+    if _pyemd is not None:
+        # pyemd expects both histograms over the same bins
+        bins = np.zeros((n + m, n + m))
+        bins[:n, n:] = distances
+        bins[n:, :n] = distances.T
+        return _pyemd(np.concatenate((x_weights, np.zeros(m))),
+                      np.concatenate((np.zeros(n), y_weights)),
+                      bins)
+    constraints = np.vstack((np.kron(np.eye(n), np.ones(m)),
+                             np.kron(np.ones(n), np.eye(m))))
+    return linprog(distances.ravel(),
+                   A_eq=constraints,
+                   b_eq=np.concatenate((x_weights, y_weights)),
+                   bounds=(0, None)).fun
+
+
+def _documents(v, labels, offsets):
+    # (distinct words, normalized counts, vectors, digest) of every sentence, None if
+    # empty; words are sorted by their embedding so the order does not depend on the batch
+    keys = [row.tobytes() for row in v]
+    docs = []
+    for lo, hi in zip(offsets[:-1], offsets[1:]):
+        words, counts = np.unique(labels[lo:hi], return_counts=True)
+        if not v[words].any():
+            docs.append(None)
+            continue
+        order = sorted(range(len(words)), key=lambda i: keys[words[i]])
+        words, counts = words[order], counts[order]
+        digest = hashlib.sha1(b''.join(keys[w] for w in words)).digest()
+        docs.append((words, counts / (hi - lo), v[words], digest))
+    return docs
+
+
+def _query(x, y, y_offsets):
+    v, labels = vector_labels(np.concatenate((x, y)))
+    x_doc = _documents(v, labels[:len(x)], [0, len(x)])[0]
+    y_docs = _documents(v, labels[len(x):], y_offsets)
+    word_distances = cdist(v[x_doc[0]], v) if x_doc is not None else None
+    return x_doc, y_docs, word_distances
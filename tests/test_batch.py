@@ -0,0 +1,120 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Batch similarities against the per-pair measures of NAME_TO_SIM
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import unittest
+import numpy as np
+
+from similarity import NAME_TO_SIM, NAME_TO_BATCH_SIM, max_jaccard, VectorStore, \
+    get_multi_similarity_by_names
+from similarity.batch import ragged, segment_max, max_jaccard_batch, max_batched, jaccard_scores, \
+    dynamax_batch, dynamax_jaccard_batch
+
+
+def random_sentences(rng, n, dim=20, max_len=12, vocab_size=50):
+    """
+    :param rng: np.random.RandomState
+    :param n: number of sentences
+    :param dim: dimension of the word vectors
+    :param max_len: maximum sentence length
+    :param vocab_size: number of distinct words, small so that words repeat
+    :return: list of sentences, each a matrix of word embeddings
+    """
+    vocab = rng.normal(size=(vocab_size, dim))
+    return [vocab[rng.randint(vocab_size, size=rng.randint(1, max_len + 1))] for _ in range(n)]
+
+
+class MaxJaccardBatchTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.sent1 = random_sentences(rng, 100)
+        self.sent2 = random_sentences(rng, 100)
+
+    def test_segment_max(self):
+        x, offsets = ragged(self.sent1)
+        expected = np.array([np.max(s, axis=0) for s in self.sent1])
+        np.testing.assert_array_equal(segment_max(x, offsets), expected)
+
+    def test_matches_max_jaccard(self):
+        x, x_offsets = ragged(self.sent1)
+        y, y_offsets = ragged(self.sent2)
+        expected = [max_jaccard(s1, s2) for s1, s2 in zip(self.sent1, self.sent2)]
+        np.testing.assert_allclose(max_jaccard_batch(x, x_offsets, y, y_offsets),
+                                   expected, rtol=1e-12)
+
+    def test_ragged_batches(self):
+        words = ['w{0}'.format(i) for i in range(50)]
+        store = VectorStore(words, np.random.RandomState(1).normal(size=(50, 20)))
+        rng = np.random.RandomState(2)
+        sent1 = [[words[i] for i in rng.randint(50, size=rng.randint(1, 10))] for _ in range(30)]
+        sent2 = [[words[i] for i in rng.randint(50, size=rng.randint(1, 10))] for _ in range(30)]
+        # unknown words are dropped and sentences without known words get the zero vector
+        sent1[0] = ['unknown']
+        sent2[1] = sent2[1] + ['unknown']
+        batch1, batch2 = store.batch(sent1), store.batch(sent2)
+        expected = [np.nan_to_num(max_jaccard(s1, s2)) for s1, s2 in zip(batch1, batch2)]
+        similarity = max_batched(jaccard_scores)
+        np.testing.assert_allclose(np.nan_to_num(similarity(batch1, batch2)), expected, rtol=1e-12)
+        # pooled vectors carried by the batches give the same scores
+        batch1.pooled, batch2.pooled = batch1.max_pool(), batch2.max_pool()
+        np.testing.assert_allclose(np.nan_to_num(similarity(batch1, batch2)), expected, rtol=1e-12)
+
+
+class DynaMaxBatchTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.sent1 = random_sentences(rng, 100)
+        self.sent2 = random_sentences(rng, 100)
+
+    def test_matches_per_pair(self):
+        for name in ('dynamax_jaccard', 'dynamax_otsuka', 'dynamax_dice', 'dynamax_cosine'):
+            similarity = NAME_TO_SIM[name]
+            expected = [similarity(s1, s2) for s1, s2 in zip(self.sent1, self.sent2)]
+            np.testing.assert_allclose(NAME_TO_BATCH_SIM[name](self.sent1, self.sent2),
+                                       expected, rtol=1e-12, err_msg=name)
+
+    def test_bucket_size(self):
+        # padding of the buckets must not change the scores
+        x, x_offsets = ragged(self.sent1)
+        y, y_offsets = ragged(self.sent2)
+        expected = dynamax_jaccard_batch(x, x_offsets, y, y_offsets)
+        for bucket_size in (1, 7, 1000):
+            np.testing.assert_allclose(
+                dynamax_batch(x, x_offsets, y, y_offsets, jaccard_scores, bucket_size=bucket_size),
+                expected, rtol=1e-12)
+
+
+class MultiBatchTest(unittest.TestCase):
+    def test_matches_per_pair(self):
+        rng = np.random.RandomState(0)
+        sent1 = random_sentences(rng, 30)
+        sent2 = random_sentences(rng, 30)
+        names = ['dynamax_jaccard', 'dynamax_dice', 'max_jaccard', 'max_cosine',
+                 'sc_jaccard', 'avg_cosine', 'avg_jaccard']
+        sims = get_multi_similarity_by_names(names)(sent1, sent2)
+        self.assertEqual(sorted(sims), sorted(names))
+        for name in names:
+            similarity = NAME_TO_SIM[name]
+            expected = [similarity(s1, s2) for s1, s2 in zip(sent1, sent2)]
+            np.testing.assert_allclose(sims[name], expected, rtol=1e-12, err_msg=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Micro-benchmark suite of the similarity measures
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import io
+import contextlib
+import importlib.util
+import unittest
+import numpy as np
+
+from similarity.wmd import WORD_DISTANCES
+
+spec = importlib.util.spec_from_file_location(
+    'bench_similarity', os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'bench_similarity.py'))
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+
+class BenchSimilarityTest(unittest.TestCase):
+    def test_measure_resets_caches(self):
+        events = []
+        pair_calls = [lambda: events.append('call')] * 2
+        result = bench.measure(pair_calls, 2, 3, reset=lambda: events.append('reset'))
+        # warm up, then every timed pass and the memory pass start from an empty cache
+        self.assertEqual(events, ['call'] * 2 + ['reset', 'call', 'call'] * 4)
+        self.assertGreater(result['ns_per_pair'], 0)
+        self.assertGreaterEqual(result['peak_bytes'], 0)
+
+    def test_cached_measures(self):
+        pairs, vocab = bench.synthetic_pairs(5, 50, 'float64', 10)
+        measures = bench.benchmarks(50, 'float64')
+        kind, fbow, reset = measures['fbow_jaccard']
+        for call in bench.calls(kind, fbow, pairs, vocab):
+            call()
+        self.assertGreater(reset.__self__.nbytes, 0)
+        reset()
+        self.assertEqual(reset.__self__.nbytes, 0)
+        for name in ('wmd', 'batch:wmd'):
+            kind, wmd, reset = measures[name]
+            for call in bench.calls(kind, wmd, pairs, vocab):
+                call()
+            self.assertGreater(WORD_DISTANCES.nbytes, 0)
+            reset()
+            self.assertEqual(WORD_DISTANCES.nbytes, 0)
+
+    def test_run_and_compare(self):
+        names = {'set_jaccard', 'max_jaccard', 'batch:max_jaccard', 'fbow_jaccard'}
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = bench.run(3, 1, names)
+        self.assertEqual(len(results), len(bench.LENGTHS) * (1 + 3 * len(bench.DIMS) * len(bench.DTYPES)))
+        self.assertIn('set_jaccard|5|-|-', results)
+        self.assertIn('batch:max_jaccard|40|300|float32', results)
+        for key, result in results.items():
+            self.assertTrue(np.isfinite(result['ns_per_pair']) and result['ns_per_pair'] > 0, msg=key)
+
+        key = 'fbow_jaccard|15|50|float64'
+        baseline = {key: dict(results[key]), 'removed|5|50|float64': results[key]}
+        slower = {key: dict(results[key], ns_per_pair=2 * results[key]['ns_per_pair'])}
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(bench.compare({key: results[key]}, baseline, 0.2), [])
+            self.assertEqual(bench.compare(slower, baseline, 0.2), [key])
+            self.assertEqual(bench.compare(slower, baseline, 1.5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
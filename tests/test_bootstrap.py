@@ -0,0 +1,145 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Vectorized BCa bootstrap against a resample by resample reference
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import unittest
+import numpy as np
+from scipy.stats import norm, pearsonr
+
+from senteval import bootstrap
+
+try:
+    from importlib.metadata import version
+    import scikits.bootstrap as bstrap
+    SCIKITS_BOOTSTRAP_VERSION = tuple(int(v) for v in version('scikits.bootstrap').split('.')[:2])
+except ImportError:
+    bstrap = None
+
+
+def delta(gs, sys_scores, sys_scores_base):
+    return pearsonr(gs, sys_scores)[0] - pearsonr(gs, sys_scores_base)[0]
+
+
+def reference_bca_ci(gs, sys_scores, sys_scores_base, indexes, alpha=0.05):
+    """
+    BCa interval of the Pearson delta as computed by scikits.bootstrap.ci,
+    one statistic per resample
+    :param indexes: list of resample index arrays
+    :return: low and high ends of the interval
+    """
+    n = len(gs)
+    stat = np.sort([delta(gs[i], sys_scores[i], sys_scores_base[i]) for i in indexes])
+    ostat = delta(gs, sys_scores, sys_scores_base)
+    jstat = np.array([delta(np.delete(gs, i), np.delete(sys_scores, i), np.delete(sys_scores_base, i))
+                      for i in range(n)])
+    z0 = norm.ppf(np.sum(stat < ostat) / len(stat))
+    jmean = np.mean(jstat)
+    a = np.sum((jmean - jstat) ** 3) / (6.0 * np.sum((jmean - jstat) ** 2) ** 1.5)
+    zs = z0 + norm.ppf([alpha / 2, 1 - alpha / 2])
+    avals = norm.cdf(z0 + zs / (1 - a * zs))
+    return stat[np.round((len(stat) - 1) * avals).astype(int)]
+
+
+class BootstrapTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.gs = rng.uniform(0, 5, size=80)
+        self.systems = np.vstack([self.gs + rng.normal(scale=scale, size=80)
+                                  for scale in (1., 1.5, 3.)])
+
+    def resample_indexes(self, n_samples, block_size=1000):
+        # the resamples drawn by bootstrap_counts, as index arrays
+        n = len(self.gs)
+        indexes = []
+        for lo in range(0, n_samples, block_size):
+            indexes.extend(np.random.randint(n, size=(min(block_size, n_samples - lo), n)))
+        return indexes
+
+    def test_pearson(self):
+        expected = [pearsonr(self.gs, system)[0] for system in self.systems]
+        np.testing.assert_allclose(bootstrap.pearson(self.gs, self.systems), expected, rtol=1e-12)
+        jstat = bootstrap.jackknife_pearson(self.gs, self.systems)
+        for i in (0, 17, 79):
+            np.testing.assert_allclose(
+                jstat[i], [pearsonr(np.delete(self.gs, i), np.delete(system, i))[0]
+                           for system in self.systems], rtol=1e-12)
+
+    def test_bootstrap_pearson(self):
+        np.random.seed(3)
+        indexes = self.resample_indexes(1500)
+        np.random.seed(3)
+        stat = bootstrap.bootstrap_pearson(self.gs, self.systems, n_samples=1500)
+        expected = [[pearsonr(self.gs[i], system[i])[0] for system in self.systems] for i in indexes]
+        np.testing.assert_allclose(stat, expected, rtol=1e-10)
+
+    def test_pearson_delta_ci(self):
+        np.random.seed(5)
+        indexes = self.resample_indexes(2000)
+        expected = reference_bca_ci(self.gs, self.systems[0], self.systems[2], indexes)
+        np.random.seed(5)
+        conf_int = bootstrap.pearson_delta_ci(self.gs, self.systems[0], self.systems[2],
+                                              n_samples=2000)
+        np.testing.assert_allclose(conf_int, expected, rtol=1e-10)
+
+    def test_pearson_delta_matrix_ci(self):
+        np.random.seed(7)
+        deltas, conf_int = bootstrap.pearson_delta_matrix_ci(self.gs, self.systems, n_samples=2000)
+        for i in range(len(self.systems)):
+            for j in range(len(self.systems)):
+                if i == j:
+                    continue
+                np.random.seed(7)
+                expected = bootstrap.pearson_delta_ci(self.gs, self.systems[i], self.systems[j],
+                                                      n_samples=2000)
+                self.assertAlmostEqual(deltas[i, j], delta(self.gs, self.systems[i], self.systems[j]),
+                                       places=12)
+                np.testing.assert_allclose(conf_int[:, i, j], expected, rtol=1e-10)
+                # shared resamples make the intervals antisymmetric
+                np.testing.assert_allclose(conf_int[:, j, i], -conf_int[::-1, i, j], rtol=1e-10)
+
+
+@unittest.skipIf(bstrap is None, 'scikits.bootstrap is not installed')
+class ScikitsBootstrapTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.gs = rng.uniform(0, 5, size=200)
+        self.sys_scores = self.gs + rng.normal(size=200)
+        self.sys_scores_base = self.gs + rng.normal(scale=2., size=200)
+
+    def test_pearson_delta_ci(self):
+        np.random.seed(1111)
+        conf_int = bootstrap.pearson_delta_ci(self.gs, self.sys_scores, self.sys_scores_base)
+        if SCIKITS_BOOTSTRAP_VERSION < (1, 0):
+            # resamples of the global random state, called as STSEval did before
+            np.random.seed(1111)
+            expected = bstrap.ci(list(zip(self.gs, self.sys_scores, self.sys_scores_base)),
+                                 statfunction=lambda data: delta(data[:, 0], data[:, 1], data[:, 2]),
+                                 method='bca')
+            np.testing.assert_allclose(conf_int, expected, rtol=1e-12)
+        else:
+            # resamples of its own generator, intervals agree up to the Monte Carlo error
+            # of 10000 resamples, under 5e-3 over seeds 0 to 5 on these scores
+            expected = bstrap.ci((self.gs, self.sys_scores, self.sys_scores_base),
+                                 statfunction=delta, method='bca', seed=1111)
+            np.testing.assert_allclose(conf_int, expected, atol=1e-2)
+
+
+if __name__ == '__main__':
+    unittest.main()
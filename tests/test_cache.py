@@ -0,0 +1,100 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Per-pair scores cached on disk
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import unittest
+import numpy as np
+
+from senteval.cache import ScoreCache
+from similarity import avg_cosine, max_cosine
+from tests.test_sts import STSTestCase, batcher
+
+
+class ScoreCacheTest(STSTestCase):
+    def setUp(self):
+        STSTestCase.setUp(self)
+        self.vectors = os.path.join(self.path, 'vectors.txt')
+        with io.open(self.vectors, 'w', encoding='utf8') as f:
+            f.write('1 2\nw 0.5 0.25\n')
+        self.batcher_calls = 0
+
+    def counting_batcher(self, params, batch):
+        self.batcher_calls += 1
+        return batcher(params, batch)
+
+    def test_save_load(self):
+        cache = ScoreCache(os.path.join(self.path, 'scores'))
+        fingerprint = ScoreCache.fingerprint({'word_vec': 'test'}, 'max_jaccard', 'STS12', 'MSRpar',
+                                             ScoreCache.pairs_digest([['a', 'b']], [['c']]))
+        self.assertIsNone(cache.load(fingerprint))
+        cache.save(fingerprint, [0.5, 0.25])
+        np.testing.assert_array_equal(cache.load(fingerprint), [0.5, 0.25])
+
+    def test_fingerprint(self):
+        pairs = ScoreCache.pairs_digest([['a', 'b']], [['c']])
+        self.assertNotEqual(pairs, ScoreCache.pairs_digest([['a']], [['b', 'c']]))
+        files = [self.vectors, os.path.join(self.path, 'vectors.npy')]
+        fingerprint = ScoreCache.fingerprint({}, 'sim', 'STS12', 'MSRpar', pairs,
+                                             ScoreCache.files_identity(files))
+        self.assertEqual(fingerprint, ScoreCache.fingerprint({}, 'sim', 'STS12', 'MSRpar', pairs,
+                                                             ScoreCache.files_identity(files)))
+        # rewriting the vectors or creating a binary store changes the fingerprint
+        os.utime(self.vectors, (0, 0))
+        touched = ScoreCache.fingerprint({}, 'sim', 'STS12', 'MSRpar', pairs,
+                                         ScoreCache.files_identity(files))
+        self.assertNotEqual(touched, fingerprint)
+        np.save(files[1], np.zeros(2))
+        self.assertNotEqual(ScoreCache.fingerprint({}, 'sim', 'STS12', 'MSRpar', pairs,
+                                                   ScoreCache.files_identity(files)), touched)
+
+    def evaluate_cached(self, **params):
+        params_senteval = {
+            'score_cache': os.path.join(self.path, 'scores'),
+            'score_key': {'word_vec': 'test'},
+            'score_files': [self.vectors],
+            'similarity_name': 'max_jaccard'
+        }
+        params_senteval.update(params)
+        calls = self.batcher_calls
+        results = self.evaluate(self.counting_batcher, **params_senteval)
+        return results, self.batcher_calls - calls
+
+    def test_evaluation(self):
+        params = {'conf_intervals': True, 'baseline_similarity': avg_cosine}
+        results, calls = self.evaluate_cached(**params)
+        self.assertGreater(calls, 0)
+        cached, calls = self.evaluate_cached(**params)
+        self.assertEqual(calls, 0)
+        self.assertEqual(repr(cached), repr(results))
+
+        # another baseline similarity is scored again
+        _, calls = self.evaluate_cached(conf_intervals=True, baseline_similarity=max_cosine)
+        self.assertGreater(calls, 0)
+        # and so are changed word vectors
+        os.utime(self.vectors, (0, 0))
+        rescored, calls = self.evaluate_cached(**params)
+        self.assertGreater(calls, 0)
+        self.assertEqual(repr(rescored), repr(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
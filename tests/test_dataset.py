@@ -0,0 +1,117 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Compiled STS tasks against the text files
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from senteval import dataset
+from senteval.sts import STS12Eval
+from evaluation.utils import create_dictionary
+from tests.test_sts import write_sts_task, STS12_DATASETS
+
+
+def read_text(fpath, name):
+    """
+    :return: (sent1, sent2, gs_scores) read from the text files and sorted
+             by length as STSEval.loadFile did before compiled tasks
+    """
+    sent1, sent2 = zip(*[l.split("\t") for l in
+                         io.open(fpath + '/STS.input.%s.txt' % name, encoding='utf8').read().splitlines()])
+    raw_scores = io.open(fpath + '/STS.gs.%s.txt' % name, encoding='utf8').read().splitlines()
+    pairs = [(s1.split(), s2.split(), float(score))
+             for s1, s2, score in zip(sent1, sent2, raw_scores) if score != '']
+    pairs = sorted(pairs, key=lambda z: (len(z[0]), len(z[1]), z[2]))
+    return tuple(map(list, zip(*pairs)))
+
+
+class CompiledTaskTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.path, 'STS12-en-test')
+        write_sts_task(self.fpath, STS12_DATASETS)
+        self.compiled_path = os.path.join(self.path, 'compiled')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def assertMatchesText(self, data):
+        self.assertEqual(sorted(data), sorted(STS12_DATASETS))
+        for name in STS12_DATASETS:
+            self.assertEqual(data[name], read_text(self.fpath, name), msg=name)
+
+    def test_round_trip(self):
+        data, vocab = dataset.load_sts(self.fpath, STS12_DATASETS, self.compiled_path)
+        self.assertMatchesText(data)
+        # loaded again from the compiled arrays
+        data, vocab_again = dataset.load_sts(self.fpath, STS12_DATASETS, self.compiled_path)
+        self.assertMatchesText(data)
+        self.assertEqual(vocab_again, vocab)
+
+        counts = {}
+        for name in STS12_DATASETS:
+            for sent in data[name][0] + data[name][1]:
+                for word in sent:
+                    counts[word] = counts.get(word, 0) + 1
+        self.assertEqual(list(vocab.items()), list(counts.items()))
+
+    def test_recompiles_changed_files(self):
+        dataset.load_sts(self.fpath, STS12_DATASETS, self.compiled_path)
+        with io.open(os.path.join(self.fpath, 'STS.gs.MSRpar.txt'), encoding='utf8') as f:
+            lines = f.read().splitlines()
+        with io.open(os.path.join(self.fpath, 'STS.gs.MSRpar.txt'), 'w', encoding='utf8') as f:
+            f.write('\n'.join(lines[:-1] + ['1.234567']) + '\n')
+        data, _ = dataset.load_sts(self.fpath, STS12_DATASETS, self.compiled_path)
+        self.assertMatchesText(data)
+
+    def test_read_only(self):
+        # compiled_path under a file cannot be created, the text files are read instead
+        blocker = os.path.join(self.path, 'file')
+        io.open(blocker, 'w').close()
+        data, vocab = dataset.load_sts(self.fpath, STS12_DATASETS, os.path.join(blocker, 'compiled'))
+        self.assertMatchesText(data)
+        self.assertIsNone(vocab)
+
+    def test_default_path(self):
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': os.path.join(self.path, 'xdg')}):
+            path = dataset.get_compiled_path(self.fpath)
+        self.assertEqual(os.path.dirname(path), os.path.join(self.path, 'xdg', 'fuzzymax', 'sts'))
+        self.assertTrue(os.path.basename(path).startswith('STS12-en-test.'))
+        self.assertNotEqual(path, dataset.get_compiled_path(os.path.join(self.path, 'other',
+                                                                         'STS12-en-test')))
+
+    def test_samples_vocab(self):
+        evaluation = STS12Eval(self.fpath, compiled_path=self.compiled_path)
+        self.assertIsInstance(evaluation.samples, dataset.Samples)
+        self.assertEqual(create_dictionary(evaluation.samples),
+                         create_dictionary(list(evaluation.samples)))
+        samples = dataset.concat_samples([evaluation.samples, evaluation.samples])
+        self.assertEqual(len(samples), 2 * len(evaluation.samples))
+        self.assertEqual(create_dictionary(samples), create_dictionary(list(samples)))
+        self.assertNotIsInstance(dataset.concat_samples([evaluation.samples, [['w1']]]),
+                                 dataset.Samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
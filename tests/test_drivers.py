@@ -0,0 +1,156 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Drivers of evaluation/ batching VectorStores against the dict of word
+vectors and per-sentence lists they used before
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+import numpy as np
+
+import senteval.engine
+from similarity import NAME_TO_SIM, get_multi_similarity_by_names
+from tests.test_sts import STSTestCase, WORDS
+from tests.test_wordvec import write_wordvec, scan_wordvec
+
+# the drivers import their neighbours as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'evaluation'))
+import fuzzy_eval
+import sif
+import precision
+
+SIMILARITIES = ['avg_cosine', 'max_jaccard', 'dynamax_jaccard', 'dynamax_otsuka', 'sc_jaccard']
+
+
+def reference_prepare(params, samples):
+    # word vectors as a dict of arrays, read line by line
+    _, word2id = fuzzy_eval.utils.create_dictionary(samples)
+    word_freq_map = fuzzy_eval.utils._get_word_freq_map(params.word_count_path) \
+        if params.word_count_path else None
+    params.word_vec = scan_wordvec(params.path_to_vec, word2id, params.norm, word_freq_map)
+    params.pc = None
+    if params.sif:
+        params.pc = fuzzy_eval.utils.compute_pc(reference_batcher(params, samples), npc=1)
+
+
+def reference_batcher(params, batch):
+    batch = [sent if sent != [] else ['.'] for sent in batch]
+    embeddings = []
+    for sent in batch:
+        sentvec = [params.word_vec[word] for word in sent if word in params.word_vec]
+        if not sentvec:
+            sentvec.append(np.zeros(params.dim))
+        embeddings.append(sentvec)
+    if not params.sif:
+        return embeddings
+
+    embeddings = [np.mean(sentvec, axis=0) for sentvec in embeddings]
+    if params.pc is not None:
+        embeddings = [sentvec - sentvec.dot(params.pc.T) * params.pc for sentvec in embeddings]
+    return np.vstack(embeddings)
+
+
+class DriverTest(STSTestCase):
+    def setUp(self):
+        STSTestCase.setUp(self)
+        # words past w50 have no vector, some sentences have no known word
+        self.path_to_vec = os.path.join(self.path, 'vectors.txt')
+        write_wordvec(self.path_to_vec, WORDS[:50], np.random.RandomState(2).normal(size=(50, 10)))
+        self.path_to_counts = os.path.join(self.path, 'counts.txt')
+        with io.open(self.path_to_counts, 'w', encoding='utf-8') as f:
+            for i, word in enumerate(WORDS[:40]):
+                f.write('{0} {1}\n'.format(word, 10 * (i + 1)))
+        self.patches = [
+            mock.patch.object(fuzzy_eval.utils, 'get_word_vec_path_by_name', return_value=self.path_to_vec),
+            mock.patch.object(fuzzy_eval.utils, 'WORD_VEC_CACHE', fuzzy_eval.utils.WordVecCache())
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        STSTestCase.tearDown(self)
+
+    def eval(self, batcher, prepare, **params):
+        params_senteval = {
+            'task_path': self.path,
+            'compiled_path': os.path.join(self.path, 'compiled'),
+            'word_vec_name': 'test',
+            'path_to_vec': self.path_to_vec,
+            'dim': 10
+        }
+        params_senteval.update(params)
+        se = senteval.engine.SE(params_senteval, batcher, prepare)
+        return se.eval(['STS12'])['STS12'], se.params
+
+    def assertResultsClose(self, results, expected, rtol):
+        self.assertEqual(sorted(results), sorted(expected))
+        for dataset in expected:
+            if dataset == 'all':
+                continue
+            self.assertEqual(results[dataset]['nsamples'], expected[dataset]['nsamples'])
+            for name in ('pearson', 'spearman'):
+                np.testing.assert_allclose(results[dataset][name][0], expected[dataset][name][0],
+                                           rtol=rtol, err_msg='{0} {1}'.format(dataset, name))
+
+    def test_fuzzy_eval(self):
+        for norm, word_count_path in ((False, None), (True, self.path_to_counts)):
+            results, params = self.eval(fuzzy_eval.batcher, fuzzy_eval.prepare,
+                                        norm=norm, word_count_path=word_count_path,
+                                        similarity_names=SIMILARITIES,
+                                        multi_similarity=get_multi_similarity_by_names(SIMILARITIES))
+            self.assertEqual(params.word_vec.dtype, np.float64)
+            for name in SIMILARITIES:
+                expected, _ = self.eval(reference_batcher, reference_prepare, sif=False,
+                                        norm=norm, word_count_path=word_count_path,
+                                        similarity=NAME_TO_SIM[name])
+                self.assertResultsClose(results[name], expected, rtol=1e-10)
+
+    def test_sif(self):
+        results, _ = self.eval(sif.batcher, sif.prepare, norm=False,
+                               word_count_path=self.path_to_counts)
+        expected, _ = self.eval(reference_batcher, reference_prepare, sif=True, norm=False,
+                                word_count_path=self.path_to_counts)
+        self.assertResultsClose(results, expected, rtol=1e-10)
+
+    def test_float32(self):
+        results = {}
+        for dtype in ('float64', 'float32'):
+            results[dtype], params = self.eval(fuzzy_eval.batcher, fuzzy_eval.prepare,
+                                               norm=False, word_count_path=None, dtype=dtype,
+                                               similarity_names=SIMILARITIES,
+                                               multi_similarity=get_multi_similarity_by_names(
+                                                   SIMILARITIES))
+            self.assertEqual(params.word_vec.dtype, np.dtype(dtype))
+        deltas = precision.precision_deltas({'STS12': results['float64']},
+                                            {'STS12': results['float32']}, ['STS12'], SIMILARITIES)
+        for name in SIMILARITIES:
+            self.assertEqual(sorted(deltas[name]['STS12']), sorted(results['float64'][name]))
+            for dataset, delta in deltas[name]['STS12'].items():
+                self.assertLess(abs(delta['pearson']), 1e-5, msg='{0} {1}'.format(name, dataset))
+                # scores tied in float64 may not be tied in float32, which moves their ranks
+                self.assertLess(abs(delta['spearman']), 1e-2, msg='{0} {1}'.format(name, dataset))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+FBoW-Jaccard with cached word memberships against fuzzify
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import unittest
+import numpy as np
+
+from similarity import fuzzify, fbow_jaccard_factory, MembershipCache
+from tests.test_batch import random_sentences
+
+
+def u_jaccard(x, y, u):
+    m_x = fuzzify(x, u)
+    m_y = fuzzify(y, u)
+    return np.sum(np.minimum(m_x, m_y)) / np.sum(np.maximum(m_x, m_y))
+
+
+class MembershipCacheTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.u = rng.normal(size=(40, 20))
+        self.sent1 = random_sentences(rng, 50)
+        self.sent2 = random_sentences(rng, 50)
+
+    def test_matches_fuzzify(self):
+        similarity = fbow_jaccard_factory(self.u)
+        for s1, s2 in zip(self.sent1, self.sent2):
+            # float64 by default, as the uncached measure up to the rounding of the products
+            self.assertAlmostEqual(similarity(s1, s2), u_jaccard(s1, s2, self.u), places=14)
+
+    def test_float32(self):
+        cache = MembershipCache(self.u, dtype=np.float32)
+        for s in self.sent1:
+            m_s = cache.fuzzify(s)
+            self.assertEqual(m_s.dtype, np.float32)
+            np.testing.assert_allclose(m_s, fuzzify(s, self.u), rtol=1e-6)
+
+    def test_top_k(self):
+        cache = MembershipCache(self.u, top_k=5)
+        for s in self.sent1:
+            m_s = cache.fuzzify(s)
+            expected = fuzzify(s, self.u)
+            # memberships dropped by every word of the sentence count as 0
+            self.assertTrue(np.all(m_s <= expected + 1e-12))
+            self.assertLessEqual((m_s > 0).sum(), 5 * len(s))
+            self.assertAlmostEqual(m_s.max(), expected.max(), places=12)
+        np.testing.assert_allclose(MembershipCache(self.u, top_k=40).fuzzify(self.sent1[0]),
+                                   fuzzify(self.sent1[0], self.u), rtol=1e-12)
+
+    def test_max_bytes(self):
+        cache = MembershipCache(self.u, max_bytes=10 * 40 * 8)
+        for s in self.sent1:
+            np.testing.assert_allclose(cache.fuzzify(s), fuzzify(s, self.u), rtol=1e-12)
+            self.assertLessEqual(cache.nbytes, cache.max_bytes)
+
+    def test_shared_cache(self):
+        cache = MembershipCache(self.u)
+        similarity = fbow_jaccard_factory(self.u, cache=cache)
+        self.assertAlmostEqual(similarity(self.sent1[0], self.sent2[0]),
+                               u_jaccard(self.sent1[0], self.sent2[0], self.u), places=14)
+        self.assertEqual(len(cache.rows), len(set(map(bytes, np.vstack(self.sent1[:1] + self.sent2[:1])))))
+        cache.clear()
+        self.assertEqual((len(cache.rows), cache.nbytes), (0, 0))
+        self.assertAlmostEqual(similarity(self.sent1[0], self.sent2[0]),
+                               u_jaccard(self.sent1[0], self.sent2[0], self.u), places=14)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Experiment grids and the resumable results store
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import shutil
+import time
+import tempfile
+import unittest
+import numpy as np
+
+from evaluation import grid
+from evaluation.utils import ResultsStore
+
+
+def run_experiment(experiment):
+    if experiment.get('fail'):
+        raise ValueError('failed on purpose')
+    if experiment.get('slow'):
+        # results larger than the pipe buffer block the worker until they are read
+        time.sleep(1)
+        return {'param': experiment, 'scores': np.arange(10 ** 6, dtype=np.float64)}
+    return {'param': experiment, 'eval': {'STS12': {'MSRpar': {'pearson': experiment['k'] / 10.},
+                                                    'all': {'pearson': {'mean': np.float64(0.5)}}}}}
+
+
+class RunGridTest(unittest.TestCase):
+    def setUp(self):
+        self.experiments = [{'group': k % 3, 'k': k} for k in range(8)]
+        self.expected = [run_experiment(experiment) for experiment in self.experiments]
+
+    def run_grid(self, processes):
+        reported = []
+        results = grid.run_grid(self.experiments, run_experiment, processes=processes,
+                                key=lambda experiment: experiment['group'],
+                                on_result=lambda idx, result: reported.append((idx, result)))
+        self.assertEqual(results, self.expected)
+        # every experiment is reported once, as soon as it finishes
+        self.assertEqual(sorted(idx for idx, _ in reported), list(range(len(self.experiments))))
+        for idx, result in reported:
+            self.assertEqual(result, self.expected[idx])
+        return reported
+
+    def test_serial(self):
+        reported = self.run_grid(processes=1)
+        # groups run one after another
+        self.assertEqual([idx for idx, _ in reported], [0, 3, 6, 1, 4, 7, 2, 5])
+
+    def test_parallel(self):
+        self.run_grid(processes=2)
+
+    def test_failure(self):
+        self.experiments[4]['fail'] = True
+        with self.assertRaises(RuntimeError) as context:
+            grid.run_grid(self.experiments, run_experiment, processes=2,
+                          key=lambda experiment: experiment['group'])
+        self.assertIn('Experiment #5 failed', str(context.exception))
+        self.assertIn('failed on purpose', str(context.exception))
+
+    def test_failure_with_running_groups(self):
+        experiments = [{'group': 0, 'k': 0, 'fail': True},
+                       {'group': 1, 'k': 1, 'slow': True},
+                       {'group': 1, 'k': 2, 'slow': True}]
+        reported = []
+        with self.assertRaises(RuntimeError) as context:
+            grid.run_grid(experiments, run_experiment, processes=2,
+                          key=lambda experiment: experiment['group'],
+                          on_result=lambda idx, result: reported.append((idx, result)))
+        self.assertIn('Experiment #1 failed', str(context.exception))
+        # the results of the group still running when the other failed are reported
+        self.assertEqual(sorted(idx for idx, _ in reported), [1, 2])
+        for idx, result in reported:
+            self.assertEqual(result['param'], experiments[idx])
+            np.testing.assert_array_equal(result['scores'], np.arange(10 ** 6))
+
+
+class ResultsStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.path, 'results', 'grid.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_resume(self):
+        store = ResultsStore(self.store_path)
+        experiments = [{'k': k} for k in range(3)]
+        for experiment in experiments[:2]:
+            store.add(run_experiment(experiment))
+
+        store = ResultsStore(self.store_path)
+        self.assertTrue(store.has(experiments[0], ['STS12']))
+        self.assertTrue(store.has(experiments[1], ['STS12']))
+        self.assertFalse(store.has(experiments[2], ['STS12']))
+        self.assertFalse(store.has(experiments[0], ['STS12', 'STS13']))
+        self.assertEqual(store.get(experiments[1], ['STS12']),
+                         {'param': {'k': 1},
+                          'eval': {'STS12': {'MSRpar': {'pearson': 0.1},
+                                             'all': {'pearson': {'mean': 0.5}}}}})
+
+    def test_interrupted_write(self):
+        store = ResultsStore(self.store_path)
+        store.add(run_experiment({'k': 0}))
+        store.add(run_experiment({'k': 1}))
+        with io.open(self.store_path, 'rb') as f:
+            data = f.read()
+        # the 'all' record of the second experiment was cut short
+        with io.open(self.store_path, 'wb') as f:
+            f.write(data[:-10])
+
+        store = ResultsStore(self.store_path)
+        self.assertTrue(store.has({'k': 0}, ['STS12']))
+        self.assertFalse(store.has({'k': 1}, ['STS12']))
+        store.add(run_experiment({'k': 1}))
+        self.assertTrue(ResultsStore(self.store_path).has({'k': 1}, ['STS12']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Correlations of streams fed chunk by chunk against scipy.stats
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from scipy.stats import pearsonr, spearmanr
+
+import senteval.utils
+import senteval.engine
+from senteval.online import OnlinePearson, ExternalSpearman, SketchSpearman
+from similarity import max_jaccard
+from tests.test_sts import WORDS, prepare, batcher
+
+
+def feed(correlation, x, y, chunk_size):
+    for lo in range(0, len(x), chunk_size):
+        correlation.update(x[lo:lo + chunk_size], y[lo:lo + chunk_size])
+    return correlation.correlation()
+
+
+class OnlineCorrelationTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.x = rng.normal(size=2000)
+        self.y = self.x + rng.normal(size=2000)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_pearson(self):
+        expected = pearsonr(self.x, self.y)
+        for chunk_size in (1, 7, 2000):
+            r, p = feed(OnlinePearson(), self.x, self.y, chunk_size)
+            self.assertAlmostEqual(r, expected[0], places=12)
+            self.assertAlmostEqual(p, expected[1], places=12)
+        self.assertTrue(np.isnan(feed(OnlinePearson(), self.x, np.ones(2000), 100)[0]))
+
+    def assertSpearman(self, x, y, chunk_size, run_size):
+        expected = spearmanr(x, y)
+        r, p = feed(ExternalSpearman(run_size=run_size, tmp_dir=self.path), x, y, chunk_size)
+        self.assertAlmostEqual(r, expected[0], places=12)
+        self.assertAlmostEqual(p, expected[1], places=10)
+        # runs are removed
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_spearman(self):
+        for chunk_size, run_size in ((100, 64), (7, 10), (2000, 100000)):
+            self.assertSpearman(self.x, self.y, chunk_size, run_size)
+
+    def test_spearman_ties(self):
+        # tie groups much larger than the runs, so they span several merged blocks
+        rng = np.random.RandomState(1)
+        x = rng.randint(5, size=2000).astype(float)
+        y = np.round(x + rng.normal(size=2000))
+        for chunk_size, run_size in ((100, 64), (13, 10), (500, 333)):
+            self.assertSpearman(x, y, chunk_size, run_size)
+        # only two tie groups
+        self.assertSpearman(x, np.where(x > 2, 1., 0.), 100, 64)
+
+    def test_sketch(self):
+        expected = spearmanr(self.x, self.y)[0]
+        r, _ = feed(SketchSpearman(bins=1000), self.x, self.y, 500)
+        self.assertAlmostEqual(r, expected, places=2)
+        # every distinct value holding more than a bin of the pairs gets its own bin,
+        # so such scores are ranked exactly
+        rng = np.random.RandomState(2)
+        x = rng.randint(20, size=2000).astype(float)
+        y = x + rng.randint(3, size=2000)
+        self.assertAlmostEqual(feed(SketchSpearman(bins=100), x, y, 2000)[0], spearmanr(x, y)[0],
+                               places=12)
+
+
+class StreamingEvalTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.pairs = [[[WORDS[i] for i in rng.randint(len(WORDS), size=rng.randint(1, 8))]
+                       for _ in range(2)] + [float(rng.randint(6))] for _ in range(500)]
+        self.fpath = os.path.join(self.path, 'pairs.tsv')
+        with io.open(self.fpath, 'w', encoding='utf8') as f:
+            for sent1, sent2, score in self.pairs:
+                f.write('{0}\t{1}\t{2}\n'.format(' '.join(sent1), ' '.join(sent2), score))
+            # pairs without gold score are skipped
+            f.write('w1\tw2\t\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_matches_scipy(self):
+        params = senteval.utils.dotdict()
+        prepare(params, None)
+        sys_scores = [np.nan_to_num(max_jaccard(params.word_vec.batch([sent1])[0],
+                                                params.word_vec.batch([sent2])[0]))
+                      for sent1, sent2, _ in self.pairs]
+        gs_scores = [score for _, _, score in self.pairs]
+        tmp_dir = os.path.join(self.path, 'tmp')
+        os.makedirs(tmp_dir)
+        params_senteval = {
+            'task_path': self.path,
+            'similarity': max_jaccard,
+            'streaming_tasks': {'pairs': self.fpath},
+            'stream_chunk_size': 37,
+            'stream_tmp_dir': tmp_dir
+        }
+        results = senteval.engine.SE(params_senteval, batcher, prepare).eval('pairs')['pairs']
+        self.assertEqual(results['nsamples'], 500)
+        np.testing.assert_allclose(results['pearson'], pearsonr(sys_scores, gs_scores), rtol=1e-10)
+        np.testing.assert_allclose(results['spearman'], spearmanr(sys_scores, gs_scores), rtol=1e-10)
+        self.assertEqual(os.listdir(tmp_dir), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Phase-level profiling of evaluations
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import json
+import unittest
+import numpy as np
+
+import senteval.engine
+from senteval.profiling import Profiler
+from similarity import max_jaccard
+from tests.test_sts import STSTestCase, STS12_DATASETS, prepare, batcher
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_nested_phases(self):
+        profiler = Profiler()
+        for _ in range(2):
+            with profiler.phase('run', 'STS12'):
+                with profiler.phase('similarity', 'STS12', 'MSRpar', pairs=10):
+                    np.ones(2 ** 20)
+        records = {record['phase']: record for record in profiler.to_list()}
+        self.assertEqual([record['phase'] for record in profiler.to_list()], ['similarity', 'run'])
+        self.assertEqual(records['similarity']['calls'], 2)
+        self.assertEqual(records['similarity']['pairs'], 20)
+        self.assertGreaterEqual(records['similarity']['peak_bytes'], 8 * 2 ** 20)
+        # the peak of a phase includes the peaks of its nested phases
+        self.assertGreaterEqual(records['run']['peak_bytes'], records['similarity']['peak_bytes'])
+        self.assertGreaterEqual(records['run']['wall'], records['similarity']['wall'])
+
+    def test_without_memory(self):
+        profiler = Profiler(memory=False)
+        with profiler.phase('run', 'STS12'):
+            np.ones(2 ** 20)
+        self.assertIsNone(profiler.to_list()[0]['peak_bytes'])
+
+
+class ProfiledEvaluationTest(STSTestCase):
+    def test_evaluation(self):
+        expected = self.evaluate()
+        profile_path = os.path.join(self.path, 'profile.json')
+        results = self.evaluate(profile=True, profile_path=profile_path)
+        self.assertEqual(repr(results), repr(expected))
+
+        with io.open(profile_path, encoding='utf8') as f:
+            records = json.load(f)
+        phases = set(record['phase'] for record in records)
+        self.assertEqual(phases, {'load', 'prepare', 'run', 'batcher', 'similarity', 'statistics'})
+        pairs = {record['dataset']: record['pairs'] for record in records
+                 if record['phase'] == 'similarity'}
+        self.assertEqual(sorted(pairs), sorted(STS12_DATASETS))
+        for dataset in STS12_DATASETS:
+            self.assertEqual(pairs[dataset], results[dataset]['nsamples'])
+
+    def test_single_task(self):
+        profile_path = os.path.join(self.path, 'profile.json')
+        params_senteval = {
+            'task_path': self.path,
+            'compiled_path': os.path.join(self.path, 'compiled'),
+            'similarity': max_jaccard,
+            'profile': True,
+            'profile_path': profile_path
+        }
+        se = senteval.engine.SE(params_senteval, batcher, prepare)
+        results = se.eval('STS12')
+        self.assertEqual(repr(results), repr(self.evaluate()))
+        # written by a single task evaluation as by a list of tasks
+        with io.open(profile_path, encoding='utf8') as f:
+            records = json.load(f)
+        self.assertEqual(records, json.loads(json.dumps(se.profiler.to_list())))
+        self.assertEqual(set(record['task'] for record in records), {'STS12'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Cached sentence representations against the batcher
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import unittest
+from multiprocessing.pool import ThreadPool
+import numpy as np
+
+from senteval.representations import RepresentationCache
+from similarity import VectorStore, NAME_TO_BATCH_SIM
+from tests.test_sts import STSTestCase, WORDS
+
+
+def random_batches(seed, n_batches=20, batch_size=16):
+    rng = np.random.RandomState(seed)
+    # few distinct sentences so that batches repeat them
+    sentences = [[WORDS[i] for i in rng.randint(len(WORDS), size=rng.randint(1, 8))]
+                 for _ in range(40)] + [['unknown']]
+    return [[sentences[i] for i in rng.randint(len(sentences), size=batch_size)]
+            for _ in range(n_batches)]
+
+
+class RepresentationCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.store = VectorStore(WORDS, np.random.RandomState(0).normal(size=(len(WORDS), 10)))
+
+    def batcher(self, params, batch):
+        return self.store.batch(batch)
+
+    def assertSameBatch(self, cached, expected):
+        np.testing.assert_array_equal(cached.offsets, expected.offsets)
+        np.testing.assert_array_equal(cached.vectors(), expected.vectors())
+        np.testing.assert_array_equal(cached.pooled, expected.max_pool())
+
+    def test_ragged_batches(self):
+        cache = RepresentationCache()
+        batcher = cache.wrap(self.batcher)
+        for batch in random_batches(0):
+            self.assertSameBatch(batcher(None, batch), self.batcher(None, batch))
+        self.assertEqual(cache.lookups, 20 * 16)
+        self.assertGreater(cache.hit_rate, 0.5)
+
+    def test_scores(self):
+        cache = RepresentationCache()
+        batcher = cache.wrap(self.batcher)
+        for name in ('max_jaccard', 'dynamax_jaccard'):
+            similarity = NAME_TO_BATCH_SIM[name]
+            for batch1, batch2 in zip(random_batches(1), random_batches(2)):
+                expected = similarity(self.batcher(None, batch1), self.batcher(None, batch2))
+                np.testing.assert_array_equal(similarity(batcher(None, batch1), batcher(None, batch2)),
+                                              expected, err_msg=name)
+
+    def test_several_stores(self):
+        cache = RepresentationCache()
+        other = VectorStore(WORDS[::-1], self.store.matrix[:-1])
+        batches = random_batches(3)
+        for batch in batches[:10]:
+            cache.encode(None, self.batcher, batch)
+        for batch in batches[10:]:
+            cache.encode(None, lambda params, b: other.batch(b), batch)
+        # sentences of both stores in one batch keep their vectors
+        first = set(tuple(sent) for batch in batches[:10] for sent in batch)
+        for batch in batches:
+            cached = cache.encode(None, self.batcher, batch)
+            for i, sent in enumerate(batch):
+                store = self.store if tuple(sent) in first else other
+                np.testing.assert_array_equal(cached[i], store.batch([sent])[0])
+
+    def test_matrices(self):
+        # one row per sentence, e.g. SIF embeddings
+        cache = RepresentationCache()
+
+        def batcher(params, batch):
+            return np.array([[len(sent), sum(len(word) for word in sent)] for sent in batch], dtype=float)
+        for batch in random_batches(4):
+            np.testing.assert_array_equal(cache.encode(None, batcher, batch), batcher(None, batch))
+
+    def test_threads(self):
+        cache = RepresentationCache()
+        batcher = cache.wrap(self.batcher)
+        batches = random_batches(5, n_batches=200)
+        pool = ThreadPool(4)
+        try:
+            cached = pool.map(lambda batch: batcher(None, batch), batches)
+        finally:
+            pool.close()
+            pool.join()
+        for batch, cached_batch in zip(batches, cached):
+            self.assertSameBatch(cached_batch, self.batcher(None, batch))
+        self.assertEqual(cache.lookups, 200 * 16)
+        self.assertEqual(len(cache.table), len(set(tuple(sent) for sent in sum(batches, []))))
+
+
+class CachedEvaluationTest(STSTestCase):
+    def test_evaluation(self):
+        expected = self.evaluate()
+        for cache_representations in ('task', 'global'):
+            results = self.evaluate(cache_representations=cache_representations)
+            self.assertEqual(repr(results), repr(expected))
+        results = self.evaluate(cache_representations='global', workers=2, worker_type='thread')
+        self.assertEqual(repr(results), repr(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Soft cardinality Jaccard from multiset counts against the original
+definition over explicit multisets
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import unittest
+import numpy as np
+
+from similarity import sc_jaccard, soft_cardinality, munion, VectorStore
+from similarity.batch import ragged, sc_jaccard_batch, batched
+from tests.test_batch import random_sentences
+
+
+def reference_sc_jaccard(x, y):
+    xUy = munion(x, y)
+    sc_x = soft_cardinality(x)
+    sc_y = soft_cardinality(y)
+    sc_xUy = soft_cardinality(xUy)
+    sc_uIv = sc_x + sc_y - sc_xUy
+    return sc_uIv / sc_xUy
+
+
+class SoftCardinalityTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # few distinct words so that sentences share and repeat words
+        self.sent1 = random_sentences(rng, 200, vocab_size=15)
+        self.sent2 = random_sentences(rng, 200, vocab_size=15)
+        self.sent1[0] = self.sent2[0]
+
+    def test_matches_reference(self):
+        for s1, s2 in zip(self.sent1, self.sent2):
+            self.assertAlmostEqual(sc_jaccard(s1, s2), reference_sc_jaccard(s1, s2), places=12)
+
+    def test_batch_matches_scalar(self):
+        x, x_offsets = ragged(self.sent1)
+        y, y_offsets = ragged(self.sent2)
+        expected = [sc_jaccard(s1, s2) for s1, s2 in zip(self.sent1, self.sent2)]
+        # bit for bit, so that rank statistics do not depend on batching
+        np.testing.assert_array_equal(sc_jaccard_batch(x, x_offsets, y, y_offsets), expected)
+        np.testing.assert_array_equal(sc_jaccard_batch(x[:x_offsets[50]], x_offsets[:51],
+                                                       y[:y_offsets[50]], y_offsets[:51]),
+                                      expected[:50])
+
+    def test_unknown_words(self):
+        words = ['w{0}'.format(i) for i in range(10)]
+        store = VectorStore(words, np.random.RandomState(1).normal(size=(10, 5)))
+        batch1 = store.batch([['w1', 'w2'], ['unknown'], ['w3', 'w3', 'unknown']])
+        batch2 = store.batch([['w2', 'w2'], ['w4'], ['w3']])
+        expected = [np.nan_to_num(sc_jaccard(s1, s2)) for s1, s2 in zip(batch1, batch2)]
+        np.testing.assert_array_equal(np.nan_to_num(batched(sc_jaccard_batch)(batch1, batch2)),
+                                      expected)
+        self.assertEqual(expected[2], 1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+VectorStore and the in-process word vectors cache
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+from similarity import VectorStore
+from evaluation import utils
+from tests.test_wordvec import write_wordvec, scan_wordvec
+
+
+class VectorStoreTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.vectors = rng.normal(size=(30, 5))
+        self.words = ['w{0}'.format(i) for i in range(30)]
+
+    def test_matches_dict(self):
+        word_vec = dict(zip(self.words[:20], self.vectors[:20]))
+        store = VectorStore(self.words[:20], self.vectors[:20])
+        self.assertEqual((len(store), store.dim, store.dtype), (20, 5, np.float64))
+        self.assertEqual(sorted(store), sorted(word_vec))
+        self.assertNotIn('w25', store)
+        tokens = ['w3', 'w25', 'w3', 'w19']
+        ids = store.lookup(tokens)
+        np.testing.assert_array_equal(ids, [3, -1, 3, 19])
+        np.testing.assert_array_equal(store.gather(ids[ids >= 0]), [word_vec['w3'], word_vec['w3'],
+                                                                   word_vec['w19']])
+
+        sentences = [['w1', 'w2', 'w1'], ['w25'], [], ['w29', 'w0']]
+        batch = store.batch(sentences)
+        self.assertEqual(len(batch), len(sentences))
+        for sent, sentvec in zip(sentences, batch):
+            # the word vectors the batchers gathered from the dict, or the zero vector
+            expected = [word_vec[word] for word in sent if word in word_vec] or [np.zeros(5)]
+            np.testing.assert_array_equal(sentvec, expected)
+
+    def test_extend_in_place(self):
+        store = VectorStore(self.words[:10], self.vectors[:10])
+        batch = store.batch([['w1', 'w2'], ['unknown']])
+        before = batch.vectors().copy()
+        for lo in range(10, 30, 5):
+            store.extend(VectorStore(self.words[lo:lo + 5], self.vectors[lo:lo + 5]))
+            # the pad row past the words stays zero
+            np.testing.assert_array_equal(store.matrix[store.pad_id], 0)
+        self.assertEqual(len(store), 30)
+        for word, vector in zip(self.words, self.vectors):
+            np.testing.assert_array_equal(store[word], vector)
+        # row ids taken before growing still refer to the same words
+        np.testing.assert_array_equal(store.gather(batch.ids[:2]), before[:2])
+        np.testing.assert_array_equal(store.batch([['unknown']]).vectors(), [[0.] * 5])
+
+    def test_extend_overrides(self):
+        store = VectorStore(self.words[:10], self.vectors[:10])
+        store.extend(VectorStore(['w3'], self.vectors[20:21]))
+        np.testing.assert_array_equal(store['w3'], self.vectors[20])
+        self.assertEqual(len(store), 10)
+
+    def test_merge(self):
+        store = VectorStore(self.words[:10], self.vectors[:10])
+        merged = store.merge(VectorStore(self.words[5:15], self.vectors[15:25]))
+        self.assertEqual(len(merged), 15)
+        np.testing.assert_array_equal(merged['w2'], self.vectors[2])
+        np.testing.assert_array_equal(merged['w7'], self.vectors[17])
+        np.testing.assert_array_equal(merged.matrix[merged.pad_id], 0)
+
+
+class WordVecCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.path_to_vec = os.path.join(self.path, 'vectors.txt')
+        self.words = ['w{0}'.format(i) for i in range(100)]
+        write_wordvec(self.path_to_vec, self.words, np.random.RandomState(0).normal(size=(100, 8)))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_grows_with_requests(self):
+        cache = utils.WordVecCache()
+        with mock.patch.object(utils, 'get_word_vec_path_by_name', return_value=self.path_to_vec):
+            first = cache.get('test', {word: 0 for word in self.words[:40]})
+            second = cache.get('test', {word: 0 for word in self.words[20:70]})
+            self.assertIs(second, first)
+            third = cache.get('test', {word: 0 for word in self.words[:10]})
+            self.assertIs(third, first)
+            normed = cache.get('test', {word: 0 for word in self.words[:10]}, norm=True)
+            self.assertIsNot(normed, first)
+        expected = scan_wordvec(self.path_to_vec, self.words[:70])
+        self.assertEqual(sorted(first), sorted(expected))
+        for word, vector in expected.items():
+            np.testing.assert_array_equal(first[word], vector)
+        np.testing.assert_array_equal(first.matrix[first.pad_id], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
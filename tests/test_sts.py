@@ -0,0 +1,102 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+STS evaluation on small synthetic tasks
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import senteval.engine
+from similarity import VectorStore, max_jaccard, avg_cosine
+
+WORDS = ['w{0}'.format(i) for i in range(60)]
+STS12_DATASETS = ['MSRpar', 'MSRvid', 'SMTeuroparl', 'surprise.OnWN', 'surprise.SMTnews']
+
+
+def write_sts_task(fpath, datasets, n=150, seed=0):
+    """
+    Writes the text files of an STS task with random sentences over WORDS
+    and a few pairs without gold score, which are dropped when loading
+    :param fpath: path to the task directory
+    :param datasets: dataset names
+    :param n: number of lines per dataset
+    :param seed: random seed
+    """
+    rng = np.random.RandomState(seed)
+    if not os.path.exists(fpath):
+        os.makedirs(fpath)
+    for dataset in datasets:
+        with io.open(os.path.join(fpath, 'STS.input.%s.txt' % dataset), 'w', encoding='utf8') as f:
+            for _ in range(n):
+                sents = [' '.join(WORDS[i] for i in rng.randint(len(WORDS), size=rng.randint(1, 10)))
+                         for _ in range(2)]
+                f.write('\t'.join(sents) + '\n')
+        with io.open(os.path.join(fpath, 'STS.gs.%s.txt' % dataset), 'w', encoding='utf8') as f:
+            for i in range(n):
+                f.write('' if i % 17 == 3 else '{0:.2f}'.format(rng.uniform(0, 5)))
+                f.write('\n')
+
+
+def prepare(params, samples):
+    vectors = np.random.RandomState(1).normal(size=(len(WORDS), 10))
+    params.word_vec = VectorStore(WORDS, vectors)
+
+
+def batcher(params, batch):
+    return params.word_vec.batch(batch)
+
+
+class STSTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        write_sts_task(os.path.join(self.path, 'downstream', 'STS', 'STS12-en-test'),
+                       STS12_DATASETS)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def evaluate(self, batcher=batcher, **params):
+        params_senteval = {
+            'task_path': self.path,
+            'compiled_path': os.path.join(self.path, 'compiled'),
+            'similarity': max_jaccard
+        }
+        params_senteval.update(params)
+        se = senteval.engine.SE(params_senteval, batcher, prepare)
+        return se.eval(['STS12'])['STS12']
+
+
+class ParallelScoringTest(STSTestCase):
+    def test_workers_match_serial(self):
+        for params in ({}, {'conf_intervals': True, 'baseline_similarity': avg_cosine}):
+            serial = self.evaluate(**params)
+            for worker_type in ('process', 'thread'):
+                parallel = self.evaluate(workers=2, worker_type=worker_type, batch_size=16, **params)
+                self.assertEqual(sorted(parallel), sorted(serial))
+                for dataset in serial:
+                    self.assertEqual(repr(parallel[dataset]), repr(serial[dataset]),
+                                     msg='{0} {1}'.format(worker_type, dataset))
+
+
+if __name__ == '__main__':
+    unittest.main()
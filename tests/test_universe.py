@@ -0,0 +1,82 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Universes of FBoW similarities
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import unittest
+import numpy as np
+
+from similarity import kmeans_universe, random_universe, svd_universe, fbow_jaccard_factory, \
+    fbow_multi_batched
+from tests.test_batch import random_sentences
+
+
+class UniverseTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.centers = rng.normal(scale=10., size=(4, 6))
+        self.vectors = np.vstack([center + rng.normal(scale=0.1, size=(50, 6))
+                                  for center in self.centers])
+
+    def test_kmeans(self):
+        centroids = kmeans_universe(self.vectors, 4, seed=3)
+        self.assertEqual(centroids.shape, (4, 6))
+        # converged centroids are the means of their words
+        labels = np.argmin(((self.vectors[:, None] - centroids[None]) ** 2).sum(axis=2), axis=1)
+        for k in range(4):
+            np.testing.assert_allclose(centroids[k], self.vectors[labels == k].mean(axis=0), rtol=1e-12)
+        # the separated clusters are found
+        distances = np.linalg.norm(self.centers[:, None] - centroids[None], axis=2)
+        self.assertTrue(np.all(distances.min(axis=1) < 0.1))
+        np.testing.assert_array_equal(kmeans_universe(self.vectors, 4, seed=3, batch_size=7), centroids)
+
+    def test_random(self):
+        np.testing.assert_array_equal(random_universe(6, 10, seed=5), random_universe(6, 10, seed=5))
+        self.assertEqual(random_universe(6, 10).shape, (10, 6))
+
+    def test_svd(self):
+        u = svd_universe(self.vectors, 3)
+        self.assertEqual(u.shape, (3, 6))
+        np.testing.assert_allclose(np.dot(u, u.T), np.eye(3), atol=1e-12)
+        _, _, vt = np.linalg.svd(self.vectors)
+        np.testing.assert_allclose(np.abs(np.dot(u, vt[:3].T)), np.eye(3), atol=1e-8)
+        with self.assertRaises(ValueError):
+            svd_universe(self.vectors, 7)
+
+
+class UniverseSweepTest(unittest.TestCase):
+    def test_matches_per_universe(self):
+        rng = np.random.RandomState(0)
+        sent1 = random_sentences(rng, 60, dim=6)
+        sent2 = random_sentences(rng, 60, dim=6)
+        universes = {
+            'random': random_universe(6, 30),
+            'svd': svd_universe(np.concatenate(sent1), 4),
+            'identity': np.identity(6)
+        }
+        sims = fbow_multi_batched(universes)(sent1, sent2)
+        self.assertEqual(sorted(sims), sorted(universes))
+        for name, u in universes.items():
+            similarity = fbow_jaccard_factory(u)
+            np.testing.assert_allclose(sims[name], [similarity(s1, s2) for s1, s2 in zip(sent1, sent2)],
+                                       rtol=1e-12, err_msg=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
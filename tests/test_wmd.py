@@ -0,0 +1,104 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Word Mover's Distance against a linear program over the words of both
+sentences, and its pruned nearest neighbour search against brute force
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import unittest
+import numpy as np
+from scipy.optimize import linprog
+from scipy.spatial.distance import cdist
+
+from similarity import wmd
+from similarity.batch import ragged
+from similarity.wmd import WordDistanceCache, wmd_batch, wmd_one_vs_many, wmd_nearest, \
+    word_centroid_distance, relaxed_wmd
+from tests.test_batch import random_sentences
+
+
+def reference_wmd(x, y):
+    """
+    Transport cost between the words of x and y, every occurrence of a word
+    with mass 1 / sentence length
+    """
+    n, m = len(x), len(y)
+    constraints = np.vstack((np.kron(np.eye(n), np.ones(m)), np.kron(np.ones(n), np.eye(m))))
+    return linprog(cdist(x, y).ravel(),
+                   A_eq=constraints,
+                   b_eq=np.concatenate((np.full(n, 1. / n), np.full(m, 1. / m))),
+                   bounds=(0, None)).fun
+
+
+class WMDTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.sent1 = random_sentences(rng, 40, dim=5, max_len=6, vocab_size=15)
+        self.sent2 = random_sentences(rng, 40, dim=5, max_len=6, vocab_size=15)
+        self.expected = [reference_wmd(s1, s2) for s1, s2 in zip(self.sent1, self.sent2)]
+
+    def test_matches_reference(self):
+        for s1, s2, expected in zip(self.sent1, self.sent2, self.expected):
+            self.assertAlmostEqual(wmd(s1, s2, cache=None), expected, places=8)
+        self.assertEqual(wmd(self.sent1[0], self.sent1[0]), 0.)
+        self.assertEqual(wmd(self.sent1[0], np.zeros((2, 5))), np.inf)
+
+    def test_batch(self):
+        x, x_offsets = ragged(self.sent1)
+        y, y_offsets = ragged(self.sent2)
+        cache = WordDistanceCache()
+        uncached = wmd_batch(x, x_offsets, y, y_offsets, cache=None)
+        np.testing.assert_allclose(uncached, self.expected, atol=1e-8)
+        np.testing.assert_array_equal(wmd_batch(x, x_offsets, y, y_offsets, cache=cache), uncached)
+        self.assertEqual(cache.hits, 0)
+        # swapped pairs reuse the transposed distances
+        np.testing.assert_allclose(wmd_batch(y, y_offsets, x, x_offsets, cache=cache), uncached,
+                                   atol=1e-12)
+        self.assertEqual(cache.hits, cache.lookups // 2)
+
+    def test_cache_bound(self):
+        cache = WordDistanceCache(max_bytes=1000)
+        for s1, s2, expected in zip(self.sent1, self.sent2, self.expected):
+            self.assertAlmostEqual(wmd(s1, s2, cache=cache), expected, places=8)
+            self.assertLessEqual(cache.nbytes, 1000)
+        self.assertEqual(cache.nbytes, sum(m.nbytes for m in cache.matrices.values()))
+        cache.clear()
+        self.assertEqual((cache.nbytes, len(cache.matrices)), (0, 0))
+
+    def test_bounds(self):
+        for s1, s2, expected in zip(self.sent1, self.sent2, self.expected):
+            w1 = np.full(len(s1), 1. / len(s1))
+            w2 = np.full(len(s2), 1. / len(s2))
+            self.assertLessEqual(word_centroid_distance(w1, s1, w2, s2), expected + 1e-9)
+            self.assertLessEqual(relaxed_wmd(w1, w2, cdist(s1, s2)), expected + 1e-9)
+
+    def test_nearest(self):
+        y, y_offsets = ragged(self.sent2 + [np.zeros((1, 5))])
+        for s1 in self.sent1[:10]:
+            distances = wmd_one_vs_many(s1, y, y_offsets)
+            np.testing.assert_allclose(distances[:-1], [reference_wmd(s1, s2) for s2 in self.sent2],
+                                       atol=1e-8)
+            self.assertEqual(distances[-1], np.inf)
+            for k in (1, 5):
+                indices, nearest = wmd_nearest(s1, y, y_offsets, k=k)
+                np.testing.assert_allclose(nearest, np.sort(distances)[:k], atol=1e-12)
+                np.testing.assert_allclose(distances[indices], nearest, atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
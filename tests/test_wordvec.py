@@ -0,0 +1,173 @@
+# Copyright 2018 Babylon Partners. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+'''
+Word vector loaders against a plain scan of the word2vec text file
+'''
+
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+from evaluation import utils
+
+
+def write_wordvec(path, words, vectors):
+    """
+    Writes word vectors in word2vec text format
+    :param path: path to the file
+    :param words: list of words, possibly repeated
+    :param vectors: word vectors, one per word
+    """
+    with io.open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('{0} {1}\n'.format(len(words), vectors.shape[1]))
+        for word, vector in zip(words, vectors):
+            f.write(word + ' ' + ' '.join(repr(value) for value in vector.tolist()) + '\n')
+
+
+def scan_wordvec(path, word2id, norm=False, word_freq_map=None):
+    """
+    :return: dict containing word: vector, read line by line as get_wordvec
+             did before binary stores and indexes
+    """
+    word_vec = {}
+    with io.open(path, 'r', encoding='utf-8') as f:
+        next(f)
+        for line in f:
+            word, vec = line.split(' ', 1)
+            if word in word2id:
+                vector = np.array(vec.split(), dtype=np.float64)
+                if norm:
+                    vector = vector / np.linalg.norm(vector)
+                if word_freq_map:
+                    vector = utils._get_word_weight(word, word_freq_map) * vector
+                word_vec[word] = vector
+    return word_vec
+
+
+class WordVecTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        self.words = ['w{0}'.format(i) for i in range(200)] + ['café', 'w7']
+        self.vectors = rng.normal(size=(len(self.words), 10))
+        self.path_to_vec = os.path.join(self.path, 'vectors.txt')
+        write_wordvec(self.path_to_vec, self.words, self.vectors)
+        self.path_to_counts = os.path.join(self.path, 'counts.txt')
+        with io.open(self.path_to_counts, 'w', encoding='utf-8') as f:
+            for i, word in enumerate(self.words[:100]):
+                f.write('{0} {1}\n'.format(word, i + 1))
+        # words missing from the file and the duplicated w7, whose last vector wins
+        self.word2id = {word: i for i, word in enumerate(['w7', 'café', 'w150', 'w3',
+                                                          'missing', 'w42', 'w199'])}
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def assertMatchesScan(self, norm=False, path_to_counts=None):
+        word_freq_map = utils._get_word_freq_map(path_to_counts) if path_to_counts else None
+        expected = scan_wordvec(self.path_to_vec, self.word2id, norm, word_freq_map)
+        word_vec = utils.get_wordvec(self.path_to_vec, self.word2id, norm=norm,
+                                     path_to_counts=path_to_counts)
+        self.assertEqual(sorted(word_vec), sorted(expected))
+        self.assertEqual(word_vec.dim, self.vectors.shape[1])
+        for word, vector in expected.items():
+            np.testing.assert_allclose(word_vec[word], vector, rtol=1e-15, err_msg=word)
+
+
+class BinaryStoreTest(WordVecTestCase):
+    def setUp(self):
+        WordVecTestCase.setUp(self)
+        utils.convert_wordvec_to_binary(self.path_to_vec)
+
+    def test_get_wordvec(self):
+        self.assertMatchesScan()
+        self.assertMatchesScan(norm=True)
+        self.assertMatchesScan(path_to_counts=self.path_to_counts)
+
+    def test_float32(self):
+        expected = scan_wordvec(self.path_to_vec, self.word2id)
+        word_vec = utils.get_wordvec(self.path_to_vec, self.word2id, dtype=np.float32)
+        self.assertEqual(word_vec.dtype, np.float32)
+        for word, vector in expected.items():
+            np.testing.assert_array_equal(word_vec[word], vector.astype(np.float32))
+
+    def test_load_wordvec_matrix(self):
+        np.testing.assert_array_equal(utils.load_wordvec_matrix(self.path_to_vec), self.vectors)
+        np.testing.assert_array_equal(utils.load_wordvec_matrix(self.path_to_vec, 10, 20),
+                                      self.vectors[10:20])
+
+    def test_skips_malformed_lines(self):
+        with io.open(self.path_to_vec, 'a', encoding='utf-8') as f:
+            f.write('short 1.0 2.0\n')
+        with io.open(self.path_to_vec, 'r+', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+            lines[0] = '{0} {1}'.format(len(self.words) + 1, self.vectors.shape[1])
+            f.seek(0)
+            f.write('\n'.join(lines))
+        utils.convert_wordvec_to_binary(self.path_to_vec)
+        matrix = np.load(utils.get_binary_store_path(self.path_to_vec) + '.npy')
+        np.testing.assert_array_equal(matrix, self.vectors)
+
+
+class TextIndexTest(WordVecTestCase):
+    def test_get_wordvec(self):
+        self.assertMatchesScan()
+        self.assertTrue(os.path.exists(utils.get_text_index_path(self.path_to_vec) + '.npy'))
+        # loaded through the existing index
+        self.assertMatchesScan(norm=True)
+        self.assertMatchesScan(path_to_counts=self.path_to_counts)
+
+    def test_reindexes_changed_files(self):
+        self.assertMatchesScan()
+        vectors = np.random.RandomState(1).normal(size=(len(self.words) + 5, 10))
+        write_wordvec(self.path_to_vec, self.words + ['new{0}'.format(i) for i in range(5)], vectors)
+        self.word2id['new3'] = len(self.word2id)
+        self.assertMatchesScan()
+
+    def test_read_only(self):
+        # an index under a file cannot be written, the file is scanned instead
+        blocker = os.path.join(self.path, 'file')
+        io.open(blocker, 'w').close()
+        with mock.patch.object(utils, 'get_text_index_path', return_value=os.path.join(blocker, 'idx')):
+            self.assertMatchesScan()
+            np.testing.assert_array_equal(utils.load_wordvec_matrix(self.path_to_vec, 10, 20),
+                                          self.vectors[10:20])
+        self.assertEqual(sorted(os.listdir(self.path)), ['counts.txt', 'file', 'vectors.txt'])
+
+    def test_failed_write(self):
+        # no partial index is left behind when the offsets cannot be saved
+        with mock.patch.object(np, 'save', side_effect=OSError('No space left on device')):
+            self.assertMatchesScan()
+        self.assertEqual(sorted(os.listdir(self.path)), ['counts.txt', 'vectors.txt'])
+        self.assertMatchesScan()
+        self.assertTrue(os.path.exists(utils.get_text_index_path(self.path_to_vec) + '.npy'))
+
+    def test_load_wordvec_matrix(self):
+        np.testing.assert_array_equal(utils.load_wordvec_matrix(self.path_to_vec), self.vectors)
+        for lo, hi in ((10, 20), (0, 1), (195, None), (190, 1000), (50, 40)):
+            np.testing.assert_array_equal(
+                utils.load_wordvec_matrix(self.path_to_vec, lo, hi).reshape(-1, 10),
+                self.vectors[lo:hi], err_msg='{0}:{1}'.format(lo, hi))
+
+
+if __name__ == '__main__':
+    unittest.main()